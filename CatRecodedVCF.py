@@ -3,8 +3,9 @@ import os
 import argparse
 import logging
 import sys
-import subprocess as sp
 
+from VCF import VCFHelper
+from RecodeVCF import RecodedVCFConcatenator, RecodedVCFJoiner
 from Utils import configure_logging
 
 def configure_argparser(argparser_obj):
@@ -29,7 +30,7 @@ def configure_argparser(argparser_obj):
                                nargs='+',
                                dest="input_files",
                                required=True,
-                               help="Space-delimited list of RecodedVCF files to combine")
+                               help="Space-delimited list of RecodedVCF files to combine. Files may be gzip or bgzip compressed.")
 
     # Path to VCF input file
     argparser_obj.add_argument("--output",
@@ -37,7 +38,55 @@ def configure_argparser(argparser_obj):
                                type=str,
                                dest="out_file",
                                required=True,
-                               help="Path to recoded output file.")
+                               help="Path to recoded output file. Use '-' to write to stdout. "
+                                    "Output is bgzip (BGZF) compressed if the file name ends with '.gz' or '.bgz'.")
+
+    # Number of compression threads
+    argparser_obj.add_argument("--threads",
+                               action="store",
+                               type=int,
+                               dest="threads",
+                               required=False,
+                               default=1,
+                               help="Number of threads used to compress '.gz' output. Default: 1.")
+
+    # Join files with different samples
+    argparser_obj.add_argument("--join",
+                               action="store_true",
+                               dest="join",
+                               required=False,
+                               help="Join input files with different samples into one table with the samples of every file, "
+                                    "matching rows on CHROM, POS, REF, and ALT. With --sorted-merge, files sorted by CHROM "
+                                    "and POS are joined in a single streaming pass.")
+
+    # Placeholder for genotypes of variants missing from a file
+    argparser_obj.add_argument("--missing-gt-char",
+                               action="store",
+                               type=str,
+                               dest="missing_gt_char",
+                               required=False,
+                               default="NA",
+                               help="Genotype used by --join for samples of files that don't contain a variant. Default: NA.")
+
+    # Merge sorted files by position
+    argparser_obj.add_argument("--sorted-merge",
+                               action="store_true",
+                               dest="sorted_merge",
+                               required=False,
+                               help="Merge input files that are each sorted by CHROM and POS into a single sorted file "
+                                    "instead of appending them. Exact duplicate records are only written once.")
+
+    # Order of contigs used by --sorted-merge
+    argparser_obj.add_argument("--contig-order",
+                               action="store",
+                               type=VCFHelper.parse_contigs,
+                               dest="contig_order",
+                               required=False,
+                               default=None,
+                               help="Order of contigs used by --sorted-merge as a comma-separated list of contig names or a file "
+                                    "with a contig name in the first column of each line (e.g. a FASTA .fai index). "
+                                    "Default: sort contig names with numbers compared numerically (chr2 before chr10).")
+
     # Verbosity level
     argparser_obj.add_argument("-v",
                                action='count',
@@ -51,33 +100,6 @@ def configure_argparser(argparser_obj):
                                     "2 = Errors + Warnings + Info\n"
                                     "3 = Errors + Warnings + Info + Debug")
 
-def get_header_string(input_file):
-    # Return header line from a file
-    with open(input_file, "r") as fh:
-        header = fh.readline().rstrip()
-    return header
-
-def check_input_columns(input_files):
-    # Check to make sure column headers are all the same.
-    # Return header if so. Throw error if not.
-    header_string = None
-    for input_file in input_files:
-
-        # Get header line from next file
-        first_line = get_header_string(input_file)
-
-        # Set header string to be first
-        if header_string is None:
-            header_string = first_line
-            continue
-
-        # Check to make sure columns are in same order
-        if first_line != header_string:
-            logging.error("Input files do not contain same columns in same order!")
-            logging.error("Expected:\n%s" % header_string)
-            logging.error("Received from %s:\n%s" % (input_file, first_line))
-            raise IOError("Input files much have same number of columns in same order!")
-
 def main():
 
     # Configure argparser
@@ -91,18 +113,21 @@ def main():
     configure_logging(args.verbosity_level)
 
     try:
-        # Check to make sure all input files have same columns in same order
-        check_input_columns(args.input_files)
-
-        # Run command to concat all tables together
-        cmd = "awk 'FNR==1 && NR!=1{next;}{print}' %s > %s" % (" ".join(args.input_files), args.out_file)
-        proc = sp.Popen(cmd, stdout=sp.PIPE, stderr=sp.PIPE, shell=True)
-        out, err = proc.communicate()
-
-        # Check to make sure no errors received
-        if len(err) != 0:
-            logging.error("CatRecodeVCF failed! Received following error message:\n%s" % err)
-            exit(1)
+        if args.join:
+            # Join tables with different samples on their variants
+            joiner = RecodedVCFJoiner(args.input_files, args.out_file,
+                                      compress_threads=max(args.threads, 1),
+                                      sorted_merge=args.sorted_merge,
+                                      contig_order=args.contig_order,
+                                      missing_gt_char=args.missing_gt_char)
+            joiner.join()
+        else:
+            # Check to make sure all input files have same columns in same order and concat or merge all tables together
+            concatenator = RecodedVCFConcatenator(args.input_files, args.out_file,
+                                                  compress_threads=max(args.threads, 1),
+                                                  sorted_merge=args.sorted_merge,
+                                                  contig_order=args.contig_order)
+            concatenator.concat()
 
     except KeyboardInterrupt:
         logging.error("(Main) Keyboard interrupt!")
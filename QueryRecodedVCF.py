@@ -0,0 +1,174 @@
+#!/usr/bin/env python2.7
+import os
+import argparse
+import logging
+import sys
+import time
+
+from VCF import VCFHelper, BGZFReader
+from RecodeVCF import VCFRecoder, RecodedVCFIndex
+from Utils import configure_logging
+
+def configure_argparser(argparser_obj):
+
+    def file_type(arg_string):
+        """
+        This function check both the existance of input file and the file size
+        :param arg_string: file name as string
+        :return: file name as string
+        """
+        if not os.path.exists(arg_string):
+            err_msg = "%s does not exist! " \
+                      "Please provide a valid file!" % arg_string
+            raise argparse.ArgumentTypeError(err_msg)
+
+        return arg_string
+
+    # Path to recoded input file
+    argparser_obj.add_argument("-i",
+                               action="store",
+                               type=file_type,
+                               dest="input_file",
+                               required=True,
+                               help="Path to a RecodedVCF file indexed with RecodeVCF.py --index. File may be plain text or bgzip compressed.")
+
+    # Path to index of recoded input file
+    argparser_obj.add_argument("--index",
+                               action="store",
+                               type=file_type,
+                               dest="index_file",
+                               required=False,
+                               default=None,
+                               help="Path to index of the recoded file. Default: '<input>.rvi'.")
+
+    # Regions to query
+    argparser_obj.add_argument("--region",
+                               action="append",
+                               type=VCFHelper.parse_region,
+                               dest="regions",
+                               metavar="REGION",
+                               required=False,
+                               default=None,
+                               help="Return records overlapping a region formatted as 'chrom', 'chrom:start', or 'chrom:start-end' "
+                                    "(1-based, inclusive). Can be specified multiple times.")
+
+    # BED file of regions to query
+    argparser_obj.add_argument("--bed",
+                               action="store",
+                               type=file_type,
+                               dest="bed_file",
+                               required=False,
+                               default=None,
+                               help="Return records overlapping the regions of a BED file (0-based, half-open). "
+                                    "Can be combined with --region.")
+
+    # Path to output file
+    argparser_obj.add_argument("--output",
+                               action="store",
+                               type=str,
+                               dest="out_file",
+                               required=False,
+                               default="-",
+                               help="Path to output file. Use '-' to write to stdout. "
+                                    "Output is bgzip (BGZF) compressed if the file name ends with '.gz' or '.bgz'. Default: '-'.")
+
+    # Verbosity level
+    argparser_obj.add_argument("-v",
+                               action='count',
+                               dest='verbosity_level',
+                               required=False,
+                               default=0,
+                               help="Increase verbosity of the program."
+                                    "Multiple -v's increase the verbosity level:\n"
+                                    "0 = Errors\n"
+                                    "1 = Errors + Warnings\n"
+                                    "2 = Errors + Warnings + Info\n"
+                                    "3 = Errors + Warnings + Info + Debug")
+
+def query_recoded_vcf(input_file, index_file, regions, out_file):
+    # Write the header and the records of an indexed recoded file overlapping a list of regions
+    # Overlapping regions are merged so each record is written once, in the same order as the recoded file
+    index = RecodedVCFIndex.load(index_file, input_file)
+    if index.compressed != BGZFReader.is_bgzf(input_file):
+        logging.error("Index was created for a %s file but %s is %s!" %
+                      ("bgzip compressed" if index.compressed else "plain text", input_file,
+                       "bgzip compressed" if BGZFReader.is_bgzf(input_file) else "not bgzip compressed"))
+        raise IOError("Index doesn't match recoded file!")
+
+    data_fh = BGZFReader(input_file) if index.compressed else open(input_file, "rb")
+    out_file_handle = VCFRecoder.open_output_file(out_file)
+    try:
+        out_file_handle.write(data_fh.readline())
+
+        num_records = 0
+        last_offsets = {}
+        contig_order = dict([(x, i) for i, x in enumerate(index.contigs)])
+        regions = sorted(VCFHelper.merge_regions(regions), key=lambda x: contig_order.get(x[0], len(contig_order)))
+        for chrom, start, end in regions:
+            # Records spanning several regions of a contig are only written for the first
+            last_offset = last_offsets.get(chrom, -1)
+            lines = []
+            for offset, line in index.query(data_fh, chrom, start, end):
+                if offset > last_offset:
+                    lines.append(line)
+                    last_offset = offset
+            last_offsets[chrom] = last_offset
+            out_file_handle.write("".join(lines))
+            num_records += len(lines)
+        return num_records
+
+    finally:
+        data_fh.close()
+        if out_file_handle is not sys.stdout:
+            out_file_handle.close()
+        else:
+            out_file_handle.flush()
+
+def main():
+
+    # Configure argparser
+    argparser = argparse.ArgumentParser(prog="QueryRecodedVCF")
+    configure_argparser(argparser)
+
+    # Parse the arguments
+    args = argparser.parse_args()
+
+    # Configure logging
+    configure_logging(args.verbosity_level)
+
+    # Get regions from command line and BED file
+    regions = [] if args.regions is None else args.regions
+    if args.bed_file is not None:
+        regions += VCFHelper.read_bed_regions(args.bed_file)
+
+    if len(regions) == 0:
+        logging.error("At least one region must be given with --region or --bed!")
+        raise IOError("No regions to query!")
+
+    index_file = args.index_file
+    if index_file is None:
+        index_file = RecodedVCFIndex.get_index_file(args.input_file)
+        if not os.path.exists(index_file):
+            logging.error("Index of recoded file doesn't exist: %s. "
+                          "Create it with RecodeVCF.py --index or specify it with --index." % index_file)
+            raise IOError("Recoded file isn't indexed!")
+
+    try:
+        start_time = time.time()
+        num_records = query_recoded_vcf(args.input_file, index_file, regions, args.out_file)
+        logging.info("Wrote %d records overlapping %d regions in %.3f seconds" %
+                     (num_records, len(regions), time.time() - start_time))
+
+    except KeyboardInterrupt:
+        logging.error("(Main) Keyboard interrupt!")
+        raise
+
+    except BaseException, e:
+        # Report any errors that arise
+        logging.error("(Main) QueryRecodedVCF failed!")
+        if e.message != "":
+            logging.error("Received the following error message:\n%s" % e.message)
+        raise
+
+if __name__ == "__main__":
+    sys.exit(main())
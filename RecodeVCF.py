@@ -3,10 +3,9 @@ import os
 import argparse
 import logging
 import sys
-import vcf
 
-from VCF import VCFHelper
-from RecodeVCF import VCFRecoder
+from VCF import VCFHelper, VCFCheckpoint
+from RecodeVCF import VCFRecoder, ParallelVCFRecoder, TransposedRecodeWriter
 from Utils import configure_logging
 
 def configure_argparser(argparser_obj):
@@ -14,10 +13,10 @@ def configure_argparser(argparser_obj):
     def file_type(arg_string):
         """
         This function check both the existance of input file and the file size
-        :param arg_string: file name as string
+        :param arg_string: file name as string, or '-' for stdin
         :return: file name as string
         """
-        if not os.path.exists(arg_string):
+        if arg_string != "-" and not os.path.exists(arg_string):
             err_msg = "%s does not exist! " \
                       "Please provide a valid file!" % arg_string
             raise argparse.ArgumentTypeError(err_msg)
@@ -30,7 +29,7 @@ def configure_argparser(argparser_obj):
                                type=file_type,
                                dest="vcf_file",
                                required=True,
-                               help="Path to vcf file to recode.")
+                               help="Path to vcf file to recode. May be gzip or bgzip compressed. Use '-' to read from stdin.")
 
     # Path to VCF input file
     argparser_obj.add_argument("--output",
@@ -38,7 +37,64 @@ def configure_argparser(argparser_obj):
                                type=str,
                                dest="out_file",
                                required=True,
-                               help="Path to recoded output file.")
+                               help="Path to recoded output file. Use '-' to write to stdout. "
+                                    "Output is bgzip (BGZF) compressed if the file name ends with '.gz' or '.bgz'.")
+
+    # Format of output file
+    argparser_obj.add_argument("--format",
+                               action="store",
+                               choices=["tsv", "parquet"],
+                               dest="output_format",
+                               required=False,
+                               default="tsv",
+                               help="Output file format. 'parquet' writes typed columns for the fixed, INFO, recoded genotype, "
+                                    "and depth columns and requires pyarrow. Default: tsv.")
+
+    # Layout of recoded genotypes
+    argparser_obj.add_argument("--genotype-matrix",
+                               action="store",
+                               choices=["dense", "sparse"],
+                               dest="genotype_matrix",
+                               required=False,
+                               default="dense",
+                               help="Layout of recoded genotypes. 'sparse' saves only non-reference genotypes and their depths "
+                                    "as a (variants x samples) CSR matrix in a '.npz' output file, and writes the fixed and INFO "
+                                    "columns to a '<output>.variants.tsv' table. Default: dense.")
+
+    # Store sparse matrix arrays without compression
+    argparser_obj.add_argument("--uncompressed-matrix",
+                               action="store_true",
+                               dest="uncompressed_matrix",
+                               required=False,
+                               help="Store the arrays of a sparse genotype matrix without zip compression so RecodedVCFReader can "
+                                    "memory map them instead of reading them into memory. Requires --genotype-matrix sparse.")
+
+    # Write coordinate index
+    argparser_obj.add_argument("--index",
+                               action="store_true",
+                               dest="index",
+                               required=False,
+                               help="Write a coordinate index of the output to '<output>.rvi' so regions can be read with "
+                                    "QueryRecodedVCF.py. Requires a VCF sorted by position and tab-delimited output to a file.")
+
+    # Write one row per sample
+    argparser_obj.add_argument("--transpose",
+                               action="store_true",
+                               dest="transpose",
+                               required=False,
+                               help="Write one row of recoded genotypes per sample (sample-major) with a header of variant IDs "
+                                    "(CHROM:POS:REF:ALT) instead of one row per variant. Depth, INFO, and raw sample columns "
+                                    "aren't included.")
+
+    # Memory budget for transposing
+    argparser_obj.add_argument("--max-memory",
+                               action="store",
+                               type=int,
+                               dest="max_memory",
+                               required=False,
+                               default=TransposedRecodeWriter.DEFAULT_MAX_MEMORY / (1024*1024),
+                               help="Memory budget in MB for genotypes buffered by --transpose before they're spilled to "
+                                    "temporary files next to the output. Default: %d." % (TransposedRecodeWriter.DEFAULT_MAX_MEMORY / (1024*1024)))
 
     argparser_obj.add_argument("--info-columns",
                                action="store",
@@ -83,6 +139,92 @@ def configure_argparser(argparser_obj):
                                required=False,
                                help="Flag allowing variant records to contain more than one alternate allele. This flag shouldn't really be used.")
 
+    # Use most severe snpeff annotation
+    argparser_obj.add_argument("--snpeff-most-severe",
+                               action="store_true",
+                               dest="snpeff_most_severe",
+                               required=False,
+                               help="Use the snpeff annotation with the most severe impact/consequence across all transcripts "
+                                    "instead of the first annotation.")
+
+    # Number of processes used to recode VCF
+    argparser_obj.add_argument("--threads",
+                               action="store",
+                               type=int,
+                               dest="threads",
+                               required=False,
+                               default=1,
+                               help="Number of processes used to recode VCF records in parallel. VCFs read from stdin, Parquet output, "
+                                    "sparse genotype matrices, and sample-major output are recoded by a single process. Default: 1.")
+
+    # Number of threads used to compress output
+    argparser_obj.add_argument("--compress-threads",
+                               action="store",
+                               type=int,
+                               dest="compress_threads",
+                               required=False,
+                               default=1,
+                               help="Number of threads used to compress '.gz' output when records are recoded by a single process. "
+                                    "Output recoded with --threads is compressed by the recoding processes. Default: 1.")
+
+    # Samples to include
+    argparser_obj.add_argument("--samples",
+                               action="store",
+                               type=VCFHelper.parse_samples,
+                               dest="samples",
+                               metavar="SAMPLES",
+                               required=False,
+                               default=None,
+                               help="Only recode the samples in a comma-separated list of sample names or a file with one sample name per line. "
+                                    "Samples are output in the order given. Default: ALL.")
+
+    # Genomic regions to include
+    argparser_obj.add_argument("--region",
+                               action="append",
+                               type=VCFHelper.parse_region,
+                               dest="regions",
+                               metavar="REGION",
+                               required=False,
+                               default=None,
+                               help="Only recode records overlapping a region formatted as 'chrom', 'chrom:start', or 'chrom:start-end' "
+                                    "(1-based, inclusive). Can be specified multiple times. "
+                                    "Requires a bgzip compressed VCF with a tabix (.tbi) or CSI (.csi) index.")
+
+    # Checkpoint file for resuming interrupted runs
+    argparser_obj.add_argument("--checkpoint",
+                               action="store",
+                               type=str,
+                               dest="checkpoint_file",
+                               metavar="CHECKPOINT_FILE",
+                               required=False,
+                               default=None,
+                               help="Periodically save progress to a checkpoint file so an interrupted run can be resumed with --resume. "
+                                    "The checkpoint file is removed once the run finishes. Requires a single process (--threads 1) and an output file.")
+
+    # Number of records between checkpoints
+    argparser_obj.add_argument("--checkpoint-interval",
+                               action="store",
+                               type=int,
+                               dest="checkpoint_interval",
+                               required=False,
+                               default=VCFCheckpoint.DEFAULT_INTERVAL,
+                               help="Number of records processed between checkpoints. Default: %d." % VCFCheckpoint.DEFAULT_INTERVAL)
+
+    # Resume from checkpoint
+    argparser_obj.add_argument("--resume",
+                               action="store_true",
+                               dest="resume",
+                               required=False,
+                               help="Resume from the last checkpoint saved to the --checkpoint file. "
+                                    "Starts from the first record if the checkpoint file doesn't exist.")
+
+    # Use lightweight VCF reader instead of PyVCF
+    argparser_obj.add_argument("--fast-reader",
+                               action="store_true",
+                               dest="fast_reader",
+                               required=False,
+                               help="Parse VCF with the lightweight FastReader, which only decodes the INFO/FORMAT fields that are used.")
+
     # Verbosity level
     argparser_obj.add_argument("-v",
                                action='count',
@@ -128,7 +270,16 @@ def main():
     missing_data_char       = args.missing_data_char
     missing_gt_char         = args.missing_gt_char
     multiallelic            = args.multiallelic
+    snpeff_most_severe      = args.snpeff_most_severe
     info_columns            = args.info_columns
+    fast_reader             = args.fast_reader
+    threads                 = args.threads
+    regions                 = args.regions
+    samples                 = args.samples
+    output_format           = args.output_format
+    genotype_matrix         = args.genotype_matrix
+    transpose               = args.transpose
+    index                   = args.index
 
     # Get optinal list of info columns to include
     if info_columns is not None:
@@ -144,24 +295,85 @@ def main():
 
         logging.debug("(Main) Starting to recode VCF file: %s" % vcf_file)
 
-        # Check to make sure VCF file is valid
-        if not VCFHelper.is_valid_vcf(vcf_file):
-            raise IOError("Invalid VCF file!")
+        # Settings used to recode each VCF record
+        recoder_args = {"info_to_include"   : info_columns,
+                        "min_call_depth"    : min_call_depth,
+                        "missing_data_char" : missing_data_char,
+                        "missing_gt_char"   : missing_gt_char,
+                        "multiallelic"      : multiallelic,
+                        "snpeff_most_severe": snpeff_most_severe,
+                        "output_format"     : output_format,
+                        "genotype_matrix"   : genotype_matrix,
+                        "compress_matrix"   : not args.uncompressed_matrix,
+                        "transpose"         : transpose,
+                        "index"             : index,
+                        "max_memory"        : max(args.max_memory, 1) * 1024 * 1024}
+
+        if genotype_matrix == "sparse" and (output_format != "tsv" or out_file == "-"):
+            logging.error("(Main) --genotype-matrix sparse can't be used with --format parquet or output to stdout!")
+            raise IOError("Invalid genotype matrix options!")
+
+        if args.uncompressed_matrix and genotype_matrix != "sparse":
+            logging.error("(Main) --uncompressed-matrix requires --genotype-matrix sparse!")
+            raise IOError("Invalid genotype matrix options!")
+
+        if transpose and (output_format != "tsv" or genotype_matrix != "dense"):
+            logging.error("(Main) --transpose can't be used with --format parquet or --genotype-matrix sparse!")
+            raise IOError("Invalid transpose options!")
+
+        if index and (output_format != "tsv" or genotype_matrix != "dense" or transpose or out_file == "-"):
+            logging.error("(Main) --index requires tab-delimited output to a file and can't be used with --format parquet, "
+                          "--genotype-matrix sparse, or --transpose!")
+            raise IOError("Invalid index options!")
+
+        # Create checkpoint for saving progress of the run
+        checkpoint = None
+        if args.checkpoint_file is not None:
+            if threads > 1 or regions is not None or out_file == "-" or output_format != "tsv" or genotype_matrix != "dense" \
+                    or transpose or index:
+                logging.error("(Main) Checkpoints can't be used with --threads, --region, --format parquet, "
+                              "--genotype-matrix sparse, --transpose, --index, or output to stdout!")
+                raise IOError("Invalid checkpoint options!")
+            checkpoint = VCFCheckpoint(args.checkpoint_file, vcf_file,
+                                       interval=max(args.checkpoint_interval, 1),
+                                       resume=args.resume)
+        elif args.resume:
+            logging.error("(Main) --resume requires a --checkpoint file!")
+            raise IOError("Invalid checkpoint options!")
+
+        if threads > 1 and vcf_file == "-":
+            # Stdin can't be split into shards
+            logging.warning("(Main) Reading VCF from stdin. Recoding with a single process!")
+            threads = 1
+
+        if threads > 1 and output_format == "parquet":
+            # Row groups are written by a single process
+            logging.warning("(Main) Writing Parquet output. Recoding with a single process!")
+            threads = 1
+
+        if threads > 1 and genotype_matrix == "sparse":
+            # Matrix rows are appended by a single process
+            logging.warning("(Main) Writing sparse genotype matrix. Recoding with a single process!")
+            threads = 1
+
+        if threads > 1 and transpose:
+            # Samples can only be written once every variant is recoded
+            logging.warning("(Main) Writing sample-major output. Recoding with a single process!")
+            threads = 1
 
-        # Get correct VCFparser based on annotation type
+        if threads > 1:
+            # Create Recoder that recodes shards of the VCF in parallel
+            vcf_recoder = ParallelVCFRecoder(vcf_file, out_file, threads, fast_reader=fast_reader, regions=regions,
+                                             samples=samples, **recoder_args)
 
-        # Initialize VCF parser
-        vcf_parser = vcf.Reader(open(vcf_file, "r"))
+        else:
+            # Initialize VCF parser
+            vcf_parser = VCFHelper.get_vcf_parser(vcf_file, fast_reader=fast_reader, regions=regions, samples=samples,
+                                                  checkpoint=checkpoint)
 
-        # Create Recoder
-        vcf_recoder = VCFRecoder(vcf_parser,
-                                 vcf_file,
-                                 out_file,
-                                 info_to_include = info_columns,
-                                 min_call_depth = min_call_depth,
-                                 missing_data_char = missing_data_char,
-                                 missing_gt_char = missing_gt_char,
-                                 multiallelic=multiallelic)
+            # Create Recoder
+            vcf_recoder = VCFRecoder(vcf_parser, vcf_file, out_file, compress_threads=max(args.compress_threads, 1),
+                                     checkpoint=checkpoint, **recoder_args)
 
         # Recode the VCF file and write output to outfile
         vcf_recoder.recode_vcf()
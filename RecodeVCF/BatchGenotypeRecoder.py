@@ -0,0 +1,280 @@
+import re
+import numpy as np
+from vcf.parser import RESERVED_FORMAT
+
+class ParseCache(dict):
+    # Dictionary that computes and stores the value of a missing key with a parse function
+    # Values like genotypes and allele depths repeat across samples so each distinct string is only parsed once
+
+    # Maximum number of values stored before the cache is cleared
+    MAX_SIZE = 1000000
+
+    def __init__(self, parse):
+        super(ParseCache, self).__init__()
+        self.parse = parse
+
+    def __missing__(self, key):
+        if len(self) >= ParseCache.MAX_SIZE:
+            self.clear()
+        value = self.parse(key)
+        self[key] = value
+        return value
+
+class BatchGenotypeRecoder(object):
+    # Recode the genotypes and read depths of blocks of VCF records at once using NumPy
+    # Genotype classes and allele depths of every sample are gathered from the raw FORMAT/sample columns of each
+    # record into arrays and recoded together. Output strings are identical to VCFRecoder.get_recoded_genotype.
+    # Records containing values that can't be recoded in bulk (e.g. non-integer depths or depths missing for called
+    # genotypes) are returned as None so they can be recoded one sample at a time.
+
+    # Number of records recoded together
+    BLOCK_SIZE = 128
+
+    # Genotype classes
+    MISSING = -1
+    HOM_REF = 0
+    VARIANT = 1
+    INVALID = 2
+
+    # Placeholder for depths that aren't available
+    NO_DEPTH = -1
+
+    def __init__(self, vcf_parser, min_call_depth, missing_gt_char):
+
+        # Declared FORMAT fields of the VCF
+        self.formats = vcf_parser.formats
+
+        # Number of samples in the VCF
+        self.num_samples = len(vcf_parser.samples)
+
+        # Mininum number of reads required to make a variant call
+        self.min_call_depth = min_call_depth
+
+        # Placeholder for uncalled genotypes
+        self.missing_gt_char = missing_gt_char
+
+        # Recoded genotype strings indexed by genotype class and depth
+        # Missing genotypes (class -1) index the last row
+        self.genotype_table = np.array(self.get_genotype_table(min_call_depth, missing_gt_char), dtype=object)
+
+        # Parsed genotype classes and depths of each distinct string
+        self.gt_classes = ParseCache(self.__parse_gt_class)
+        self.ad_depths = ParseCache(self.__parse_ad_depths)
+        self.mutect_depths = ParseCache(self.__parse_mutect_depths)
+        self.ad_mutect_depths = ParseCache(self.__parse_ad_mutect_depths)
+
+        # Regular expressions for gathering fields from the sample columns of each FORMAT
+        self.format_patterns = {}
+
+    @staticmethod
+    def get_genotype_table(min_call_depth, missing_gt_char):
+        # Return a table of recoded genotype strings for every depth from 0 to min_call_depth
+        # Rows are homozygous REF genotypes, variant genotypes, and missing genotypes
+        # Strings are identical to the ones computed by VCFRecoder.get_recoded_genotype
+        ref_row = []
+        variant_row = []
+        for dp in range(max(min_call_depth, 0) + 1):
+            if dp >= min_call_depth:
+                ref_row.append("-1")
+                variant_row.append("1")
+                continue
+
+            recoded = -1.0 * (dp/float(min_call_depth))
+            ref_row.append("-0" if recoded == 0.0 else str(recoded))
+            recoded = dp/float(min_call_depth)
+            variant_row.append("0" if recoded == 0.0 else str(recoded))
+
+        return [ref_row, variant_row, [missing_gt_char] * len(ref_row)]
+
+    @staticmethod
+    def get_depth_type(vcf_parser):
+        # Return the type of recoded depths ('int' or 'float') based on the FORMAT fields they're summed from
+        for field in ["AD", "F1R2", "F2R1"]:
+            if field in vcf_parser.formats and vcf_parser.formats[field].type != "Integer":
+                return "float"
+        return "int"
+
+    def recode_block(self, records):
+        # Return a list containing the recoded genotypes followed by the depths of each record as strings
+        # Entries are None for records that must be recoded one sample at a time
+        num_records = len(records)
+        num_samples = self.num_samples
+        gt_classes = np.full((num_records, num_samples), self.INVALID, dtype=np.int8)
+        ref_depths = np.zeros((num_records, num_samples), dtype=np.int64)
+        alt_depths = np.zeros((num_records, num_samples), dtype=np.int64)
+        depths = np.zeros((num_records, num_samples), dtype=np.int64)
+        gathered = np.zeros(num_records, dtype=bool)
+
+        # Gather genotype classes and depths from the sample columns
+        for i, record in enumerate(records):
+            gathered[i] = self.__gather(record, gt_classes[i], ref_depths[i], alt_depths[i], depths[i])
+
+        # Records missing a depth needed to recode a called genotype can't be recoded in bulk
+        is_ref = gt_classes == self.HOM_REF
+        is_variant = gt_classes == self.VARIANT
+        invalid = (gt_classes == self.INVALID) | (depths == self.NO_DEPTH) | \
+                  (is_ref & (ref_depths == self.NO_DEPTH)) | (is_variant & (alt_depths == self.NO_DEPTH))
+        valid = gathered & ~invalid.any(axis=1)
+
+        # Look up recoded genotypes by genotype class and the depth supporting the called allele
+        # Depths at or above min_call_depth share the last column of the table
+        allele_depths = np.where(is_ref, ref_depths, alt_depths)
+        recoded = self.genotype_table[gt_classes, np.clip(allele_depths, 0, self.genotype_table.shape[1] - 1)]
+
+        recoded = recoded.tolist()
+        depths = depths.tolist()
+        return [recoded[i] + [str(x) for x in depths[i]] if valid[i] else None for i in range(num_records)]
+
+    def __gather(self, record, gt_classes, ref_depths, alt_depths, depths):
+        # Fill array rows with the genotype class and depths of every sample in a record
+        # Returns False if the record can't be gathered
+        genotype_cols = record.raw_genotype_columns
+        if genotype_cols is None:
+            return False
+
+        fmt = genotype_cols.split("\t", 1)[0]
+        if fmt not in self.format_patterns:
+            self.format_patterns[fmt] = self.__get_format_pattern(fmt)
+        pattern = self.format_patterns[fmt]
+        if pattern is None:
+            return False
+
+        pattern, depth_cache = pattern
+        sample_fields = pattern.findall(genotype_cols)
+        if len(sample_fields) != self.num_samples:
+            return False
+
+        gt_cache = self.gt_classes
+        gt_classes[:] = [gt_cache[x[0]] for x in sample_fields]
+        ref_depths[:], alt_depths[:], depths[:] = zip(*[depth_cache[x[1:]] for x in sample_fields])
+        return True
+
+    def __get_format_pattern(self, fmt):
+        # Return a regular expression capturing GT and depth fields from every sample column with a given FORMAT
+        # Along with the cache used to parse its depth fields. Returns None if the FORMAT can't be recoded in bulk.
+        fields = fmt.split(":")
+        if "GT" not in fields:
+            return None
+
+        # Depths are taken from AD when available and from F1R2 + F2R1 otherwise (e.g. Mutect)
+        has_mutect_fields = "F1R2" in fields and "F2R1" in fields
+        if "AD" in fields and has_mutect_fields:
+            depth_fields = ["AD", "F1R2", "F2R1"]
+            depth_cache = self.ad_mutect_depths
+        elif "AD" in fields:
+            depth_fields = ["AD"]
+            depth_cache = self.ad_depths
+        elif has_mutect_fields:
+            depth_fields = ["F1R2", "F2R1"]
+            depth_cache = self.mutect_depths
+        else:
+            return None
+
+        # Depths must be decoded as integer lists
+        for field in depth_fields:
+            if field in self.formats:
+                if self.formats[field].type != "Integer" or self.formats[field].num == 1:
+                    return None
+            elif RESERVED_FORMAT.get(field, "String") != "Integer":
+                return None
+
+        # Capture groups in the order GT, depth fields
+        capture = ["GT"] + depth_fields
+        indices = [fields.index(x) for x in capture]
+        if len(set(indices)) != len(indices):
+            return None
+
+        # Match a tab followed by the sample's fields up to the last one captured
+        # Trailing fields may be missing from a sample column
+        pattern = ""
+        for i in reversed(range(max(indices) + 1)):
+            field_pattern = "(?P<f%d>[^\t:]*)" % i if i in indices else "[^\t:]*"
+            pattern = field_pattern if pattern == "" else "%s(?::%s)?" % (field_pattern, pattern)
+        pattern = re.compile("\t" + pattern)
+
+        # Reorder named groups into capture order
+        group_order = [pattern.groupindex["f%d" % i] - 1 for i in indices]
+        if group_order == sorted(group_order):
+            return pattern, depth_cache
+
+        # Capture order differs from field order so match groups must be reordered
+        return ReorderedPattern(pattern, group_order), depth_cache
+
+    def __parse_gt_class(self, gt):
+        # Return the genotype class of a GT string using the same rules as PyVCF
+        if gt == "":
+            return self.INVALID
+        alleles = gt.replace("|", "/").split("/")
+        if "." in alleles:
+            return self.MISSING
+        if alleles.count(alleles[0]) == len(alleles) and alleles[0] == "0":
+            return self.HOM_REF
+        return self.VARIANT
+
+    @staticmethod
+    def __parse_int_list(value):
+        # Decode an Integer FORMAT value with multiple entries
+        # Returns None for missing values, a list of ints (None for missing entries), or an int for single values
+        # Raises ValueError for values that aren't integers
+        if value == "" or value == ".":
+            return None
+        if "," not in value:
+            return int(value)
+        return [None if x == "." else int(x) for x in value.split(",")]
+
+    def __parse_ad_depths(self, fields):
+        # Return depth of REF allele, depth of ALT allele, and total depth from an AD value
+        try:
+            ad = self.__parse_int_list(fields[0])
+        except ValueError:
+            return self.NO_DEPTH, self.NO_DEPTH, self.NO_DEPTH
+
+        if ad is None:
+            return self.NO_DEPTH, self.NO_DEPTH, 0
+        if not isinstance(ad, list):
+            return (ad, self.NO_DEPTH, ad) if ad >= 0 else (self.NO_DEPTH, self.NO_DEPTH, self.NO_DEPTH)
+
+        if any([x is not None and x < 0 for x in ad]):
+            return self.NO_DEPTH, self.NO_DEPTH, self.NO_DEPTH
+        ref_depth = ad[0] if ad[0] is not None else self.NO_DEPTH
+        alt_depth = ad[1] if ad[1] is not None else self.NO_DEPTH
+        return ref_depth, alt_depth, sum([x for x in ad if x is not None])
+
+    def __parse_mutect_depths(self, fields):
+        # Return depth of REF allele, depth of ALT allele, and total depth from F1R2 and F2R1 values
+        try:
+            f1r2 = self.__parse_int_list(fields[0])
+            f2r1 = self.__parse_int_list(fields[1])
+        except ValueError:
+            return self.NO_DEPTH, self.NO_DEPTH, self.NO_DEPTH
+
+        for counts in [f1r2, f2r1]:
+            if counts is not None and (not isinstance(counts, list) or any([x is not None and x < 0 for x in counts])):
+                return self.NO_DEPTH, self.NO_DEPTH, self.NO_DEPTH
+
+        total = 0
+        for counts in [f1r2, f2r1]:
+            if counts is not None:
+                total += sum([x for x in counts if x is not None])
+
+        if f1r2 is None or f2r1 is None:
+            return self.NO_DEPTH, self.NO_DEPTH, total
+
+        ref_depth = f1r2[0] + f2r1[0] if f1r2[0] is not None and f2r1[0] is not None else self.NO_DEPTH
+        alt_depth = f1r2[1] + f2r1[1] if f1r2[1] is not None and f2r1[1] is not None else self.NO_DEPTH
+        return ref_depth, alt_depth, total
+
+    def __parse_ad_mutect_depths(self, fields):
+        # Return depths from AD if present, otherwise from F1R2 and F2R1
+        if fields[0] == "" or fields[0] == ".":
+            return self.mutect_depths[fields[1:]]
+        return self.ad_depths[fields[:1]]
+
+class ReorderedPattern(object):
+    # Compiled pattern whose findall returns groups in a given order
+    def __init__(self, pattern, group_order):
+        self.pattern = pattern
+        self.group_order = group_order
+
+    def findall(self, string):
+        return [tuple([x[i] for i in self.group_order]) for x in self.pattern.findall(string)]
@@ -0,0 +1,146 @@
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+from VCF import VCFHelper, BGZFWriter
+from VCFRecoder import VCFRecoder
+from RecodedVCFIndex import RecodedVCFIndex
+
+class ParallelVCFRecoder(object):
+    # Recode a VCF file by splitting its records into byte-range shards that are recoded in a process pool
+    # When regions are given, records of each contig are recoded as a separate shard
+    # Shards are concatenated in their original order so output is identical to VCFRecoder
+    # BGZF output is produced by compressing each shard in its own process and concatenating the compressed shards
+
+    # Number of shards per process. Using more shards than processes balances load when record sizes vary.
+    SHARDS_PER_THREAD = 4
+
+    def __init__(self, vcf_file, out_file, num_threads, fast_reader=False, regions=None, samples=None, **kwargs):
+
+        if vcf_file == "-":
+            logging.error("(ParallelVCFRecoder) VCF read from stdin can't be split into shards!")
+            raise IOError("Parallel recoding requires a VCF file!")
+
+        # Path to input VCF file
+        self.vcf_file = vcf_file
+
+        # Path to recoded output file ('-' for stdout)
+        self.out_file = out_file
+
+        # Number of processes to use
+        self.num_threads = num_threads
+
+        # Whether to use FastReader to parse VCF records
+        self.fast_reader = fast_reader
+
+        # Optional list of (chrom, start, end) regions to recode
+        self.regions = regions
+
+        # Optional list of samples to recode
+        self.samples = samples
+
+        # Arguments passed to the VCFRecoder of each shard
+        self.recoder_args = kwargs
+
+        # Parser of the VCF header, which is closed once the output header is written
+        self.header_parser = VCFHelper.get_vcf_parser(self.vcf_file, fast_reader=self.fast_reader, samples=self.samples)
+
+        # Recoder used to validate arguments and generate the output header
+        try:
+            self.recoder = VCFRecoder(self.header_parser, self.vcf_file, self.out_file, **self.recoder_args)
+        except:
+            self.header_parser.close()
+            raise
+
+    def get_shards(self):
+        # Return byte-range shards of the VCF, or lists of regions grouped by contig if regions were given
+        if self.regions is None:
+            return VCFHelper.get_byte_range_shards(self.vcf_file, self.num_threads * self.SHARDS_PER_THREAD)
+
+        shards = []
+        for region in VCFHelper.merge_regions(self.regions):
+            if len(shards) == 0 or shards[-1][-1][0] != region[0]:
+                shards.append([])
+            shards[-1].append(region)
+        return shards
+
+    def recode_vcf(self):
+        # Recode shards in parallel and combine them into a single output file
+        shards = self.get_shards()
+        logging.info("(ParallelVCFRecoder) Recoding %d shards with %d processes" % (len(shards), self.num_threads))
+
+        # Write shard output next to final output, or to the default temp directory when writing to stdout
+        out_dir = os.path.dirname(os.path.abspath(self.out_file)) if self.out_file != "-" else None
+        tmp_dir = tempfile.mkdtemp(prefix=".recode_shards.", dir=out_dir)
+        compressed = self.out_file != "-" and VCFRecoder.is_compressed_output(self.out_file)
+        shard_ext = ".tsv.gz" if compressed else ".tsv"
+        shard_files = [os.path.join(tmp_dir, "shard_%d%s" % (i, shard_ext)) for i in range(len(shards))]
+        shard_args = [(self.vcf_file, shards[i], shard_files[i], self.fast_reader, self.samples, self.recoder_args)
+                      for i in range(len(shards))]
+
+        pool = multiprocessing.Pool(self.num_threads)
+        try:
+            # Recode shards. Errors in any shard are re-raised here.
+            # Returns the index of each shard if an index is written
+            shard_indices = pool.map(recode_shard, shard_args, chunksize=1)
+            pool.close()
+
+            # Combine shards in order under a single header
+            header = "%s\n" % "\t".join(self.recoder.get_output_columns())
+            if compressed:
+                # Shards are BGZF blocks without EOF markers so they can be copied as is
+                out_fh = open(self.out_file, "wb")
+                out_fh.write(BGZFWriter.compress(header))
+            else:
+                out_fh = sys.stdout if self.out_file == "-" else open(self.out_file, "w")
+                out_fh.write(header)
+            self.header_parser.close()
+            index = RecodedVCFIndex(compressed=compressed)
+            for shard_file, shard_index in zip(shard_files, shard_indices):
+                if shard_index is not None:
+                    # Shard offsets are shifted by the position of the shard in the output
+                    # Compressed shards start at a block boundary so only the block offset is shifted
+                    index.append(shard_index, shift=out_fh.tell() << 16 if compressed else out_fh.tell())
+                with open(shard_file, "rb") as shard_fh:
+                    shutil.copyfileobj(shard_fh, out_fh, 16*1024*1024)
+            if compressed:
+                out_fh.write(BGZFWriter.EOF_BLOCK)
+            if out_fh is sys.stdout:
+                out_fh.flush()
+            else:
+                out_fh.close()
+
+            if self.recoder.write_index:
+                index.save(RecodedVCFIndex.get_index_file(self.out_file), self.out_file)
+
+        except:
+            pool.terminate()
+            raise
+
+        finally:
+            pool.join()
+            self.header_parser.close()
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def recode_shard(shard_args):
+    # Recode the records of a single VCF shard to a headerless output file
+    # Shards are either byte ranges or lists of regions
+    # Returns the index of the shard's records (offsets within the shard file) if an index is written
+    vcf_file, shard, shard_file, fast_reader, samples, recoder_args = shard_args
+    if isinstance(shard, list):
+        vcf_parser = VCFHelper.get_vcf_parser(vcf_file, fast_reader=fast_reader, regions=shard, samples=samples)
+    else:
+        vcf_parser = VCFHelper.get_vcf_parser(vcf_file, fast_reader=fast_reader, byte_range=shard, samples=samples)
+    vcf_recoder = VCFRecoder(vcf_parser, vcf_file, shard_file, **recoder_args)
+    shard_fh = VCFRecoder.open_output_file(shard_file, write_eof=False, index_blocks=vcf_recoder.write_index)
+    try:
+        vcf_recoder.recode_records(shard_fh)
+    finally:
+        shard_fh.close()
+
+    if vcf_recoder.index is not None and isinstance(shard_fh, BGZFWriter):
+        vcf_recoder.index.convert_offsets(shard_fh.get_virtual_offset)
+    return vcf_recoder.index
@@ -0,0 +1,190 @@
+import logging
+import numpy as np
+
+from BatchGenotypeRecoder import BatchGenotypeRecoder, ParseCache
+
+# pyarrow is only required for Parquet output
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+class ParquetRecodeWriter(object):
+    # Write recoded VCF records to a Parquet file with typed columns
+    # Columns are the fixed VCF columns, the selected INFO columns, the recoded genotype of each sample ('GT_<sample>'),
+    # and the depth of each sample ('DP_<sample>'). Raw FORMAT/sample columns aren't included.
+    # Rows are buffered and written as row groups while records are recoded, so memory use doesn't grow with the VCF.
+    # String columns other than ID are dictionary encoded. Missing values are written as nulls.
+
+    # Maximum number of rows in a row group
+    MAX_ROW_GROUP_ROWS = 65536
+
+    # Maximum number of values (rows x columns) buffered before a row group is written
+    MAX_ROW_GROUP_CELLS = 16*1024*1024
+
+    # Names and types of fixed VCF columns
+    FIXED_COLUMNS = [("CHROM", "category"), ("POS", "int"), ("ID", "string"), ("REF", "category"),
+                     ("ALT", "category"), ("QUAL", "float"), ("FILTER", "category")]
+
+    def __init__(self, out_file, vcf_parser, info_fields, sample_names, missing_gt_char):
+
+        if pa is None:
+            logging.error("(ParquetRecodeWriter) Writing Parquet output requires the 'pyarrow' package!")
+            raise IOError("Parquet output requires pyarrow!")
+
+        if out_file == "-":
+            logging.error("(ParquetRecodeWriter) Parquet output can't be written to stdout!")
+            raise IOError("Parquet output requires an output file!")
+
+        # Path to Parquet output file
+        self.out_file = out_file
+
+        # Names of INFO columns and samples in output order
+        self.info_fields = list(info_fields)
+        self.sample_names = list(sample_names)
+
+        # Placeholder for uncalled genotypes, which are written as nulls
+        self.missing_gt_char = missing_gt_char
+
+        # Type of each fixed and INFO column
+        self.column_types = [x[1] for x in self.FIXED_COLUMNS] + \
+                            [self.get_info_column_type(vcf_parser, x) for x in self.info_fields]
+
+        # Depths are integers unless a FORMAT field they're summed from is declared otherwise
+        self.depth_type = BatchGenotypeRecoder.get_depth_type(vcf_parser)
+
+        # Arrow schema of output file
+        self.schema = self.get_schema()
+
+        # Parsed values of recoded genotype and depth strings
+        self.genotype_values = ParseCache(self.__parse_genotype)
+        self.depth_values = ParseCache(int if self.depth_type == "int" else float)
+
+        # Rows buffered for the next row group
+        self.row_group_size = max(1, min(self.MAX_ROW_GROUP_ROWS, self.MAX_ROW_GROUP_CELLS / len(self.schema)))
+        self.__init_buffers()
+
+        self.writer = pq.ParquetWriter(self.out_file, self.schema)
+
+    @staticmethod
+    def get_info_column_type(vcf_parser, info_field):
+        # Return the column type of an INFO field based on its declaration in the VCF header
+        # Fields unpacked from snpeff annotations aren't declared and are always strings
+        if info_field not in vcf_parser.infos:
+            return "category"
+        info_type = vcf_parser.infos[info_field].type
+        if info_type == "Integer":
+            return "int"
+        elif info_type == "Float":
+            return "float"
+        elif info_type == "Flag":
+            return "bool"
+        return "category"
+
+    @staticmethod
+    def get_arrow_type(column_type):
+        return {"category"  : pa.dictionary(pa.int32(), pa.string()),
+                "string"    : pa.string(),
+                "int"       : pa.int64(),
+                "float"     : pa.float64(),
+                "bool"      : pa.bool_()}[column_type]
+
+    def get_schema(self):
+        # Return the Arrow schema of the output file
+        names = [x[0] for x in self.FIXED_COLUMNS] + self.info_fields
+        types = [self.get_arrow_type(x) for x in self.column_types]
+
+        names += ["GT_%s" % x for x in self.sample_names] + ["DP_%s" % x for x in self.sample_names]
+        types += [pa.float64()] * len(self.sample_names)
+        types += [pa.int32() if self.depth_type == "int" else pa.float64()] * len(self.sample_names)
+
+        duplicate_names = sorted(set([x for x in names if names.count(x) > 1]))
+        if len(duplicate_names) != 0:
+            logging.error("(ParquetRecodeWriter) Parquet column names must be unique! Duplicate columns:\n%s" %
+                          duplicate_names)
+            raise IOError("Duplicate column names in Parquet output!")
+
+        return pa.schema([pa.field(name, col_type) for name, col_type in zip(names, types)])
+
+    def __init_buffers(self):
+        # Values of each fixed and INFO column, and blocks of genotypes and depths
+        self.columns = [[] for _ in self.column_types]
+        self.genotype_blocks = []
+        self.depth_blocks = []
+        self.num_rows = 0
+
+    def write_rows(self, rows):
+        # Buffer a list of (record, info data, recoded genotypes and depths) rows produced by VCFRecoder
+        if len(rows) == 0:
+            return
+
+        num_samples = len(self.sample_names)
+        genotype_values = self.genotype_values
+        depth_values = self.depth_values
+        genotypes = []
+        depths = []
+        for record, info_data, genotype_data in rows:
+            values = self.get_fixed_values(record) + info_data
+            for column, value in zip(self.columns, values):
+                column.append(value)
+            genotypes.append([genotype_values[x] for x in genotype_data[:num_samples]])
+            depths.append([depth_values[x] for x in genotype_data[num_samples:]])
+
+        self.genotype_blocks.append(np.array(genotypes, dtype=np.float64).reshape(len(rows), num_samples))
+        self.depth_blocks.append(np.array(depths).reshape(len(rows), num_samples))
+        self.num_rows += len(rows)
+
+        if self.num_rows >= self.row_group_size:
+            self.__write_row_group()
+
+    @staticmethod
+    def get_fixed_values(record):
+        # Return the values of the fixed columns of a record. Missing values are None.
+        alt = str(record.ALT[0]) if len(record.ALT) > 0 and record.ALT[0] is not None else None
+        filter_data = record.FILTER
+        if isinstance(filter_data, list):
+            # Same representation as the tab-delimited output
+            filter_data = ",".join(filter_data) if len(filter_data) > 0 else "PASSED"
+        return [record.CHROM, record.POS, record.ID, record.REF, alt, record.QUAL, filter_data]
+
+    def __parse_genotype(self, genotype):
+        # Return the numerical value of a recoded genotype string. Missing genotypes are NaN.
+        if genotype == self.missing_gt_char:
+            return np.nan
+        return float(genotype)
+
+    def __write_row_group(self):
+        # Convert buffered rows into Arrow arrays and write them as a row group
+        if self.num_rows == 0:
+            return
+
+        arrays = []
+        for field, column_type, values in zip(self.schema, self.column_types, self.columns):
+            if column_type in ["category", "string"]:
+                values = [None if x is None else str(x) for x in values]
+            try:
+                array = pa.array(values, type=pa.string() if column_type == "category" else field.type)
+            except (pa.ArrowException, TypeError, ValueError):
+                logging.error("(ParquetRecodeWriter) Values of column '%s' don't match the type declared in the "
+                              "VCF header: %s" % (field.name, column_type))
+                raise IOError("Unable to convert column to its declared type!")
+            arrays.append(array.dictionary_encode() if column_type == "category" else array)
+
+        # Samples are stored as contiguous columns
+        genotypes = np.ascontiguousarray(np.vstack(self.genotype_blocks).T)
+        depths = np.ascontiguousarray(np.vstack(self.depth_blocks).T,
+                                      dtype=np.int32 if self.depth_type == "int" else np.float64)
+        arrays += [pa.array(x, mask=np.isnan(x)) for x in genotypes]
+        arrays += [pa.array(x) for x in depths]
+
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        self.__init_buffers()
+
+    def close(self):
+        # Write remaining rows and close the file
+        try:
+            self.__write_row_group()
+        finally:
+            self.writer.close()
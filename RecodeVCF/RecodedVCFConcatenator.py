@@ -0,0 +1,251 @@
+import heapq
+import logging
+import re
+import sys
+import zlib
+
+from VCF import BGZFReader
+from VCFRecoder import VCFRecoder
+
+class RecodedVCFConcatenator(object):
+    # Concatenate recoded VCF files that share the same header into a single recoded file
+    # The body of each file is copied in large blocks after its header line is skipped. Input files may be plain text,
+    # gzip, or BGZF compressed, and output ending with '.gz' or '.bgz' is BGZF compressed.
+    # Every line is checked to have as many columns as the header while it's copied. Empty lines are dropped, as files
+    # recoded before raw sample columns were passed through have a blank line after every record.
+    # With sorted_merge, inputs that are each sorted by (CHROM, POS) are merged into a single sorted file instead, using a
+    # heap holding the next record of each input. Exact duplicate records (e.g. at shard boundaries) are written once.
+
+    # Size of blocks read from input files
+    COPY_BLOCK_SIZE = 4*1024*1024
+
+    # Size of blocks read from each input while merging, which is kept small as every input is open at once
+    MERGE_BLOCK_SIZE = 64*1024
+
+    # Number of merged lines written together
+    MERGE_WRITE_LINES = 4096
+
+    def __init__(self, input_files, out_file, compress_threads=1, sorted_merge=False, contig_order=None):
+
+        # Paths to recoded input files in output order
+        self.input_files = input_files
+
+        # Path to combined output file ('-' for stdout)
+        self.out_file = out_file
+
+        # Number of threads used to compress BGZF output
+        self.compress_threads = compress_threads
+
+        # Whether to merge sorted inputs by position instead of concatenating them
+        self.sorted_merge = sorted_merge
+
+        # Optional list of contigs in sort order. Contigs are sorted by name with numbers compared numerically otherwise.
+        self.contig_order = contig_order
+        self.contig_keys = {} if contig_order is None else dict([(x, i) for i, x in enumerate(contig_order)])
+
+    @staticmethod
+    def read_blocks(path, block_size=COPY_BLOCK_SIZE):
+        # Generate blocks of decompressed data from a plain text, gzip, or BGZF compressed file
+        # Compressed files can contain multiple gzip members (e.g. every block of a BGZF file)
+        compressed = BGZFReader.is_gzip(path)
+        with open(path, "rb") as fh:
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            data = fh.read(block_size)
+            while data:
+                if not compressed:
+                    yield data
+                else:
+                    text = decompressor.decompress(data)
+
+                    # Start a new decompressor whenever a member ends within the block
+                    while decompressor.unused_data:
+                        data = decompressor.unused_data
+                        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                        text += decompressor.decompress(data)
+                    if text:
+                        yield text
+                data = fh.read(block_size)
+
+    @staticmethod
+    def get_header(path):
+        # Return the header line of a recoded file without its newline
+        pieces = []
+        for data in RecodedVCFConcatenator.read_blocks(path):
+            end = data.find("\n")
+            if end != -1:
+                pieces.append(data[:end])
+                break
+            pieces.append(data)
+        return "".join(pieces)
+
+    def check_headers(self):
+        # Check to make sure column headers are all the same.
+        # Return header if so. Throw error if not.
+        header = None
+        for input_file in self.input_files:
+
+            # Get header line from next file
+            first_line = self.get_header(input_file)
+            if first_line == "":
+                logging.error("(RecodedVCFConcatenator) Input file is empty or missing its header: %s" % input_file)
+                raise IOError("Input files must have a header line!")
+
+            # Set header string to be first
+            if header is None:
+                header = first_line
+                continue
+
+            # Check to make sure columns are in same order
+            if first_line != header:
+                logging.error("Input files do not contain same columns in same order!")
+                logging.error("Expected:\n%s" % header)
+                logging.error("Received from %s:\n%s" % (input_file, first_line))
+                raise IOError("Input files much have same number of columns in same order!")
+        return header
+
+    def concat(self):
+        # Write the shared header followed by the body of every input file
+        header = self.check_headers()
+        num_tabs = header.count("\t")
+
+        out_file_handle = VCFRecoder.open_output_file(self.out_file, compress_threads=self.compress_threads)
+        try:
+            out_file_handle.write("%s\n" % header)
+            if self.sorted_merge:
+                self.__merge_bodies(out_file_handle, num_tabs)
+            else:
+                for input_file in self.input_files:
+                    logging.debug("(RecodedVCFConcatenator) Copying records from %s" % input_file)
+                    for lines in self.read_body(input_file, num_tabs):
+                        out_file_handle.write(lines)
+        finally:
+            if out_file_handle is not sys.stdout:
+                out_file_handle.close()
+            else:
+                out_file_handle.flush()
+
+    def read_body(self, path, num_tabs, block_size=COPY_BLOCK_SIZE):
+        # Generate blocks of complete lines following the header of a file
+        # Blocks end at their last complete line so each line can be checked before it's written
+        in_header = True
+        remainder = ""
+        for data in self.read_blocks(path, block_size):
+            if in_header:
+                # Skip data up to the end of the header line
+                end = data.find("\n")
+                if end == -1:
+                    continue
+                data = data[end+1:]
+                in_header = False
+
+            end = data.rfind("\n")
+            if end == -1:
+                remainder += data
+                continue
+
+            lines = self.remove_empty_lines(remainder + data[:end+1])
+            remainder = data[end+1:]
+            if lines:
+                self.check_columns(lines, num_tabs, path)
+                yield lines
+
+        # Complete the last line if the file doesn't end with a newline
+        if remainder:
+            lines = remainder + "\n"
+            self.check_columns(lines, num_tabs, path)
+            yield lines
+
+    @staticmethod
+    def remove_empty_lines(lines):
+        # Remove empty lines from a block of complete lines
+        if not lines.startswith("\n") and "\n\n" not in lines:
+            return lines
+        return "".join(["%s\n" % x for x in lines[:-1].split("\n") if x != ""])
+
+    @staticmethod
+    def check_columns(lines, num_tabs, path):
+        # Check that every non-empty line of a block of complete lines has the same number of columns as the header
+        for line in lines[:-1].split("\n"):
+            if line != "" and line.count("\t") != num_tabs:
+                logging.error("(RecodedVCFConcatenator) Line of %s doesn't contain the same number of columns as "
+                              "header (expected %d, got %d):\n%s" %
+                              (path, num_tabs + 1, line.count("\t") + 1, line[:200]))
+                raise IOError("Recoded file contains different number of columns than header!")
+
+    def get_contig_key(self, contig):
+        # Return the sort key of a contig
+        key = self.contig_keys.get(contig)
+        if key is None:
+            if self.contig_order is not None:
+                logging.error("(RecodedVCFConcatenator) Contig '%s' doesn't appear in the contig order!" % contig)
+                raise IOError("Contig missing from contig order!")
+
+            # Compare numbers within contig names numerically (e.g. chr2 < chr10)
+            key = tuple([int(x) if x.isdigit() else x for x in re.split(r"(\d+)", contig)])
+            self.contig_keys[contig] = key
+        return key
+
+    def read_records(self, path, num_tabs):
+        # Generate the (contig key, position, line) of each record of a file that's sorted by contig and position
+        last_key = None
+        for lines in self.read_body(path, num_tabs, block_size=self.MERGE_BLOCK_SIZE):
+            for line in lines[:-1].split("\n"):
+                chrom, pos, _ = line.split("\t", 2)
+                try:
+                    key = (self.get_contig_key(chrom), int(pos))
+                except ValueError:
+                    logging.error("(RecodedVCFConcatenator) Invalid position in %s:\n%s" % (path, line[:200]))
+                    raise IOError("Recoded file contains an invalid position!")
+
+                if last_key is not None and key < last_key:
+                    logging.error("(RecodedVCFConcatenator) Records of %s aren't sorted by contig and position! "
+                                  "%s:%s follows a record at a later position." % (path, chrom, pos))
+                    raise IOError("Recoded files must be sorted to be merged!")
+                last_key = key
+                yield key[0], key[1], line
+
+    def __merge_bodies(self, out_file_handle, num_tabs):
+        # Merge the records of sorted files by contig and position and write them to an open file handle
+        # Records at the same position are written in input file order. Lines already written at the current
+        # position are remembered so exact duplicates are only written once.
+        readers = [self.read_records(x, num_tabs) for x in self.input_files]
+
+        # Next (contig key, position, input index, line) of each input
+        heap = []
+        for i, reader in enumerate(readers):
+            for contig_key, pos, line in reader:
+                heap.append((contig_key, pos, i, line))
+                break
+        heapq.heapify(heap)
+
+        lines = []
+        position = None
+        position_lines = set()
+        num_duplicates = 0
+        while heap:
+            contig_key, pos, i, line = heap[0]
+
+            if (contig_key, pos) != position:
+                position = (contig_key, pos)
+                position_lines = set()
+
+            if line in position_lines:
+                num_duplicates += 1
+            else:
+                position_lines.add(line)
+                lines.append(line)
+                if len(lines) == self.MERGE_WRITE_LINES:
+                    out_file_handle.write("%s\n" % "\n".join(lines))
+                    lines = []
+
+            # Replace the written record with the next record of the same input
+            for contig_key, pos, line in readers[i]:
+                heapq.heapreplace(heap, (contig_key, pos, i, line))
+                break
+            else:
+                heapq.heappop(heap)
+
+        if lines:
+            out_file_handle.write("%s\n" % "\n".join(lines))
+
+        logging.info("(RecodedVCFConcatenator) Dropped %d duplicate records" % num_duplicates)
@@ -0,0 +1,181 @@
+import logging
+import os
+import struct
+from bisect import bisect_left
+
+class RecodedVCFIndex(object):
+    # Sidecar index of a coordinate-sorted recoded VCF file for random access by genomic region
+    # Positions of each contig are divided into bins, and each bin with records is mapped to the offset of the first record
+    # overlapping it. Offsets are byte offsets for plain text files and virtual offsets for BGZF compressed files.
+    # Records of a contig must be contiguous and sorted by position, as in recoded output of a sorted VCF.
+    #
+    # Binary layout (little endian):
+    #   'RVI\1', bin size (int32), compressed flag (uint8), size of the indexed file (int64), number of contigs (int32)
+    #   For each contig: name length (int32), name, file position of its entries (int64), number of entries (int32)
+    #   Entries of each contig: bins (uint32 each) followed by offsets (uint64 each)
+
+    MAGIC = "RVI\1"
+
+    # Number of positions in each bin
+    DEFAULT_BIN_SIZE = 16384
+
+    def __init__(self, bin_size=DEFAULT_BIN_SIZE, compressed=False):
+
+        # Number of positions in each bin
+        self.bin_size = bin_size
+
+        # Whether offsets are BGZF virtual offsets
+        self.compressed = compressed
+
+        # Contig names in file order
+        self.contigs = []
+
+        # Per-contig ascending list of bins with records, and offset of the first record overlapping each bin
+        self.bins = {}
+        self.offsets = {}
+
+        # Per-contig first and last record positions, used to check that records are sorted
+        self.positions = {}
+
+        # File position and number of entries of each contig in a loaded index. Entries are read when first queried.
+        self.index_file = None
+        self.contig_entries = {}
+
+    @staticmethod
+    def get_index_file(path):
+        # Return the path of the index of a recoded file
+        return "%s.rvi" % path
+
+    def add_record(self, chrom, pos, end, offset):
+        # Add a record spanning positions pos-end (1-based, inclusive) that starts at an offset
+        # Records must be added in file order
+        if chrom not in self.positions:
+            self.contigs.append(chrom)
+            self.bins[chrom] = []
+            self.offsets[chrom] = []
+            self.positions[chrom] = [pos, pos]
+
+        elif chrom != self.contigs[-1] or pos < self.positions[chrom][1]:
+            logging.error("(RecodedVCFIndex) Records must be sorted by position with each contig in a single block to "
+                          "be indexed! Record at %s:%d is out of order." % (chrom, pos))
+            raise IOError("Unable to index unsorted records!")
+
+        self.positions[chrom][1] = pos
+        self.__add_bins(chrom, (pos - 1) / self.bin_size, (max(pos, end) - 1) / self.bin_size, offset)
+
+    def __add_bins(self, chrom, first_bin, last_bin, offset):
+        # Map bins that don't have an earlier record to an offset
+        bins = self.bins[chrom]
+        if len(bins) > 0:
+            first_bin = max(first_bin, bins[-1] + 1)
+        for bin_num in range(first_bin, last_bin + 1):
+            bins.append(bin_num)
+            self.offsets[chrom].append(offset)
+
+    def convert_offsets(self, convert):
+        # Replace every offset with the result of a function (e.g. to convert uncompressed offsets to virtual offsets)
+        for chrom in self.contigs:
+            self.offsets[chrom] = [convert(x) for x in self.offsets[chrom]]
+
+    def append(self, other, shift=0):
+        # Add the entries of the index of a file that's appended to the indexed file
+        # Offsets of the appended index are shifted by the offset the file is appended at
+        for chrom in other.contigs:
+            first_pos, last_pos = other.positions[chrom]
+            if chrom in self.positions and (chrom != self.contigs[-1] or first_pos < self.positions[chrom][1]):
+                logging.error("(RecodedVCFIndex) Records must be sorted by position with each contig in a single block "
+                              "to be indexed! Record at %s:%d is out of order." % (chrom, first_pos))
+                raise IOError("Unable to index unsorted records!")
+
+            if chrom not in self.positions:
+                self.contigs.append(chrom)
+                self.bins[chrom] = []
+                self.offsets[chrom] = []
+                self.positions[chrom] = [first_pos, last_pos]
+            self.positions[chrom][1] = last_pos
+
+            for bin_num, offset in zip(other.bins[chrom], other.offsets[chrom]):
+                self.__add_bins(chrom, bin_num, bin_num, offset + shift)
+
+    def save(self, index_file, data_file):
+        # Write the index of a data file
+        # Entries of each contig follow a table of contents so a query only reads the entries of a single contig
+        toc_size = len(self.MAGIC) + struct.calcsize("<iBqi") + \
+                   sum([struct.calcsize("<i") + len(x) + struct.calcsize("<qi") for x in self.contigs])
+        with open(index_file, "wb") as index_fh:
+            index_fh.write(self.MAGIC)
+            index_fh.write(struct.pack("<iBqi", self.bin_size, self.compressed, os.path.getsize(data_file),
+                                       len(self.contigs)))
+            entry_pos = toc_size
+            for chrom in self.contigs:
+                num_entries = len(self.bins[chrom])
+                index_fh.write(struct.pack("<i", len(chrom)) + chrom + struct.pack("<qi", entry_pos, num_entries))
+                entry_pos += num_entries * struct.calcsize("<IQ")
+
+            for chrom in self.contigs:
+                num_entries = len(self.bins[chrom])
+                index_fh.write(struct.pack("<%dI" % num_entries, *self.bins[chrom]))
+                index_fh.write(struct.pack("<%dQ" % num_entries, *self.offsets[chrom]))
+
+    @staticmethod
+    def load(index_file, data_file):
+        # Read the table of contents of the index of a data file
+        with open(index_file, "rb") as index_fh:
+            if index_fh.read(len(RecodedVCFIndex.MAGIC)) != RecodedVCFIndex.MAGIC:
+                logging.error("(RecodedVCFIndex) Invalid recoded VCF index: %s" % index_file)
+                raise IOError("Invalid index file!")
+
+            bin_size, compressed, data_size, num_contigs = struct.unpack("<iBqi", index_fh.read(struct.calcsize("<iBqi")))
+            if data_size != os.path.getsize(data_file):
+                logging.error("(RecodedVCFIndex) Index was created for a different version of the recoded file! "
+                              "Re-create the index: %s" % index_file)
+                raise IOError("Index doesn't match recoded file!")
+
+            index = RecodedVCFIndex(bin_size=bin_size, compressed=bool(compressed))
+            index.index_file = index_file
+            for _ in range(num_contigs):
+                name_len = struct.unpack("<i", index_fh.read(4))[0]
+                chrom = index_fh.read(name_len)
+                index.contigs.append(chrom)
+                index.contig_entries[chrom] = struct.unpack("<qi", index_fh.read(struct.calcsize("<qi")))
+        return index
+
+    def __load_contig(self, chrom):
+        # Read the entries of a contig from a loaded index file
+        entry_pos, num_entries = self.contig_entries[chrom]
+        with open(self.index_file, "rb") as index_fh:
+            index_fh.seek(entry_pos)
+            self.bins[chrom] = list(struct.unpack("<%dI" % num_entries, index_fh.read(4 * num_entries)))
+            self.offsets[chrom] = list(struct.unpack("<%dQ" % num_entries, index_fh.read(8 * num_entries)))
+
+    def get_offset(self, chrom, start):
+        # Return the offset to start reading records overlapping positions >= start on a contig
+        # Returns None if no records can overlap
+        if chrom not in self.bins:
+            if chrom not in self.contig_entries:
+                return None
+            self.__load_contig(chrom)
+
+        i = bisect_left(self.bins[chrom], (start - 1) / self.bin_size)
+        return self.offsets[chrom][i] if i < len(self.offsets[chrom]) else None
+
+    def query(self, data_fh, chrom, start, end):
+        # Generate the (offset, line) of each record of an open data file overlapping a region (1-based, inclusive)
+        # The data file must be a plain file opened in binary mode or a BGZFReader
+        offset = self.get_offset(chrom, start)
+        if offset is None:
+            return
+
+        data_fh.seek(offset)
+        while True:
+            line = data_fh.readline()
+            if not line:
+                break
+            fields = line.split("\t", 4)
+            pos = int(fields[1])
+            if fields[0] != chrom or pos > end:
+                # Records are sorted so the rest of the file is past the region
+                break
+            if pos + len(fields[3]) - 1 >= start:
+                yield offset, line
+            offset = data_fh.tell()
@@ -0,0 +1,260 @@
+import gzip
+import heapq
+import logging
+import sys
+
+from VCF import VCFHelper
+from VCFRecoder import VCFRecoder
+from RecodedVCFConcatenator import RecodedVCFConcatenator
+from RecodedVCFSchema import RecodedVCFSchema
+
+class RecodedVCFJoiner(RecodedVCFConcatenator):
+    # Join recoded VCF files with different samples into a single table with the samples of every file
+    # Rows are matched on their variant key (CHROM, POS, REF, ALT). Fixed and INFO columns are taken from the first file
+    # containing a variant. Samples of files that don't contain a variant get missing genotypes, zero depths, and
+    # missing ('.') raw sample columns. Raw sample columns are reformatted when files use different FORMAT fields.
+    # With sorted_merge, files sorted by (CHROM, POS) are joined in a single streaming pass holding only the records
+    # at the current position. Otherwise records are matched through an index of each file's variant keys.
+
+    # Placeholder for raw sample columns of files that don't contain a variant
+    MISSING_SAMPLE = "."
+
+    def __init__(self, input_files, out_file, compress_threads=1, sorted_merge=False, contig_order=None,
+                 missing_gt_char="NA"):
+
+        RecodedVCFConcatenator.__init__(self, input_files, out_file,
+                                        compress_threads=compress_threads,
+                                        sorted_merge=sorted_merge,
+                                        contig_order=contig_order)
+
+        # Placeholder for genotypes of samples in files that don't contain a variant
+        self.missing_gt_char = missing_gt_char
+
+        # Fixed and INFO columns shared by every file, and names of samples in each file
+        self.variant_columns = None
+        self.sample_names = []
+        self.__read_headers()
+
+    def __read_headers(self):
+        # Get the variant columns and samples of each file and check that they can be joined
+        for input_file in self.input_files:
+            schema = RecodedVCFSchema.from_header(self.get_header(input_file), input_file)
+            variant_columns = schema.variant_columns
+            if self.variant_columns is None:
+                self.variant_columns = variant_columns
+            elif variant_columns != self.variant_columns:
+                logging.error("(RecodedVCFJoiner) Input files do not contain the same fixed and INFO columns!")
+                logging.error("Expected:\n%s" % "\t".join(self.variant_columns))
+                logging.error("Received from %s:\n%s" % (input_file, "\t".join(variant_columns)))
+                raise IOError("Input files must have the same fixed and INFO columns to be joined!")
+            self.sample_names.append(schema.sample_names)
+
+        all_samples = sum(self.sample_names, [])
+        duplicate_samples = sorted(set([x for x in all_samples if all_samples.count(x) > 1]))
+        if len(duplicate_samples) != 0:
+            logging.error("(RecodedVCFJoiner) The following samples appear in more than one input file:\n%s" %
+                          duplicate_samples)
+            raise IOError("Input files must contain different samples to be joined!")
+
+    def get_output_columns(self):
+        # Combine columns of every file into a single header
+        all_samples = sum(self.sample_names, [])
+        return self.variant_columns + all_samples + all_samples + ["FORMAT"] + all_samples
+
+    def get_num_tabs(self, i):
+        # Return the number of tabs in each line of an input file
+        return len(self.variant_columns) + 3*len(self.sample_names[i])
+
+    @staticmethod
+    def get_variant_key(cols):
+        # Return the (CHROM, POS, REF, ALT) key of a split row
+        return cols[0], cols[1], cols[3], cols[4]
+
+    def join(self):
+        # Write the combined header followed by joined rows
+        out_file_handle = VCFRecoder.open_output_file(self.out_file, compress_threads=self.compress_threads)
+        try:
+            out_file_handle.write("%s\n" % "\t".join(self.get_output_columns()))
+            if self.sorted_merge:
+                self.__merge_join(out_file_handle)
+            else:
+                self.__hash_join(out_file_handle)
+        finally:
+            if out_file_handle is not sys.stdout:
+                out_file_handle.close()
+            else:
+                out_file_handle.flush()
+
+    def __join_row(self, rows):
+        # Return the joined output line of a variant from a list of the split rows of each file (None if absent)
+        num_variant_columns = len(self.variant_columns)
+        present_rows = [x for x in rows if x is not None]
+
+        # Samples are reformatted to the FORMAT fields of every file when files use different FORMAT fields
+        formats = [cols[num_variant_columns+2*len(samples)] for cols, samples in zip(rows, self.sample_names)
+                   if cols is not None]
+        out_format = formats[0]
+        if formats.count(out_format) != len(formats):
+            format_keys = []
+            for sample_format in formats:
+                format_keys += [x for x in sample_format.split(":") if x not in format_keys]
+            out_format = ":".join(format_keys)
+
+        genotypes = []
+        depths = []
+        raw_samples = []
+        for cols, samples in zip(rows, self.sample_names):
+            num_samples = len(samples)
+            if cols is None:
+                genotypes += [self.missing_gt_char] * num_samples
+                depths += ["0"] * num_samples
+                raw_samples += [self.MISSING_SAMPLE] * num_samples
+                continue
+
+            genotypes += cols[num_variant_columns:num_variant_columns+num_samples]
+            depths += cols[num_variant_columns+num_samples:num_variant_columns+2*num_samples]
+            sample_format = cols[num_variant_columns+2*num_samples]
+            sample_cols = cols[num_variant_columns+2*num_samples+1:]
+            if sample_format != out_format:
+                sample_cols = self.reformat_samples(sample_cols, sample_format, out_format)
+            raw_samples += sample_cols
+
+        return "\t".join(present_rows[0][:num_variant_columns] + genotypes + depths + [out_format] + raw_samples)
+
+    @staticmethod
+    def reformat_samples(sample_cols, sample_format, out_format):
+        # Rewrite raw sample columns to a different list of FORMAT fields. Fields a sample doesn't have are missing ('.').
+        sample_keys = sample_format.split(":")
+        out_keys = out_format.split(":")
+        reformatted = []
+        for sample in sample_cols:
+            values = dict(zip(sample_keys, sample.split(":")))
+            reformatted.append(":".join([values.get(x, ".") for x in out_keys]))
+        return reformatted
+
+    def __group_rows(self, lines, i, rows, keys):
+        # Add the split rows of the i-th file to a dict of variant key -> rows of each file
+        # Keys not seen before are appended to a list of keys in order of appearance
+        for line in lines:
+            cols = line.split("\t")
+            key = self.get_variant_key(cols)
+            if key not in rows:
+                rows[key] = [None] * len(self.input_files)
+                keys.append(key)
+            elif rows[key][i] is not None:
+                logging.error("(RecodedVCFJoiner) Variant %s appears more than once in %s!" %
+                              (":".join(key), self.input_files[i]))
+                raise IOError("Variants must be unique within each file to be joined!")
+            rows[key][i] = cols
+
+    def __merge_join(self, out_file_handle):
+        # Join files sorted by contig and position, reading all records of the files at one position at a time
+        readers = [self.read_records(x, self.get_num_tabs(i)) for i, x in enumerate(self.input_files)]
+
+        # Next (contig key, position, input index, line) of each input
+        heap = []
+        for i, reader in enumerate(readers):
+            for contig_key, pos, line in reader:
+                heap.append((contig_key, pos, i, line))
+                break
+        heapq.heapify(heap)
+
+        lines = []
+        while heap:
+            # Records of every file at the next position
+            position = heap[0][:2]
+            position_lines = [[] for _ in self.input_files]
+            while heap and heap[0][:2] == position:
+                i = heap[0][2]
+                position_lines[i].append(heap[0][3])
+                for contig_key, pos, line in readers[i]:
+                    heapq.heapreplace(heap, (contig_key, pos, i, line))
+                    break
+                else:
+                    heapq.heappop(heap)
+
+            # Variants at the position are written in the order they first appear in the input files
+            rows = {}
+            keys = []
+            for i, input_lines in enumerate(position_lines):
+                self.__group_rows(input_lines, i, rows, keys)
+            lines += [self.__join_row(rows[x]) for x in keys]
+
+            if len(lines) >= self.MERGE_WRITE_LINES:
+                out_file_handle.write("%s\n" % "\n".join(lines))
+                lines = []
+
+        if lines:
+            out_file_handle.write("%s\n" % "\n".join(lines))
+
+    def __index_file(self, i):
+        # Return a dict of variant key -> location of each record of an input file and an open handle to read them
+        # Locations are offsets in plain text and BGZF files, or the lines themselves in gzip files, which can't be seeked
+        path = self.input_files[i]
+        num_tabs = self.get_num_tabs(i)
+        vcf_fh = VCFHelper.open_vcf(path)
+        store_lines = isinstance(vcf_fh, gzip.GzipFile)
+        index = {}
+        vcf_fh.readline()
+        while True:
+            offset = vcf_fh.tell()
+            line = vcf_fh.readline()
+            if not line:
+                break
+            line = line.rstrip("\n")
+            if line == "":
+                continue
+            self.check_columns("%s\n" % line, num_tabs, path)
+            key = self.get_variant_key(line.split("\t", 5))
+            if key in index:
+                logging.error("(RecodedVCFJoiner) Variant %s appears more than once in %s!" % (":".join(key), path))
+                raise IOError("Variants must be unique within each file to be joined!")
+            index[key] = line if store_lines else offset
+        return index, vcf_fh
+
+    @staticmethod
+    def __read_indexed_line(index_entry, vcf_fh):
+        # Return a line of an indexed file without its newline
+        if isinstance(index_entry, str):
+            return index_entry
+        vcf_fh.seek(index_entry)
+        return vcf_fh.readline().rstrip("\n")
+
+    def __hash_join(self, out_file_handle):
+        # Join unsorted files by indexing the variant keys of every file after the first
+        # Variants are written in the order of the first file, followed by variants that only appear in later files in
+        # the order of the first file they appear in
+        indices = [None] + [self.__index_file(i) for i in range(1, len(self.input_files))]
+        written_keys = set()
+        try:
+            for i, input_file in enumerate(self.input_files):
+                lines = []
+                for block in self.read_body(input_file, self.get_num_tabs(i)):
+                    for line in block[:-1].split("\n"):
+                        cols = line.split("\t")
+                        key = self.get_variant_key(cols)
+                        if key in written_keys:
+                            if i == 0:
+                                logging.error("(RecodedVCFJoiner) Variant %s appears more than once in %s!" %
+                                              (":".join(key), input_file))
+                                raise IOError("Variants must be unique within each file to be joined!")
+                            continue
+                        written_keys.add(key)
+
+                        # Files before this one don't contain the variant
+                        rows = [None] * i + [cols]
+                        for index, vcf_fh in indices[i+1:]:
+                            index_entry = index.get(key)
+                            rows.append(None if index_entry is None else
+                                        self.__read_indexed_line(index_entry, vcf_fh).split("\t"))
+                        lines.append(self.__join_row(rows))
+
+                        if len(lines) >= self.MERGE_WRITE_LINES:
+                            out_file_handle.write("%s\n" % "\n".join(lines))
+                            lines = []
+
+                if lines:
+                    out_file_handle.write("%s\n" % "\n".join(lines))
+        finally:
+            for index in indices[1:]:
+                index[1].close()
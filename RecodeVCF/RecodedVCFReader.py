@@ -0,0 +1,468 @@
+import itertools
+import logging
+import struct
+import zipfile
+from collections import OrderedDict
+import numpy as np
+
+from BatchGenotypeRecoder import ParseCache
+from RecodedVCFSchema import RecodedVCFSchema
+from RecodedVCFConcatenator import RecodedVCFConcatenator
+from SparseGenotypeWriter import SparseGenotypeWriter
+
+# pyarrow is only required to read Parquet output
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+class RecodedVCFChunk(object):
+    # Consecutive records of a recoded file read together by RecodedVCFReader
+
+    def __init__(self, schema, variants, categories, genotypes, depths, formats=None, raw_samples=None):
+
+        # Schema of the file the records were read from
+        self.schema = schema
+
+        # Values of each selected fixed and INFO column. POS and QUAL are NumPy arrays (QUAL is NaN if missing), categorical
+        # columns are arrays of codes into their list of categories (-1 for missing), and other columns are lists of
+        # strings (None for missing).
+        self.variants = variants
+        self.categories = categories
+
+        # (records x samples) arrays of recoded genotypes (NaN if missing) and depths (of the schema's depth type), or None
+        # if they weren't read
+        self.genotypes = genotypes
+        self.depths = depths
+
+        # FORMAT column and list of raw sample columns of each record, or None if they weren't read
+        self.formats = formats
+        self.raw_samples = raw_samples
+
+        self.num_records = len(variants.values()[0]) if len(variants) > 0 else \
+            len(genotypes) if genotypes is not None else len(depths) if depths is not None else 0
+
+    def __len__(self):
+        return self.num_records
+
+class RecodedVCFReader(object):
+    # Read the records of a recoded VCF file in chunks of NumPy arrays
+    # The header is parsed once into a RecodedVCFSchema. Recoded genotypes and depths of each chunk are returned as
+    # (records x samples) arrays, and fixed and INFO columns as lists, arrays of numbers (POS, QUAL), or categorical
+    # codes. Blocks of columns that aren't requested are never parsed: rows of tab-delimited files are only split up to
+    # the last requested block, and Parquet files only decode the requested columns.
+    # Reads tab-delimited output (plain text, gzip, or BGZF compressed), Parquet output (--format parquet), and sparse
+    # genotype matrices (--genotype-matrix sparse). Binary formats are memory mapped so only the parts of the file that
+    # are read are loaded: Parquet files through pyarrow, and the arrays of .npz files that are stored uncompressed
+    # (RecodeVCF.py --uncompressed-matrix).
+    # Genotypes that aren't stored in a sparse matrix (homozygous REF or missing) are NaN with a depth of 0.
+    # Values are returned the same way for every format: missing data placeholders of text columns become missing values
+    # like the nulls of Parquet files, and depths have the type recorded in the schema instead of the type of each chunk.
+
+    # Default number of records in each chunk
+    DEFAULT_CHUNK_SIZE = 10000
+
+    # Leading bytes of binary file formats
+    PARQUET_MAGIC = "PAR1"
+    NPZ_MAGIC = "PK\x03\x04"
+
+    def __init__(self, path, chunk_size=DEFAULT_CHUNK_SIZE, columns=None, categorical_columns=None,
+                 read_genotypes=True, read_depths=True, read_raw_samples=False, memory_map=True,
+                 missing_data_char=".", depth_dtype=np.int32):
+
+        # Path to recoded file
+        self.path = path
+
+        # Maximum number of records in each chunk
+        self.chunk_size = max(1, chunk_size)
+
+        # Format of recoded file ('tsv', 'parquet', or 'sparse')
+        self.file_format = self.get_file_format(path)
+
+        # Whether binary formats are memory mapped instead of read into memory
+        self.memory_map = memory_map
+        self.parquet_file = None
+
+        # Placeholder of missing values in text columns (RecodeVCF.py --missing-data-char)
+        self.missing_data_char = missing_data_char
+
+        # Type of the depths of tab-delimited files, which don't record it (np.int32 or np.float64)
+        # Parquet files and sparse matrices use the type they were written with
+        self.depth_dtype = depth_dtype
+
+        # Column layout of recoded file
+        self.schema = self.__read_schema()
+
+        # Fixed and INFO columns returned with each chunk. Default: ALL.
+        self.columns = list(self.schema.variant_columns) if columns is None else list(columns)
+        self.column_indices = [self.schema.get_variant_index(x) for x in self.columns]
+
+        # Columns returned as codes into a list of categories that grows as new values are read
+        self.categorical_columns = set() if categorical_columns is None else set(categorical_columns)
+        missing_columns = [x for x in self.categorical_columns if x not in self.columns]
+        if len(missing_columns) != 0:
+            logging.error("(RecodedVCFReader) Categorical columns must be selected columns of the recoded file:\n%s" %
+                          missing_columns)
+            raise IOError("Categorical column not found in recoded file!")
+        self.categories = dict([(x, []) for x in self.categorical_columns])
+        self.category_codes = dict([(x, {}) for x in self.categorical_columns])
+
+        # Blocks of sample columns returned with each chunk
+        self.read_genotypes = read_genotypes
+        self.read_depths = read_depths
+        self.read_raw_samples = read_raw_samples
+        if read_raw_samples and self.file_format != "tsv":
+            logging.error("(RecodedVCFReader) Raw sample columns are only included in tab-delimited recoded files!")
+            raise IOError("Recoded file doesn't contain raw sample columns!")
+
+        # Parsed values of numbers, which repeat across samples and records
+        self.float_values = ParseCache(self.parse_float)
+
+    @staticmethod
+    def get_file_format(path):
+        # Return the format of a recoded file from its leading bytes
+        with open(path, "rb") as fh:
+            magic = fh.read(4)
+        if magic == RecodedVCFReader.PARQUET_MAGIC:
+            return "parquet"
+        elif magic == RecodedVCFReader.NPZ_MAGIC:
+            return "sparse"
+        return "tsv"
+
+    @staticmethod
+    def parse_float(value):
+        # Return the value of a number or NaN if the value is missing
+        try:
+            return float(value)
+        except ValueError:
+            return np.nan
+
+    def __read_schema(self):
+        # Parse the column layout of the recoded file
+        if self.file_format == "tsv":
+            header = RecodedVCFConcatenator.get_header(self.path)
+            if header.startswith("SAMPLE\t"):
+                logging.error("(RecodedVCFReader) Sample-major (--transpose) output can't be read one record at a "
+                              "time: %s" % self.path)
+                raise IOError("Unable to read sample-major recoded file!")
+            return RecodedVCFSchema.from_header(header, self.path, depth_dtype=self.depth_dtype)
+
+        elif self.file_format == "parquet":
+            if pq is None:
+                logging.error("(RecodedVCFReader) Reading Parquet files requires the 'pyarrow' package!")
+                raise IOError("Reading Parquet files requires pyarrow!")
+            self.parquet_file = pq.ParquetFile(self.path, memory_map=self.memory_map)
+            return self.__get_parquet_schema(self.parquet_file.schema.to_arrow_schema())
+
+        # Fixed and INFO columns of sparse matrix rows are in a separate table
+        # Depths are stored as int32, or float32 if they aren't integers
+        variant_file = SparseGenotypeWriter.get_variant_file(self.path)
+        header = RecodedVCFConcatenator.get_header(variant_file)
+        with np.load(self.path) as npz:
+            samples = [str(x) for x in npz["samples"]]
+        depth_dtype = np.int32 if self.__get_npz_header("depths")[2] == np.int32 else np.float64
+        return RecodedVCFSchema(header.split("\t"), samples, file_format="sparse", depth_dtype=depth_dtype)
+
+    def __get_parquet_schema(self, arrow_schema):
+        # Return the schema of a Parquet file with 'GT_<sample>' and 'DP_<sample>' columns following the variant columns
+        # Depths are stored as int32, or float64 if they aren't integers
+        names = arrow_schema.names
+        num_variant_columns = len(RecodedVCFSchema.FIXED_COLUMNS)
+        for num_samples in range((len(names) - num_variant_columns) / 2, -1, -1):
+            samples = [x[3:] for x in names[len(names)-num_samples:]]
+            if names[len(names)-2*num_samples:] == ["GT_%s" % x for x in samples] + ["DP_%s" % x for x in samples]:
+                depth_dtype = np.int32
+                if num_samples > 0 and np.dtype(arrow_schema[len(names)-1].type.to_pandas_dtype()) != np.int32:
+                    depth_dtype = np.float64
+                return RecodedVCFSchema(names[:len(names)-2*num_samples], samples, file_format="parquet",
+                                        depth_dtype=depth_dtype)
+
+        logging.error("(RecodedVCFReader) Parquet file doesn't contain the genotype and depth columns of recoded "
+                      "output: %s" % self.path)
+        raise IOError("Input file must be recoded VCF file!")
+
+    def __iter__(self):
+        return self.iter_chunks()
+
+    def iter_chunks(self):
+        # Generate RecodedVCFChunks of at most chunk_size records in file order
+        if self.file_format == "tsv":
+            return self.__iter_tsv_chunks()
+        elif self.file_format == "parquet":
+            return self.__iter_parquet_chunks()
+        return self.__iter_sparse_chunks()
+
+    def __read_lines(self, path):
+        # Generate lists of at most chunk_size lines following the header of a tab-delimited file
+        in_header = True
+        remainder = ""
+        lines = []
+        for data in RecodedVCFConcatenator.read_blocks(path):
+            data = remainder + data
+            end = data.rfind("\n")
+            if end == -1:
+                remainder = data
+                continue
+            remainder = data[end+1:]
+            block_lines = data[:end].split("\n")
+            if in_header:
+                block_lines = block_lines[1:]
+                in_header = False
+
+            # Files recoded before raw sample columns were passed through have a blank line after every record
+            if "" in block_lines:
+                block_lines = [x for x in block_lines if x != ""]
+
+            lines += block_lines
+            while len(lines) >= self.chunk_size:
+                yield lines[:self.chunk_size]
+                lines = lines[self.chunk_size:]
+
+        # Last line may not end with a newline
+        if remainder and not in_header:
+            lines.append(remainder)
+        if lines:
+            yield lines
+
+    def __encode_categories(self, column, values):
+        # Return an array with the code of each value of a categorical column. Unseen values become new categories.
+        codes = self.category_codes[column]
+        categories = self.categories[column]
+        encoded = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            code = codes.get(value)
+            if code is None:
+                if value is None:
+                    code = -1
+                else:
+                    code = codes[value] = len(categories)
+                    categories.append(value)
+            encoded[i] = code
+        return encoded
+
+    def __convert_column(self, column, values):
+        # Return the values of a fixed or INFO column of a text file in the representation returned with each chunk
+        # Missing data placeholders are missing values (None), as nulls of Parquet files are
+        if column == "POS":
+            return np.array(values, dtype=np.int64)
+        elif column == "QUAL":
+            return np.fromiter(itertools.imap(self.float_values.__getitem__, values), dtype=np.float64, count=len(values))
+
+        if self.missing_data_char in values:
+            values = [None if x == self.missing_data_char else x for x in values]
+        if column in self.categorical_columns:
+            return self.__encode_categories(column, values)
+        return values
+
+    def __parse_block(self, rows, start, num_samples):
+        # Return a (records x samples) array of the numbers in a block of columns of split rows
+        values = list(itertools.chain.from_iterable([row[start:start+num_samples] for row in rows]))
+        block = np.fromiter(itertools.imap(self.float_values.__getitem__, values), dtype=np.float64, count=len(values))
+        return block.reshape(len(rows), num_samples)
+
+    def get_depth_array(self, depths):
+        # Return parsed depths as an array of the schema's depth type
+        if self.schema.depth_dtype == np.float64:
+            return depths
+        if not np.all(np.floor(depths) == depths):
+            logging.error("(RecodedVCFReader) Depths of %s aren't all integers! Read the file with depth_dtype=np.float64." %
+                          self.path)
+            raise IOError("Recoded file contains depths that aren't integers!")
+        return depths.astype(self.schema.depth_dtype)
+
+    def __iter_tsv_chunks(self):
+        # Generate chunks of a tab-delimited recoded file
+        schema = self.schema
+        num_samples = len(schema.sample_names)
+
+        # Columns after the last block that's read are left in a single unsplit column
+        if self.read_raw_samples:
+            num_splits = schema.get_num_columns() - 1
+        elif self.read_depths:
+            num_splits = schema.format_index
+        elif self.read_genotypes:
+            num_splits = schema.depth_start
+        else:
+            num_splits = max(self.column_indices) + 1 if len(self.column_indices) > 0 else 0
+
+        for lines in self.__read_lines(self.path):
+            rows = [x.split("\t", num_splits) for x in lines]
+            for line, row in itertools.izip(lines, rows):
+                if len(row) != num_splits + 1 or (self.read_raw_samples and "\t" in row[-1]):
+                    logging.error("(RecodedVCFReader) Line of %s doesn't contain the same number of columns as "
+                                  "header (expected %d, got %d):\n%s" %
+                                  (self.path, schema.get_num_columns(), line.count("\t") + 1, line[:200]))
+                    raise IOError("Recoded file contains different number of columns than header!")
+
+            variants = OrderedDict()
+            for column, i in zip(self.columns, self.column_indices):
+                variants[column] = self.__convert_column(column, [row[i] for row in rows])
+
+            genotypes = self.__parse_block(rows, schema.genotype_start, num_samples) if self.read_genotypes else None
+            depths = self.get_depth_array(self.__parse_block(rows, schema.depth_start, num_samples)) \
+                if self.read_depths else None
+
+            formats = None
+            raw_samples = None
+            if self.read_raw_samples:
+                formats = [row[schema.format_index] for row in rows]
+                raw_samples = [row[schema.sample_start:] for row in rows]
+
+            yield RecodedVCFChunk(schema, variants, self.categories, genotypes, depths,
+                                  formats=formats, raw_samples=raw_samples)
+
+    @staticmethod
+    def __get_arrow_values(arrays):
+        # Return the values of a list of Arrow arrays as a list. Strings are returned as str and missing values as None.
+        values = []
+        for array in arrays:
+            values += [x.encode("utf-8") if isinstance(x, unicode) else x for x in array.to_pylist()]
+        return values
+
+    def __convert_arrow_column(self, column, arrays):
+        # Return the values of a fixed or INFO column of a Parquet chunk
+        if column in ["POS", "QUAL"]:
+            return self.__get_arrow_numbers(arrays, np.int64 if column == "POS" else np.float64)
+
+        if column not in self.categorical_columns:
+            return self.__get_arrow_values(arrays)
+
+        # Map codes of dictionary encoded arrays to codes of the column's categories
+        encoded = []
+        for array in arrays:
+            if not hasattr(array, "dictionary"):
+                encoded.append(self.__encode_categories(column, self.__get_arrow_values([array])))
+                continue
+            # Missing values have index -1, which maps to the code -1 appended to the codes of the dictionary
+            codes = np.append(self.__encode_categories(column, self.__get_arrow_values([array.dictionary])), -1)
+            if array.indices.null_count > 0:
+                indices = np.array([-1 if x is None else x for x in array.indices.to_pylist()], dtype=np.int64)
+            else:
+                indices = array.indices.to_numpy()
+            encoded.append(codes[indices])
+        return np.concatenate(encoded) if len(encoded) > 0 else np.zeros(0, dtype=np.int32)
+
+    @staticmethod
+    def __get_arrow_numbers(arrays, dtype):
+        # Return the values of a list of numeric Arrow arrays as an array. Arrays without missing values aren't copied.
+        if len(arrays) == 0:
+            return np.zeros(0, dtype=dtype)
+        values = [x.to_numpy(zero_copy_only=x.null_count == 0) for x in arrays]
+        return values[0] if len(values) == 1 else np.concatenate(values)
+
+    def __iter_parquet_chunks(self):
+        # Generate chunks of a Parquet file one row group at a time. Chunks don't span row groups.
+        schema = self.schema
+        genotype_columns = ["GT_%s" % x for x in schema.sample_names] if self.read_genotypes else []
+        depth_columns = ["DP_%s" % x for x in schema.sample_names] if self.read_depths else []
+        read_columns = self.columns + genotype_columns + depth_columns
+
+        for row_group in range(self.parquet_file.num_row_groups):
+            table = self.parquet_file.read_row_group(row_group, columns=read_columns)
+            for start in range(0, table.num_rows, self.chunk_size):
+                chunk = table.slice(start, self.chunk_size)
+                columns = dict([(x, chunk.column(i).chunks) for i, x in enumerate(read_columns)])
+
+                variants = OrderedDict()
+                for column in self.columns:
+                    variants[column] = self.__convert_arrow_column(column, columns[column])
+
+                genotypes = None
+                if self.read_genotypes:
+                    genotypes = np.empty((chunk.num_rows, len(schema.sample_names)), dtype=np.float64)
+                    for i, column in enumerate(genotype_columns):
+                        genotypes[:, i] = self.__get_arrow_numbers(columns[column], np.float64)
+
+                depths = None
+                if self.read_depths:
+                    depths = np.empty((chunk.num_rows, len(schema.sample_names)), dtype=schema.depth_dtype)
+                    for i, column in enumerate(depth_columns):
+                        depths[:, i] = self.__get_arrow_numbers(columns[column], schema.depth_dtype)
+
+                yield RecodedVCFChunk(schema, variants, self.categories, genotypes, depths)
+
+    @staticmethod
+    def __read_npy_header(fh):
+        # Read the header of a .npy array from an open file and return its shape, order, and type
+        version = np.lib.format.read_magic(fh)
+        if version == (1, 0):
+            return np.lib.format.read_array_header_1_0(fh)
+        return np.lib.format.read_array_header_2_0(fh)
+
+    def __get_npz_header(self, name):
+        # Return the shape, order, and type of an array of an .npz file without reading the array
+        with zipfile.ZipFile(self.path) as zip_fh:
+            npy_fh = zip_fh.open("%s.npy" % name)
+            try:
+                return self.__read_npy_header(npy_fh)
+            finally:
+                npy_fh.close()
+
+    def __load_npz_array(self, npz, name):
+        # Map an array of an .npz file into memory if it's stored uncompressed, otherwise read it
+        if self.memory_map:
+            with zipfile.ZipFile(self.path) as zip_fh:
+                info = zip_fh.getinfo("%s.npy" % name)
+
+            if info.compress_type == zipfile.ZIP_STORED:
+                with open(self.path, "rb") as fh:
+                    # Array starts after the local header of its zip entry and the .npy header
+                    fh.seek(info.header_offset + 26)
+                    name_len, extra_len = struct.unpack("<HH", fh.read(4))
+                    fh.seek(info.header_offset + 30 + name_len + extra_len)
+                    shape, fortran_order, dtype = self.__read_npy_header(fh)
+                    offset = fh.tell()
+
+                if np.prod(shape) > 0 and not dtype.hasobject:
+                    return np.memmap(self.path, dtype=dtype, mode="r", shape=shape, offset=offset,
+                                     order="F" if fortran_order else "C")
+        return npz[name]
+
+    def __iter_sparse_chunks(self):
+        # Generate chunks of a sparse genotype matrix and its table of fixed and INFO columns
+        schema = self.schema
+        num_samples = len(schema.sample_names)
+        variant_file = SparseGenotypeWriter.get_variant_file(self.path)
+        with np.load(self.path) as npz:
+            indptr = self.__load_npz_array(npz, "indptr")
+            indices = self.__load_npz_array(npz, "indices") if self.read_genotypes or self.read_depths else None
+            data = self.__load_npz_array(npz, "data") if self.read_genotypes else None
+            stored_depths = self.__load_npz_array(npz, "depths") if self.read_depths else None
+
+            first_row = 0
+            for lines in self.__read_lines(variant_file):
+                rows = [x.split("\t") for x in lines]
+                num_rows = len(rows)
+                if first_row + num_rows >= len(indptr):
+                    logging.error("(RecodedVCFReader) Variant table %s contains more rows than the genotype matrix!" %
+                                  variant_file)
+                    raise IOError("Sparse genotype matrix doesn't match its variant table!")
+
+                variants = OrderedDict()
+                for column, i in zip(self.columns, self.column_indices):
+                    variants[column] = self.__convert_column(column, [row[i] for row in rows])
+
+                # Expand stored genotypes of the chunk's rows into dense arrays
+                row_ptr = np.asarray(indptr[first_row:first_row+num_rows+1])
+                start, end = row_ptr[0], row_ptr[-1]
+                row_ids = np.repeat(np.arange(num_rows), np.diff(row_ptr))
+                if indices is not None:
+                    col_ids = np.asarray(indices[start:end])
+
+                genotypes = None
+                if self.read_genotypes:
+                    genotypes = np.full((num_rows, num_samples), np.nan, dtype=np.float64)
+                    genotypes[row_ids, col_ids] = data[start:end]
+
+                depths = None
+                if self.read_depths:
+                    depths = np.zeros((num_rows, num_samples), dtype=schema.depth_dtype)
+                    depths[row_ids, col_ids] = stored_depths[start:end]
+
+                first_row += num_rows
+                yield RecodedVCFChunk(schema, variants, self.categories, genotypes, depths)
+
+            if first_row != len(indptr) - 1:
+                logging.error("(RecodedVCFReader) Variant table %s contains fewer rows than the genotype matrix!" %
+                              variant_file)
+                raise IOError("Sparse genotype matrix doesn't match its variant table!")
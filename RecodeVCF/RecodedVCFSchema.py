@@ -0,0 +1,67 @@
+import logging
+import numpy as np
+
+class RecodedVCFSchema(object):
+    # Column layout of a recoded VCF file
+    # Rows of tab-delimited output contain the fixed VCF columns, the INFO columns, the recoded genotype of each sample,
+    # the depth of each sample, the FORMAT column, and the raw column of each sample, so sample names appear three times.
+    # The layout records where each block of columns starts so rows can be split without searching the header.
+
+    # Names of fixed VCF columns at the start of every row
+    FIXED_COLUMNS = ["CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER"]
+
+    def __init__(self, variant_columns, sample_names, file_format="tsv", depth_dtype=np.int32):
+
+        # Format of the recoded file ('tsv', 'parquet', or 'sparse')
+        self.file_format = file_format
+
+        # Type of sample depths (np.int32, or np.float64 if they were summed from Float FORMAT fields like AD)
+        self.depth_dtype = depth_dtype
+
+        # Names of fixed and INFO columns describing each variant
+        self.variant_columns = list(variant_columns)
+        self.fixed_columns = self.variant_columns[:len(self.FIXED_COLUMNS)]
+        self.info_columns = self.variant_columns[len(self.FIXED_COLUMNS):]
+
+        # Names of samples in output order
+        self.sample_names = list(sample_names)
+
+        # Index of the first column of each block in tab-delimited rows
+        num_samples = len(self.sample_names)
+        self.genotype_start = len(self.variant_columns)
+        self.depth_start = self.genotype_start + num_samples
+        self.format_index = self.depth_start + num_samples
+        self.sample_start = self.format_index + 1
+
+    @staticmethod
+    def from_header(header, path="recoded file", depth_dtype=np.int32):
+        # Return the schema of a tab-delimited recoded file from its header line
+        # The header doesn't record the type of depths, so it's given by the caller
+        columns = header.rstrip("\r\n").split("\t")
+        if "FORMAT" not in columns:
+            logging.error("(RecodedVCFSchema) Header of recoded file doesn't contain a FORMAT column: %s" % path)
+            raise IOError("Input files must be recoded VCF files!")
+
+        format_index = columns.index("FORMAT")
+        samples = columns[format_index+1:]
+        num_variant_columns = format_index - 2*len(samples)
+        if num_variant_columns < 5 or columns[num_variant_columns:format_index] != samples + samples:
+            logging.error("(RecodedVCFSchema) Header of recoded file doesn't contain the same samples in its "
+                          "genotype, depth, and sample columns: %s" % path)
+            raise IOError("Input files must be recoded VCF files!")
+
+        return RecodedVCFSchema(columns[:num_variant_columns], samples, depth_dtype=depth_dtype)
+
+    def get_columns(self):
+        # Return the header columns of tab-delimited output
+        return self.variant_columns + self.sample_names + self.sample_names + ["FORMAT"] + self.sample_names
+
+    def get_num_columns(self):
+        return len(self.variant_columns) + 3*len(self.sample_names) + 1
+
+    def get_variant_index(self, column):
+        # Return the index of a fixed or INFO column
+        if column not in self.variant_columns:
+            logging.error("(RecodedVCFSchema) Column '%s' isn't a fixed or INFO column of the recoded file!" % column)
+            raise IOError("Column not found in recoded file!")
+        return self.variant_columns.index(column)
@@ -0,0 +1,142 @@
+import logging
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from BatchGenotypeRecoder import BatchGenotypeRecoder, ParseCache
+
+class SparseGenotypeWriter(object):
+    # Write recoded genotypes as a sparse (variants x samples) matrix in CSR layout
+    # Only non-reference genotypes (recoded values >= 0) are stored. Homozygous REF and missing genotypes are left out.
+    # The matrix is saved to an .npz file with the same keys as scipy.sparse.save_npz ('format', 'shape', 'data',
+    # 'indices', 'indptr') so it can be loaded with scipy.sparse.load_npz, along with the depth of each stored genotype
+    # ('depths') and the sample names ('samples'). Arrays are zip compressed unless compressed is False, in which case
+    # they're stored as is and can be memory mapped by RecodedVCFReader.
+    # Fixed and INFO columns of each variant are written to a tab-delimited sidecar table in matrix row order.
+    # Arrays are appended to temporary files as records are recoded so the dense matrix is never held in memory.
+
+    # Arrays holding a value for each stored (non-reference) genotype
+    ARRAYS = ["data", "indices", "depths"]
+
+    def __init__(self, out_file, vcf_parser, variant_columns, sample_names, missing_gt_char, compressed=True):
+
+        if out_file == "-":
+            logging.error("(SparseGenotypeWriter) Sparse genotype matrix can't be written to stdout!")
+            raise IOError("Sparse genotype matrix requires an output file!")
+
+        # Path to .npz matrix file and sidecar variant table
+        self.out_file = out_file
+        self.variant_file = self.get_variant_file(out_file)
+
+        # Names of samples in matrix column order
+        self.sample_names = list(sample_names)
+
+        # Placeholder for uncalled genotypes
+        self.missing_gt_char = missing_gt_char
+
+        # Whether arrays of the .npz file are zip compressed
+        self.compressed = compressed
+
+        # Types of stored arrays
+        self.dtypes = {"data"       : np.float32,
+                       "indices"    : np.int32,
+                       "depths"     : np.int32 if BatchGenotypeRecoder.get_depth_type(vcf_parser) == "int" else np.float32,
+                       "indptr"     : np.int64}
+
+        # Values of non-reference genotype strings (None for homozygous REF and missing genotypes)
+        self.genotype_values = ParseCache(self.__parse_genotype)
+        self.depth_values = ParseCache(int if self.dtypes["depths"] == np.int32 else float)
+
+        # Number of rows and stored genotypes written so far
+        self.num_variants = 0
+        self.num_stored = 0
+
+        # Temporary files holding arrays until the matrix is saved
+        out_dir = os.path.dirname(os.path.abspath(self.out_file))
+        self.tmp_dir = tempfile.mkdtemp(prefix=".sparse_matrix.", dir=out_dir)
+        self.tmp_files = dict([(x, open(os.path.join(self.tmp_dir, "%s.bin" % x), "wb")) for x in self.ARRAYS + ["indptr"]])
+        np.zeros(1, dtype=self.dtypes["indptr"]).tofile(self.tmp_files["indptr"])
+
+        # Write header of variant table
+        self.variant_fh = open(self.variant_file, "w")
+        self.variant_fh.write("%s\n" % "\t".join(variant_columns))
+
+    @staticmethod
+    def get_variant_file(out_file):
+        # Return the path of the variant table written alongside a matrix file
+        prefix = out_file[:-len(".npz")] if out_file.endswith(".npz") else out_file
+        return "%s.variants.tsv" % prefix
+
+    def __parse_genotype(self, genotype):
+        # Return the value of a non-reference recoded genotype string
+        # Homozygous REF genotypes are recoded as negative values (including '-0')
+        if genotype == self.missing_gt_char or genotype.startswith("-"):
+            return None
+        return float(genotype)
+
+    def write_rows(self, rows, variant_data):
+        # Append a list of (record, info data, recoded genotypes and depths) rows produced by VCFRecoder to the matrix
+        # Along with the tab-delimited fixed and INFO columns of each row
+        if len(rows) == 0:
+            return
+
+        num_samples = len(self.sample_names)
+        genotype_values = self.genotype_values
+        depth_values = self.depth_values
+        data = []
+        indices = []
+        depths = []
+        indptr = []
+        for record, info_data, genotype_data in rows:
+            for i in range(num_samples):
+                value = genotype_values[genotype_data[i]]
+                if value is not None:
+                    data.append(value)
+                    indices.append(i)
+                    depths.append(depth_values[genotype_data[num_samples + i]])
+            indptr.append(self.num_stored + len(data))
+
+        for name, values in [("data", data), ("indices", indices), ("depths", depths), ("indptr", indptr)]:
+            np.asarray(values, dtype=self.dtypes[name]).tofile(self.tmp_files[name])
+        self.num_stored += len(data)
+        self.num_variants += len(rows)
+
+        self.variant_fh.write("".join(["%s\n" % "\t".join(x) for x in variant_data]))
+
+    def __load_array(self, name):
+        # Map a temporary array file into memory without reading it
+        self.tmp_files[name].close()
+        path = os.path.join(self.tmp_dir, "%s.bin" % name)
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=self.dtypes[name])
+        return np.memmap(path, dtype=self.dtypes[name], mode="r")
+
+    def close(self):
+        # Save the matrix to the .npz file and close the variant table
+        try:
+            self.variant_fh.close()
+            arrays = dict([(x, self.__load_array(x)) for x in self.ARRAYS + ["indptr"]])
+            save = np.savez_compressed if self.compressed else np.savez
+            with open(self.out_file, "wb") as out_fh:
+                save(out_fh,
+                     format=np.array("csr"),
+                     shape=np.array([self.num_variants, len(self.sample_names)], dtype=np.int64),
+                     samples=np.array(self.sample_names),
+                     **arrays)
+            logging.info("(SparseGenotypeWriter) Stored %d non-reference genotypes of %d variants x %d samples" %
+                         (self.num_stored, self.num_variants, len(self.sample_names)))
+        finally:
+            self.__remove_tmp_files()
+
+    def discard(self):
+        # Remove the variant table and temporary arrays without saving the matrix when recoding fails
+        self.variant_fh.close()
+        self.__remove_tmp_files()
+        if os.path.exists(self.variant_file):
+            os.remove(self.variant_file)
+
+    def __remove_tmp_files(self):
+        for fh in self.tmp_files.values():
+            fh.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
@@ -0,0 +1,148 @@
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+class TransposedRecodeWriter(object):
+    # Write recoded genotypes in sample-major layout: a header of variant IDs followed by one row of genotypes per sample
+    # Genotypes of recoded blocks are transposed and buffered until they reach the memory budget, then spilled to a
+    # temporary file holding one line per sample. Spill files are joined line by line into the output once every record
+    # is recoded, so memory use depends on the budget rather than on the number of variants.
+
+    # Default memory budget in bytes for genotypes buffered before they're spilled
+    DEFAULT_MAX_MEMORY = 1024*1024*1024
+
+    # Maximum number of spill files open at once. More spill files are merged in several passes.
+    MAX_OPEN_SPILLS = 128
+
+    # Approximate bytes of memory used by each buffered string in addition to its characters
+    STRING_OVERHEAD = 48
+
+    def __init__(self, out_file_handle, tmp_dir, sample_names, missing_data_char, max_memory=DEFAULT_MAX_MEMORY):
+
+        # Open handle the transposed output is written to when the writer is closed
+        self.out_file_handle = out_file_handle
+
+        # Names of samples in output row order
+        self.sample_names = list(sample_names)
+
+        # Placeholder to use when data is missing
+        self.missing_data_char = missing_data_char
+
+        # Memory budget in bytes for buffered genotypes
+        self.max_memory = max_memory
+
+        # Temporary directory holding spill files and variant IDs
+        self.tmp_dir = tempfile.mkdtemp(prefix=".transpose_spills.", dir=tmp_dir)
+        self.spill_files = []
+
+        # Variant IDs of the output header are written as records are recoded
+        self.variant_id_fh = open(os.path.join(self.tmp_dir, "variant_ids.txt"), "w")
+        self.num_variants = 0
+
+        self.__init_buffers()
+
+    def __init_buffers(self):
+        # Tab-delimited genotypes of each buffered block for each sample
+        self.sample_blocks = [[] for _ in self.sample_names]
+        self.buffer_size = 0
+
+    def get_variant_id(self, record):
+        # Return the ID of a variant in the output header
+        alt = self.missing_data_char if len(record.ALT) == 0 else record.ALT[0]
+        return "%s:%s:%s:%s" % (record.CHROM, record.POS, record.REF, alt)
+
+    def write_rows(self, rows):
+        # Buffer the recoded genotypes of a list of (record, info data, recoded genotypes and depths) rows
+        if len(rows) == 0:
+            return
+
+        num_samples = len(self.sample_names)
+        self.variant_id_fh.write("".join(["\t%s" % self.get_variant_id(row[0]) for row in rows]))
+        self.num_variants += len(rows)
+
+        # Transpose the block so each sample's genotypes are contiguous
+        for sample_block, genotypes in zip(self.sample_blocks, zip(*[row[2][:num_samples] for row in rows])):
+            genotypes = "\t".join(genotypes)
+            sample_block.append(genotypes)
+            self.buffer_size += len(genotypes) + self.STRING_OVERHEAD
+
+        if self.buffer_size >= self.max_memory:
+            self.__spill()
+
+    def __spill(self):
+        # Write buffered genotypes to a new spill file with one line per sample
+        if self.buffer_size == 0:
+            return
+
+        spill_file = os.path.join(self.tmp_dir, "spill_%d.txt" % len(self.spill_files))
+        with open(spill_file, "w") as spill_fh:
+            for sample_block in self.sample_blocks:
+                spill_fh.write("%s\n" % "\t".join(sample_block))
+        self.spill_files.append(spill_file)
+        logging.debug("(TransposedRecodeWriter) Spilled genotypes of the first %d variants to %s" %
+                      (self.num_variants, spill_file))
+
+        self.__init_buffers()
+
+    def __merge_spills(self, spill_files, out_fh, row_names=None):
+        # Join the lines of each sample across spill files and write them to an open file handle
+        # Rows are prefixed with their sample name if row_names is given
+        spill_fhs = [open(x, "r") for x in spill_files]
+        try:
+            for i in range(len(self.sample_names)):
+                row = [] if row_names is None else [row_names[i]]
+                row += [spill_fh.readline().rstrip("\n") for spill_fh in spill_fhs]
+                out_fh.write("%s\n" % "\t".join(row))
+        finally:
+            for spill_fh in spill_fhs:
+                spill_fh.close()
+
+        for spill_file in spill_files:
+            os.remove(spill_file)
+
+    def close(self):
+        # Write the header and transposed genotypes to the output and close it
+        try:
+            self.__spill()
+            self.variant_id_fh.close()
+
+            # Merge spill files in passes until they can all be opened at once
+            pass_num = 0
+            while len(self.spill_files) > self.MAX_OPEN_SPILLS:
+                merged_files = []
+                for i in range(0, len(self.spill_files), self.MAX_OPEN_SPILLS):
+                    merged_file = os.path.join(self.tmp_dir, "merged_%d_%d.txt" % (pass_num, len(merged_files)))
+                    with open(merged_file, "w") as merged_fh:
+                        self.__merge_spills(self.spill_files[i:i+self.MAX_OPEN_SPILLS], merged_fh)
+                    merged_files.append(merged_file)
+                self.spill_files = merged_files
+                pass_num += 1
+
+            # Write header of variant IDs
+            self.out_file_handle.write("SAMPLE")
+            with open(self.variant_id_fh.name, "r") as variant_id_fh:
+                shutil.copyfileobj(variant_id_fh, self.out_file_handle)
+            self.out_file_handle.write("\n")
+
+            # Write genotypes of each sample
+            self.__merge_spills(self.spill_files, self.out_file_handle, row_names=self.sample_names)
+
+            logging.info("(TransposedRecodeWriter) Wrote %d samples x %d variants" %
+                         (len(self.sample_names), self.num_variants))
+        finally:
+            self.__close_files()
+
+    def discard(self):
+        # Close the output without writing the transposed genotypes when recoding fails
+        self.__close_files()
+
+    def __close_files(self):
+        # Close the output and remove spill files
+        if self.out_file_handle is sys.stdout:
+            self.out_file_handle.flush()
+        else:
+            self.out_file_handle.close()
+        self.variant_id_fh.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
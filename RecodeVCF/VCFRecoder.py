@@ -1,7 +1,13 @@
 import logging
-import vcf
+import os
+import sys
 
-from VCF import AnnotationParser
+from VCF import AnnotationParser, VCFHelper, BGZFWriter
+from BatchGenotypeRecoder import BatchGenotypeRecoder
+from ParquetRecodeWriter import ParquetRecodeWriter
+from SparseGenotypeWriter import SparseGenotypeWriter
+from TransposedRecodeWriter import TransposedRecodeWriter
+from RecodedVCFIndex import RecodedVCFIndex
 
 class VCFRecoder(object):
 
@@ -9,15 +15,13 @@ class VCFRecoder(object):
     def __init__(self, vcf_parser, vcf_file, out_file, **kwargs):
 
         # vcf parser
+        # Records must carry their raw FORMAT/sample columns (see VCFHelper.get_vcf_parser)
         self.parser = vcf_parser
 
-        # Create annotation parser
-        self.annotation_parser = AnnotationParser(self.parser)
-
         # Path to input VCF file
         self.vcf_file = vcf_file
 
-        # Path to recoded output file
+        # Path to recoded output file ('-' for stdout)
         self.out_file = out_file
 
         # Mininum number of reads required to make a variant call
@@ -32,13 +36,41 @@ class VCFRecoder(object):
         # Specify whether or not to allow more than one multiple allele
         self.multiallelic               = kwargs.get("multiallelic",        False)
 
+        # Specify whether to use the most severe snpeff annotation instead of the first
+        self.snpeff_most_severe         = kwargs.get("snpeff_most_severe",  False)
+
+        # Number of threads used to compress BGZF output
+        self.compress_threads           = kwargs.get("compress_threads",    1)
+
+        # Output format ('tsv' or 'parquet')
+        self.output_format              = kwargs.get("output_format",       "tsv")
+
+        # Layout of recoded genotypes ('dense' columns or a 'sparse' CSR matrix of non-reference genotypes)
+        self.genotype_matrix            = kwargs.get("genotype_matrix",     "dense")
+
+        # Specify whether to zip compress the arrays of a sparse genotype matrix
+        self.compress_matrix            = kwargs.get("compress_matrix",     True)
+
+        # Specify whether to write one row of recoded genotypes per sample instead of one row per variant
+        self.transpose                  = kwargs.get("transpose",           False)
+
+        # Memory budget in bytes for genotypes buffered by sample-major output before they're spilled to disk
+        self.max_memory                 = kwargs.get("max_memory",          TransposedRecodeWriter.DEFAULT_MAX_MEMORY)
+
+        # Specify whether to write a coordinate index of tab-delimited output for region queries
+        self.write_index                = kwargs.get("index",               False)
+
+        # Optional VCFCheckpoint used to periodically save progress and resume interrupted runs
+        # Must be the checkpoint the VCF parser was created with (see VCFHelper.get_vcf_parser)
+        self.checkpoint                 = kwargs.get("checkpoint",          None)
+
         # List of info columns names to include in output
         # If not specified, all info columns will be included
         self.info_to_include            = kwargs.get("info_to_include",     None)
 
         # Names of columns to include (in the order they will appear in the recoded VCF)
         self.fixed_columns      = ["CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER"]    # Names of columns that are fixed across VCF files
-        self.info_columns       = self.annotation_parser.get_available_info_fields()
+        self.info_columns       = VCFHelper.get_info_field_names(self.parser)
         self.sample_names       = self.parser.samples                                       # Names of samples included in current VCF
 
         # Subset info to include if selecting only certain INFO columns
@@ -47,38 +79,202 @@ class VCFRecoder(object):
             # Check to make sure columns requested in info-column-file actually exist in VCF
             self.__check_info_to_include()
 
-    def recode_vcf(self):
-        # Parse VCF and recode genotypes and output information as tab-delimited file
+        # Recodes genotypes and depths of blocks of records using NumPy
+        self.batch_recoder = BatchGenotypeRecoder(self.parser, self.min_call_depth, self.missing_gt_char)
 
-        # Open output file for writing
-        out_file_handle = open(self.out_file, "w")
+        # Recoded genotype strings for each depth below min_call_depth
+        self.genotype_table = BatchGenotypeRecoder.get_genotype_table(self.min_call_depth, self.missing_gt_char)
 
-        # Combine columns into a single header
-        if self.info_to_include is None:
-            # Case: Get all INFO columns
-            colnames = self.fixed_columns + self.info_columns + self.sample_names + self.sample_names + ['FORMAT'] + \
-                       self.sample_names
-        else:
-            # Case: Include only certain INFO columns
-            colnames = self.fixed_columns + self.info_to_include + self.sample_names + self.sample_names + ['FORMAT']\
-                       + self.sample_names
+        # Create annotation parser that only decodes the INFO columns included in output
+        self.annotation_parser = AnnotationParser(self.parser,
+                                                  info_fields=self.info_to_include,
+                                                  snpeff_most_severe=self.snpeff_most_severe)
 
-        # Total number of data columns to get for each VCF record
-        num_cols = len(colnames)
+        # Index of records written by recode_records and the uncompressed output offset of the next record
+        self.index = None
+        self.output_offset = 0
 
-        # Write header to file
-        out_file_handle.write("%s\n" % "\t".join(colnames))
+    def recode_vcf(self):
+        # Parse VCF and recode genotypes and output information as tab-delimited or Parquet file
+
+        if self.genotype_matrix == "sparse":
+            # Genotypes are saved to a .npz matrix and variant columns to a sidecar table with its own header
+            out_file_handle = SparseGenotypeWriter(self.out_file,
+                                                   self.parser,
+                                                   self.get_variant_columns(),
+                                                   self.sample_names,
+                                                   self.missing_gt_char,
+                                                   compressed=self.compress_matrix)
+
+        elif self.output_format == "parquet":
+            # Columns are named and typed in the Parquet schema so there's no header line
+            out_file_handle = ParquetRecodeWriter(self.out_file,
+                                                  self.parser,
+                                                  self.annotation_parser.get_selected_info_fields(),
+                                                  self.sample_names,
+                                                  self.missing_gt_char)
+
+        elif self.transpose:
+            # Genotypes are transposed through spill files written next to the output
+            tmp_dir = os.path.dirname(os.path.abspath(self.out_file)) if self.out_file != "-" else None
+            out_file_handle = TransposedRecodeWriter(self.open_output_file(self.out_file, compress_threads=self.compress_threads),
+                                                     tmp_dir,
+                                                     self.sample_names,
+                                                     self.missing_data_char,
+                                                     max_memory=self.max_memory)
+
+        elif self.checkpoint is not None and self.checkpoint.is_resumed():
+            # Discard output written after the checkpoint and continue writing from there
+            out_file_handle = self.open_resumed_output_file(self.out_file,
+                                                            self.checkpoint.get_output_size(),
+                                                            compress_threads=self.compress_threads)
+        else:
+            # Open output file for writing
+            out_file_handle = self.open_output_file(self.out_file, compress_threads=self.compress_threads,
+                                                    index_blocks=self.write_index)
+
+            # Write header to file
+            header = "%s\n" % "\t".join(self.get_output_columns())
+            out_file_handle.write(header)
+            self.output_offset = len(header)
+
+        # Recode VCF records and write to file
+        try:
+            self.recode_records(out_file_handle, output_offset=self.output_offset)
+        except:
+            # Writers that only write their output once every record is recoded remove their temporary files
+            if isinstance(out_file_handle, (SparseGenotypeWriter, TransposedRecodeWriter)):
+                out_file_handle.discard()
+                if isinstance(out_file_handle, TransposedRecodeWriter) and self.out_file != "-":
+                    os.remove(self.out_file)
+            raise
 
-        # Open the input VCF file
-        vcf_reader = open(self.vcf_file, 'r')
+        # Close output file
+        if out_file_handle is sys.stdout:
+            out_file_handle.flush()
+        else:
+            out_file_handle.close()
+
+        # Write index once offsets of compressed output are known
+        if self.index is not None:
+            if isinstance(out_file_handle, BGZFWriter):
+                self.index.convert_offsets(out_file_handle.get_virtual_offset)
+                self.index.compressed = True
+            self.index.save(RecodedVCFIndex.get_index_file(self.out_file), self.out_file)
+
+        # Output is complete so there's nothing left to resume
+        if self.checkpoint is not None:
+            self.checkpoint.remove()
+
+    @staticmethod
+    def is_compressed_output(out_file):
+        # Return True if output should be BGZF compressed based on the file extension
+        return out_file.endswith(".gz") or out_file.endswith(".bgz")
+
+    @staticmethod
+    def open_output_file(out_file, compress_threads=1, write_eof=True, index_blocks=False):
+        # Open recoded output file for writing. Returns stdout if the output file is '-'.
+        # Files ending with '.gz' or '.bgz' are BGZF compressed using a pool of compress_threads threads
+        # With index_blocks, BGZF block offsets are kept so uncompressed offsets can be converted to virtual offsets
+        if out_file == "-":
+            return sys.stdout
+        elif VCFRecoder.is_compressed_output(out_file):
+            return BGZFWriter(out_file, num_threads=compress_threads, write_eof=write_eof, index_blocks=index_blocks)
+        return open(out_file, "w")
+
+    @staticmethod
+    def open_resumed_output_file(out_file, output_size, compress_threads=1):
+        # Truncate a partially written output file to the size saved by a checkpoint and open it for appending
+        if out_file == "-" or not os.path.exists(out_file) or os.path.getsize(out_file) < output_size:
+            logging.error("(VCFRecoder) Output file is missing data written before the checkpoint: %s" % out_file)
+            raise IOError("Unable to resume writing output file!")
+
+        with open(out_file, "r+b") as out_fh:
+            out_fh.truncate(output_size)
+
+        if VCFRecoder.is_compressed_output(out_file):
+            return BGZFWriter(out_file, num_threads=compress_threads, append=True)
+        out_fh = open(out_file, "a")
+        out_fh.seek(0, 2)
+        return out_fh
+
+    def get_output_columns(self):
+        # Combine columns into a single header
+        return self.get_variant_columns() + self.sample_names + self.sample_names + ['FORMAT'] + self.sample_names
 
-        # Skip header line from input VCF file
-        for vcf_line in vcf_reader:
-            if vcf_line.startswith("#CHROM"):
-                break
+    def get_variant_columns(self):
+        # Names of fixed and INFO columns describing each variant
+        if self.info_to_include is None:
+            # Case: Get all INFO columns
+            return self.fixed_columns + self.info_columns
+        # Case: Include only certain INFO columns
+        return self.fixed_columns + self.info_to_include
 
-        # Iterate over VCF records
-        for record, vcf_line in zip(self.parser, vcf_reader):
+    def recode_records(self, out_file_handle, output_offset=0):
+        # Recode each VCF record and write to an open file handle (header not included)
+        # If an index is written, records are indexed by their uncompressed offset, starting at output_offset
+
+        # Total number of data columns to get for each VCF record
+        num_cols = len(self.get_output_columns())
+
+        logging.debug("(VCFRecoder) Recoding records from %s" % self.vcf_file)
+
+        if self.write_index:
+            self.index = RecodedVCFIndex()
+            self.output_offset = output_offset
+
+        # Number of records recoded, including records recoded before a resumed checkpoint
+        records_processed = self.checkpoint.get_records_processed() if self.checkpoint is not None else 0
+
+        # Recode genotypes of blocks of records together
+        block = []
+        for record in self.parser:
+            block.append(record)
+            if len(block) == BatchGenotypeRecoder.BLOCK_SIZE:
+                self.__recode_block(block, out_file_handle, num_cols)
+                records_processed += len(block)
+                block = []
+
+                # Save progress once every output line of the block is written
+                if self.checkpoint is not None and self.checkpoint.is_due(records_processed):
+                    out_file_handle.flush()
+                    self.checkpoint.save(records_processed, output_size=out_file_handle.tell())
+
+        if len(block) > 0:
+            self.__recode_block(block, out_file_handle, num_cols)
+
+    def __recode_block(self, records, out_file_handle, num_cols):
+        # Recode a block of VCF records and write them to an open file handle
+
+        # Recode genotypes and depths for the whole block
+        block_genotype_data = self.batch_recoder.recode_block(records)
+
+        # Rows are written together once the block is recoded
+        rows = []
+        try:
+            self.__recode_block_rows(records, block_genotype_data, rows, num_cols)
+        finally:
+            # Rows recoded before any error are still written
+            if self.genotype_matrix == "sparse":
+                out_file_handle.write_rows(rows, [self.get_variant_data(row[0], row[1]) for row in rows])
+            elif self.output_format == "parquet" or self.transpose:
+                out_file_handle.write_rows(rows)
+            else:
+                lines = [self.__format_row(row) for row in rows]
+                if self.index is not None:
+                    self.__index_rows(rows, lines)
+                out_file_handle.write("".join(lines))
+
+    def __index_rows(self, rows, lines):
+        # Add the records of formatted output lines to the index
+        for row, line in zip(rows, lines):
+            record = row[0]
+            self.index.add_record(record.CHROM, record.POS, record.POS + len(record.REF) - 1, self.output_offset)
+            self.output_offset += len(line)
+
+    def __recode_block_rows(self, records, block_genotype_data, rows, num_cols):
+        # Append a (record, info data, recoded genotypes and depths) row for each record in a block to a list of rows
+        for record, genotype_data in zip(records, block_genotype_data):
 
             # Check to make sure there is only one alternate allele for the record
             if len(record.ALT) > 1 and not self.multiallelic:
@@ -88,43 +284,45 @@ class VCFRecoder(object):
                 # Failing to raise this error could cause some weirdo unintended bugs
                 raise IOError("Multiple alternate alleles detected at one or more positions in vcf file!")
 
-            # Get fixed data
-            record_data = self.get_fixed_data(record)
+            # Get info column data in output column order
+            info_data = self.annotation_parser.get_info(record)
 
-            # Get info column data
-            info = self.annotation_parser.get_info(record)
-            if self.info_to_include is None:
-                # Don't subset info columns
-                info_data = [info[header] for header in info.keys()]
-            else:
-                # Subset info columns
-                info_data = [info[header] for header in self.info_to_include]
+            # Add recoded genotypes and depths for each sample
+            if genotype_data is None:
+                # Recode one sample at a time if the record couldn't be recoded in bulk
+                genotype_data = [str(x) for x in self.get_genotype_data(record) + self.get_depth_data(record)]
 
-            # Replace 'None' with missing data character
-            record_data += [self.missing_data_char if x is None else x for x in info_data]
+            # Raw FORMAT and sample columns from the line the record was parsed from
+            genotype_cols = record.raw_genotype_columns
+            if genotype_cols is None:
+                logging.error("(VCFRecoder) Record doesn't contain FORMAT or sample columns:\n%s" % record)
+                raise IOError("VCF Record contains different number of columns than header!")
 
-            # Add recoded genotypes for each sample
-            record_data += self.get_genotype_data(record)
+            if len(self.fixed_columns) + len(info_data) + len(genotype_data) + genotype_cols.count("\t") + 1 != num_cols:
+                logging.error("(VCFRecoder) Record doesn't contain the same number of columns as header:\n%s" % record)
+                raise IOError("VCF Record contains different number of columns than header!")
 
-            record_data += self.get_depth_data(record)
+            rows.append((record, info_data, genotype_data))
 
-            # Obtaint VCF complete genotype columns
-            genotype_cols = vcf_line.split('\t')[8:]
+    def __format_row(self, row):
+        # Return the tab-delimited output line of a recoded row
+        record, info_data, genotype_data = row
 
-            record_data.extend(genotype_cols)
+        # Combine the list into a string
+        record_data = self.get_variant_data(record, info_data) + genotype_data
 
-            if len(record_data) != num_cols:
-                logging.error("(VCFRecoder) Record doesn't contain the same number of columns as header:\n%s" % record)
-                raise IOError("VCF Record contains different number of columns than header!")
+        # Raw FORMAT and sample columns are passed through as a single slice of the line rather than being split and re-joined
+        return "%s\t%s\n" % ("\t".join(record_data), record.raw_genotype_columns)
 
-            # Combine the list into a string and print to stdout
-            record_data = [str(x) for x in record_data]
+    def get_variant_data(self, record, info_data):
+        # Return the fixed and INFO column values of a recoded row as strings
 
-            # Write to file
-            out_file_handle.write("%s\n" % "\t".join(record_data))
+        # Get fixed data
+        record_data = self.get_fixed_data(record)
 
-        # Close output file
-        out_file_handle.close()
+        # Replace 'None' with missing data character
+        record_data += [self.missing_data_char if x is None else x for x in info_data]
+        return [str(x) for x in record_data]
 
     def get_fixed_data(self, record):
         # Add fixed data columns first
@@ -207,7 +405,11 @@ class VCFRecoder(object):
                 # Take care of weirdo mutect case
                 dp = sample_genotype.data.F1R2[0] + sample_genotype.data.F2R1[0]
 
-            if dp >= self.min_call_depth:
+            if type(dp) is int and 0 <= dp < self.min_call_depth:
+                # Case: Look up precomputed value for integer depth below min_call_depth
+                return self.genotype_table[0][dp]
+
+            elif dp >= self.min_call_depth:
                 # Case: DP > min_call_depth so report that we are confident GT is homo REF (-1)
                 return "-1"
             else:
@@ -227,7 +429,11 @@ class VCFRecoder(object):
                 # Fuck mutect. Why can it not simply adhere to common file standards?
                 dp = sample_genotype.data.F1R2[1] + sample_genotype.data.F2R1[1]
 
-            if dp >= self.min_call_depth:
+            if type(dp) is int and 0 <= dp < self.min_call_depth:
+                # Case: Look up precomputed value for integer depth below min_call_depth
+                return self.genotype_table[1][dp]
+
+            elif dp >= self.min_call_depth:
                 return "1"
             else:
                 recoded = dp/float(self.min_call_depth)
@@ -1 +1,11 @@
-from VCFRecoder import VCFRecoder
\ No newline at end of file
+from VCFRecoder import VCFRecoder
+from ParallelVCFRecoder import ParallelVCFRecoder
+from BatchGenotypeRecoder import BatchGenotypeRecoder
+from ParquetRecodeWriter import ParquetRecodeWriter
+from SparseGenotypeWriter import SparseGenotypeWriter
+from TransposedRecodeWriter import TransposedRecodeWriter
+from RecodedVCFConcatenator import RecodedVCFConcatenator
+from RecodedVCFJoiner import RecodedVCFJoiner
+from RecodedVCFIndex import RecodedVCFIndex
+from RecodedVCFSchema import RecodedVCFSchema
+from RecodedVCFReader import RecodedVCFReader, RecodedVCFChunk
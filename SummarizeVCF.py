@@ -4,9 +4,9 @@ import argparse
 import logging
 import sys
 
-from VCF import VCFHelper
+from VCF import VCFHelper, VCFCheckpoint, VCFSampler
 from Utils import configure_logging
-from SummarizeVCF import VCFSummarizer
+from SummarizeVCF import VCFSummarizer, ParallelVCFSummarizer
 from SummarizeVCF.VariantAnalyzer import VariantAnalyzerFactory
 
 def configure_argparser(argparser_obj):
@@ -14,10 +14,10 @@ def configure_argparser(argparser_obj):
     def file_type(arg_string):
         """
         This function check both the existance of input file and the file size
-        :param arg_string: file name as string
+        :param arg_string: file name as string, or '-' for stdin
         :return: file name as string
         """
-        if not os.path.exists(arg_string):
+        if arg_string != "-" and not os.path.exists(arg_string):
             err_msg = "%s does not exist! " \
                       "Please provide a valid file!" % arg_string
             raise argparse.ArgumentTypeError(err_msg)
@@ -35,7 +35,7 @@ def configure_argparser(argparser_obj):
                                type=file_type,
                                dest="vcf_file",
                                required=True,
-                               help="Path to vcf file to recode.")
+                               help="Path to vcf file to summarize. May be gzip or bgzip compressed. Use '-' to read from stdin.")
 
     # Upper boundary of indel length summary
     argparser_obj.add_argument("--max-records",
@@ -46,6 +46,36 @@ def configure_argparser(argparser_obj):
                                default=-1,
                                help="Maximum number of records to process. Default: ALL.")
 
+    # Fraction of the VCF to randomly sample
+    argparser_obj.add_argument("--sample-fraction",
+                               action="store",
+                               type=float,
+                               dest="sample_fraction",
+                               required=False,
+                               default=None,
+                               help="Estimate the summary from a random fraction (0-1] of the VCF. Records are sampled uniformly across "
+                                    "the whole file and counts are scaled to the size of the file. "
+                                    "Requires a plain text or bgzip compressed VCF file.")
+
+    # Number of records to randomly sample
+    argparser_obj.add_argument("--sample-records",
+                               action="store",
+                               type=int,
+                               dest="sample_records",
+                               required=False,
+                               default=None,
+                               help="Estimate the summary from at least this many records randomly sampled across the whole VCF. "
+                                    "Counts are scaled to the size of the file. Requires a plain text or bgzip compressed VCF file.")
+
+    # Seed for random sampling
+    argparser_obj.add_argument("--seed",
+                               action="store",
+                               type=int,
+                               dest="seed",
+                               required=False,
+                               default=None,
+                               help="Seed of the random number generator used by --sample-fraction and --sample-records.")
+
     # Upper boundary of indel length summary
     argparser_obj.add_argument("--max-indel-len",
                                action="store",
@@ -82,6 +112,82 @@ def configure_argparser(argparser_obj):
                                default=20,
                                help="Number of bins to use for Allele Frequency Spectrum.")
 
+    # Use most severe snpeff annotation
+    argparser_obj.add_argument("--snpeff-most-severe",
+                               action="store_true",
+                               dest="snpeff_most_severe",
+                               required=False,
+                               help="Use the snpeff annotation with the most severe impact/consequence across all transcripts "
+                                    "instead of the first annotation.")
+
+    # Samples to include
+    argparser_obj.add_argument("--samples",
+                               action="store",
+                               type=VCFHelper.parse_samples,
+                               dest="samples",
+                               metavar="SAMPLES",
+                               required=False,
+                               default=None,
+                               help="Only summarize the samples in a comma-separated list of sample names or a file with one sample name per line. "
+                                    "Samples are output in the order given. Default: ALL.")
+
+    # Genomic regions to include
+    argparser_obj.add_argument("--region",
+                               action="append",
+                               type=VCFHelper.parse_region,
+                               dest="regions",
+                               metavar="REGION",
+                               required=False,
+                               default=None,
+                               help="Only summarize records overlapping a region formatted as 'chrom', 'chrom:start', or 'chrom:start-end' "
+                                    "(1-based, inclusive). Can be specified multiple times. "
+                                    "Requires a bgzip compressed VCF with a tabix (.tbi) or CSI (.csi) index.")
+
+    # Number of processes
+    argparser_obj.add_argument("--threads",
+                               action="store",
+                               type=int,
+                               dest="threads",
+                               required=False,
+                               default=1,
+                               help="Number of processes used to summarize shards of the VCF in parallel. "
+                                    "Output is identical to a single process. Default: 1.")
+
+    # Checkpoint file for resuming interrupted runs
+    argparser_obj.add_argument("--checkpoint",
+                               action="store",
+                               type=str,
+                               dest="checkpoint_file",
+                               metavar="CHECKPOINT_FILE",
+                               required=False,
+                               default=None,
+                               help="Periodically save progress to a checkpoint file so an interrupted run can be resumed with --resume. "
+                                    "The checkpoint file is removed once the run finishes.")
+
+    # Number of records between checkpoints
+    argparser_obj.add_argument("--checkpoint-interval",
+                               action="store",
+                               type=int,
+                               dest="checkpoint_interval",
+                               required=False,
+                               default=VCFCheckpoint.DEFAULT_INTERVAL,
+                               help="Number of records processed between checkpoints. Default: %d." % VCFCheckpoint.DEFAULT_INTERVAL)
+
+    # Resume from checkpoint
+    argparser_obj.add_argument("--resume",
+                               action="store_true",
+                               dest="resume",
+                               required=False,
+                               help="Resume from the last checkpoint saved to the --checkpoint file. "
+                                    "Starts from the first record if the checkpoint file doesn't exist.")
+
+    # Use lightweight VCF reader instead of PyVCF
+    argparser_obj.add_argument("--fast-reader",
+                               action="store_true",
+                               dest="fast_reader",
+                               required=False,
+                               help="Parse VCF with the lightweight FastReader, which only decodes the INFO/FORMAT fields that are used.")
+
     # Verbosity level
     argparser_obj.add_argument("-v",
                                action='count',
@@ -118,20 +224,81 @@ def main():
     summary_args["max_depth"]     = args.max_depth
     summary_args["max_qual"]      = args.max_qual
     summary_args["num_afs_bins"]  = args.num_afs_bins
+    summary_args["fast_reader"]   = args.fast_reader
+    summary_args["regions"]       = args.regions
+    summary_args["samples"]       = args.samples
+    summary_args["snpeff_most_severe"] = args.snpeff_most_severe
 
     try:
 
         logging.debug("(Main) Starting to summarize VCF file: %s" % vcf_file)
 
-        # Check to make sure VCF file is valid
-        if not VCFHelper.is_valid_vcf(vcf_file):
-            raise IOError("Invalid VCF file!")
+        # Create checkpoint for saving progress of the run
+        checkpoint = None
+        if args.checkpoint_file is not None:
+            if args.regions is not None or args.threads > 1:
+                logging.error("(Main) Checkpoints can't be used with --region or --threads!")
+                raise IOError("Invalid checkpoint options!")
+            checkpoint = VCFCheckpoint(args.checkpoint_file, vcf_file,
+                                       interval=max(args.checkpoint_interval, 1),
+                                       resume=args.resume)
+        elif args.resume:
+            logging.error("(Main) --resume requires a --checkpoint file!")
+            raise IOError("Invalid checkpoint options!")
+
+        # Create sampler for estimating the summary from randomly sampled records
+        sampler = None
+        if args.sample_fraction is not None or args.sample_records is not None:
+            if args.sample_fraction is not None and args.sample_records is not None:
+                logging.error("(Main) --sample-fraction and --sample-records can't be used together!")
+                raise IOError("Invalid sampling options!")
+            if args.sample_fraction is not None and not 0 < args.sample_fraction <= 1:
+                logging.error("(Main) --sample-fraction must be greater than 0 and at most 1!")
+                raise IOError("Invalid sampling options!")
+            if args.sample_records is not None and args.sample_records < 1:
+                logging.error("(Main) --sample-records must be at least 1!")
+                raise IOError("Invalid sampling options!")
+            if args.regions is not None or max_records != -1 or checkpoint is not None:
+                logging.error("(Main) Sampling records can't be used with --region, --max-records, or --checkpoint!")
+                raise IOError("Invalid sampling options!")
+            sampler = VCFSampler(vcf_file, fraction=args.sample_fraction, num_records=args.sample_records, seed=args.seed)
+
+        threads = args.threads
+        if threads > 1 and sampler is not None:
+            # Sampled chunks are read by a single reader
+            logging.warning("(Main) Sampling records. Summarizing with a single process!")
+            threads = 1
+
+        if threads > 1 and vcf_file == "-":
+            # Stdin can't be split into shards
+            logging.warning("(Main) Reading VCF from stdin. Summarizing with a single process!")
+            threads = 1
+
+        if threads > 1 and max_records != -1:
+            # Only the first records of the VCF are summarized
+            logging.warning("(Main) Summarizing the first %d records. Summarizing with a single process!" % max_records)
+            threads = 1
+
+        if threads > 1:
+            # Create summarizer that summarizes shards of the VCF in parallel
+            summarizer = ParallelVCFSummarizer(vcf_file, summary_type, threads,
+                                               fast_reader=summary_args.pop("fast_reader"),
+                                               regions=summary_args.pop("regions"),
+                                               samples=summary_args.pop("samples"),
+                                               **summary_args)
+        else:
+            summary_args["checkpoint"] = checkpoint
+            summary_args["sampler"] = sampler
+            summarizer = VCFSummarizer(vcf_file, summary_type, max_records, **summary_args)
 
         # Summarize VCF and print to stdout
-        summarizer = VCFSummarizer(vcf_file, summary_type, max_records, **summary_args)
         summarizer.summarize()
         print summarizer.get_summary()
 
+        # Summary is complete so there's nothing left to resume
+        if checkpoint is not None:
+            checkpoint.remove()
+
         # Summarize VCF file and print output to outfile
         logging.debug("(Main) Successfully summarized VCF file!")
 
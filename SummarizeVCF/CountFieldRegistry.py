@@ -0,0 +1,36 @@
+class CountFieldRegistry(object):
+    # Registry of the count fields of a VCFSummary
+    # Each count name maps to an integer id, which is the field's column in the summary's count matrix.
+    # Ids are assigned in the order fields are declared or first seen, which is also the order fields are reported in.
+    def __init__(self, count_names=None):
+
+        # Count names in id order and the id of each count name
+        self.names  = []
+        self.ids    = {}
+
+        for count_name in [] if count_names is None else count_names:
+            self.add(count_name)
+
+    def __contains__(self, count_name):
+        return count_name in self.ids
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def add(self, count_name):
+        # Return the id of a count name, registering it with the next id if it hasn't been seen before
+        count_id = self.ids.get(count_name)
+        if count_id is None:
+            count_id = len(self.names)
+            self.ids[count_name] = count_id
+            self.names.append(count_name)
+        return count_id
+
+    def get_id(self, count_name):
+        return self.ids[count_name]
+
+    def get_ids(self, count_names):
+        return [self.ids[x] for x in count_names]
@@ -0,0 +1,105 @@
+import logging
+import multiprocessing
+
+from VCF import VCFHelper
+from VCFSummarizer import VCFSummarizer
+from VCFSummaryFunctions import merge_two_vcf_summaries
+
+class ParallelVCFSummarizer(object):
+    # Summarize a VCF file by splitting its records into byte-range shards that are summarized in a process pool
+    # When regions are given, records of each contig are summarized as a separate shard
+    # Shard summaries are merged pairwise in their original order. Count fields are added to a merged summary in the order
+    # they first appear in each shard, so the merged summary is identical to the summary of a single process.
+
+    # Number of shards per process. Using more shards than processes balances load when record sizes vary.
+    SHARDS_PER_THREAD = 4
+
+    def __init__(self, vcf_file, summary_type, num_threads, fast_reader=False, regions=None, samples=None, **kwargs):
+
+        if vcf_file == "-":
+            logging.error("(ParallelVCFSummarizer) VCF read from stdin can't be split into shards!")
+            raise IOError("Parallel summarizing requires a VCF file!")
+
+        # Path to input VCF file
+        self.vcf_file = vcf_file
+
+        # Type of VariantAnalyzer used to summarize records
+        self.summary_type = summary_type
+
+        # Number of processes to use
+        self.num_threads = num_threads
+
+        # Whether to use FastReader to parse VCF records
+        self.fast_reader = fast_reader
+
+        # Optional list of (chrom, start, end) regions to summarize
+        self.regions = regions
+
+        # Optional list of samples to summarize
+        self.samples = samples
+
+        # Arguments passed to the VCFSummarizer of each shard
+        self.summary_args = kwargs
+
+        # Merged summary of every shard
+        self.summary = None
+
+    def get_shards(self):
+        # Return byte-range shards of the VCF, or lists of regions grouped by contig if regions were given
+        if self.regions is None:
+            return VCFHelper.get_byte_range_shards(self.vcf_file, self.num_threads * self.SHARDS_PER_THREAD)
+
+        shards = []
+        for region in VCFHelper.merge_regions(self.regions):
+            if len(shards) == 0 or shards[-1][-1][0] != region[0]:
+                shards.append([])
+            shards[-1].append(region)
+        return shards
+
+    def summarize(self):
+        # Summarize shards in parallel and merge their summaries
+        shards = self.get_shards()
+        logging.info("(ParallelVCFSummarizer) Summarizing %d shards with %d processes" % (len(shards), self.num_threads))
+
+        shard_args = [(self.vcf_file, self.summary_type, shard, self.fast_reader, self.samples, self.summary_args)
+                      for shard in shards]
+
+        pool = multiprocessing.Pool(self.num_threads)
+        try:
+            # Summarize shards. Errors in any shard are re-raised here.
+            summaries = pool.map(summarize_shard, shard_args, chunksize=1)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+        self.summary = self.merge_summaries(summaries)
+
+    @staticmethod
+    def merge_summaries(summaries):
+        # Merge a list of summaries in a tree of pairwise merges of neighbouring summaries
+        # Neighbours are merged in order so count fields keep the order they first appear in
+        while len(summaries) > 1:
+            merged = [merge_two_vcf_summaries(summaries[i], summaries[i+1]) for i in range(0, len(summaries) - 1, 2)]
+            if len(summaries) % 2 == 1:
+                merged.append(summaries[-1])
+            summaries = merged
+        return summaries[0]
+
+    def get_summary(self):
+        return self.summary
+
+def summarize_shard(shard_args):
+    # Return the summary of the records of a single VCF shard
+    # Shards are either byte ranges or lists of regions
+    vcf_file, summary_type, shard, fast_reader, samples, summary_args = shard_args
+    if isinstance(shard, list):
+        summarizer = VCFSummarizer(vcf_file, summary_type, -1, fast_reader=fast_reader, regions=shard, samples=samples,
+                                   **summary_args)
+    else:
+        summarizer = VCFSummarizer(vcf_file, summary_type, -1, fast_reader=fast_reader, byte_range=shard,
+                                   samples=samples, **summary_args)
+    summarizer.summarize()
+    return summarizer.get_summary()
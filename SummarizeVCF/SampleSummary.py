@@ -1,98 +1,116 @@
 import logging
 
 class SampleSummary(object):
-    # Class for holding summary data about a VCF file
-    def __init__(self, max_depth=500, max_qual=500, max_indel_len=250, num_afs_bins=20):
+    # View of the counts and histograms of a single sample of a VCFSummary
+    # Values are stored in the rows of the VCFSummary's matrices so views don't hold any data of their own
+    def __init__(self, vcf_summary, index):
 
-        # Main summary where values are incremented
-        self.summary        = {}
+        # Summary holding the sample's data and the sample's row in its matrices
+        self.vcf_summary    = vcf_summary
+        self.index          = index
 
-        # Upper bin for depth, qual, indel length counts
-        self.max_depth      = max_depth
-        self.max_qual       = max_qual
-        self.max_indel_len  = max_indel_len
+    @property
+    def max_depth(self):
+        return self.vcf_summary.max_depth
 
-        # Number of bins to use for allele frequency spectrum counts
-        self.num_afs_bins   = num_afs_bins
-        self.afs_bin_width  = 1.0/num_afs_bins
+    @property
+    def max_qual(self):
+        return self.vcf_summary.max_qual
 
-        # Initialize count arrays for holding histogram counts for each data type
-        self.depths         = [0] * (max_depth + 1)
-        self.quals          = [0] * (max_qual + 1)
-        self.inserts        = [0] * (max_indel_len + 1)
-        self.deletes        = [0] * (max_indel_len + 1)
-        self.afs            = [0] * num_afs_bins
+    @property
+    def max_indel_len(self):
+        return self.vcf_summary.max_indel_len
+
+    @property
+    def num_afs_bins(self):
+        return self.vcf_summary.num_afs_bins
+
+    # Histogram counts of the sample. Assigning a list of counts replaces the sample's row.
+    @property
+    def depths(self):
+        return self.vcf_summary.depths[self.index]
+
+    @depths.setter
+    def depths(self, values):
+        self.vcf_summary.depths[self.index] = values
+
+    @property
+    def quals(self):
+        return self.vcf_summary.quals[self.index]
+
+    @quals.setter
+    def quals(self, values):
+        self.vcf_summary.quals[self.index] = values
+
+    @property
+    def inserts(self):
+        return self.vcf_summary.inserts[self.index]
+
+    @inserts.setter
+    def inserts(self, values):
+        self.vcf_summary.inserts[self.index] = values
+
+    @property
+    def deletes(self):
+        return self.vcf_summary.deletes[self.index]
+
+    @deletes.setter
+    def deletes(self, values):
+        self.vcf_summary.deletes[self.index] = values
+
+    @property
+    def afs(self):
+        return self.vcf_summary.afs[self.index]
+
+    @afs.setter
+    def afs(self, values):
+        self.vcf_summary.afs[self.index] = values
 
     def init_count(self, count_name):
-        # Initialize a counter for a specific data point
-        self.summary[count_name] = 0
+        # Initialize a counter for a specific data point. Counters are shared by every sample of the summary.
+        self.vcf_summary.get_count_id(count_name)
 
     def add_count(self, count_name):
         # Increment a named counter
-        if count_name not in self.summary:
+        if count_name not in self.vcf_summary.count_fields:
             logging.error("(SampleSummary) Cannot increment a counter that hasn't been initialized: %s" % count_name)
             raise RuntimeError("Cannot increment uninitialized SampleSummary counter!")
-        self.summary[count_name] += 1
+        self.vcf_summary.add_count_id(self.index, self.vcf_summary.count_fields.get_id(count_name))
 
     def add_depth(self, depth):
         # Increment depth histogram bin corresponding to observed depth
-        if depth >= self.max_depth:
-            self.depths[self.max_depth] += 1
-        else:
-            self.depths[depth] += 1
+        self.vcf_summary.add_to_histogram(self.vcf_summary.depths, self.index, depth, self.max_depth)
 
     def add_qual(self, qual):
         # Increment variant histogram bin corresponding to observed variant quality score
-        if qual >= self.max_qual:
-            self.quals[self.max_qual] += 1
-        else:
-            self.quals[qual] += 1
+        self.vcf_summary.add_to_histogram(self.vcf_summary.quals, self.index, qual, self.max_qual)
 
     def add_del(self, del_len):
         # Increment deletion length histogram bin corresponding to observed deletion
-        if del_len >= self.max_indel_len:
-            self.deletes[self.max_indel_len] += 1
-        else:
-            self.deletes[del_len] += 1
+        self.vcf_summary.add_to_histogram(self.vcf_summary.deletes, self.index, del_len, self.max_indel_len)
 
     def add_ins(self, ins_len):
         # Increment insertion length histogram bin corresponding to observed insertion
-        if ins_len >= self.max_indel_len:
-            self.inserts[self.max_indel_len] += 1
-        else:
-            self.inserts[ins_len] += 1
+        self.vcf_summary.add_to_histogram(self.vcf_summary.inserts, self.index, ins_len, self.max_indel_len)
 
     def add_aaf(self, aaf):
         # Add alternative allele frequency (AAF) to AAF histogram
-        # Determine bin membership
-        aaf_bin = int(aaf//self.afs_bin_width)
-        # Increment appropriate count
-        self.afs[aaf_bin] += 1
+        self.vcf_summary.afs[self.index, self.vcf_summary.get_aaf_bin(aaf)] += 1
 
     def get_count(self, count_name):
-        return self.summary[count_name]
+        return int(self.vcf_summary.counts[self.index, self.vcf_summary.count_fields.get_id(count_name)])
 
     def get_depth_summary(self):
-        labels = [str(x) for x in range(len(self.depths))]
-        labels[-1] = ">%s" % labels[-1]
-        return labels, self.depths
+        return self.vcf_summary.get_histogram_labels(self.max_depth), self.depths.tolist()
 
     def get_qual_summary(self):
-        labels = [str(x) for x in range(len(self.quals))]
-        labels[-1] = ">%s" % labels[-1]
-        return labels, self.quals
+        return self.vcf_summary.get_histogram_labels(self.max_qual), self.quals.tolist()
 
     def get_del_summary(self):
-        labels = [str(x) for x in range(len(self.deletes))]
-        labels[-1] = ">%s" % labels[-1]
-        return labels, self.deletes
+        return self.vcf_summary.get_histogram_labels(self.max_indel_len), self.deletes.tolist()
 
     def get_ins_summary(self):
-        labels = [str(x) for x in range(len(self.inserts))]
-        labels[-1] = ">%s" % labels[-1]
-        return labels, self.inserts
+        return self.vcf_summary.get_histogram_labels(self.max_indel_len), self.inserts.tolist()
 
     def get_aaf_summary(self):
-        bin_width = 1.0/self.num_afs_bins
-        labels = [ str(i*bin_width)  for i in range(self.num_afs_bins) ]
-        return labels, self.afs
+        return self.vcf_summary.get_aaf_labels(), self.afs.tolist()
@@ -0,0 +1,114 @@
+import logging
+import math
+import numpy as np
+
+class SamplingReport(object):
+    # Estimated ratios of a VCFSummary of randomly sampled chunks of a VCF along with their 95% confidence intervals
+    # Sampled chunks are clusters of records, so intervals are estimated from the variation of counts between chunks.
+    # The ratio of two counts is estimated as the ratio of their totals over all sampled chunks, and its variance as the
+    # linearized variance of a ratio estimator of a simple random sample of chunks without replacement.
+    # Intervals estimated from a handful of chunks are unreliable even with t quantiles, so they're only reported when at
+    # least MIN_CHUNKS chunks were sampled, or when every chunk was sampled and the ratios are exact.
+
+    # Minimum number of sampled chunks needed to report confidence intervals
+    MIN_CHUNKS = 5
+
+    # Name, numerator and denominator count names of each reported ratio
+    RATIOS = [("Ts/Tv",             "Ts",           "Tv"),
+              ("Het/Hom",           "Heterozygous", "Homozygous-Alt"),
+              ("dbSNP_Fraction",    "dbSNP",        "Variant GT")]
+
+    # Quantiles of two-sided 95% confidence intervals
+    # Student's t quantiles are used for up to 30 degrees of freedom (one less than the number of sampled chunks)
+    T_SCORES = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+                2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+                2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+    Z_SCORE = 1.959964
+
+    def __init__(self, vcf_summary):
+
+        # Sample names and the columns of counts used by ratios in the summary's count matrix
+        self.sample_names   = list(vcf_summary.sample_names)
+        self.count_names    = []
+        for _, numerator, denominator in self.RATIOS:
+            self.count_names += [x for x in [numerator, denominator] if x not in self.count_names]
+        self.count_ids      = vcf_summary.init_count_fields(self.count_names)
+
+        # Counts of each sample when the last chunk was added
+        self.last_counts    = vcf_summary.counts[:, self.count_ids].copy()
+
+        # Sums of the counts of each sample over all sampled chunks and sums of the products of every pair of counts
+        num_counts          = len(self.count_names)
+        self.sums           = np.zeros((len(self.sample_names), num_counts), dtype=np.float64)
+        self.products       = np.zeros((len(self.sample_names), num_counts, num_counts), dtype=np.float64)
+
+        # Number of chunks in the VCF and number of chunks and records sampled
+        self.num_chunks     = 0
+        self.chunks_sampled = 0
+        self.records_sampled = 0
+
+    def add_chunk(self, vcf_summary):
+        # Add the counts added to a summary since the last chunk was added
+        counts = vcf_summary.counts[:, self.count_ids].copy()
+        chunk_counts = (counts - self.last_counts).astype(np.float64)
+        self.last_counts = counts
+        self.sums += chunk_counts
+        self.products += chunk_counts[:, :, None] * chunk_counts[:, None, :]
+
+    def set_sample_size(self, num_chunks, chunks_sampled, records_sampled):
+        # Set the number of chunks in the VCF and the number of chunks and records sampled
+        # Chunks without records are included in the number of chunks sampled
+        self.num_chunks = num_chunks
+        self.chunks_sampled = chunks_sampled
+        self.records_sampled = records_sampled
+        if chunks_sampled < min(self.MIN_CHUNKS, num_chunks):
+            logging.warning("(SamplingReport) Only %d chunks were sampled. Confidence intervals need at least %d "
+                            "sampled chunks and won't be reported!" % (chunks_sampled, self.MIN_CHUNKS))
+
+    def get_ratio(self, sample_index, ratio_index):
+        # Return the estimate, lower bound, and upper bound of a ratio of a sample
+        # Bounds are None if fewer than MIN_CHUNKS chunks were sampled and the estimate is None if the denominator is zero
+        _, numerator, denominator = self.RATIOS[ratio_index]
+        y = self.count_names.index(numerator)
+        x = self.count_names.index(denominator)
+        sum_y = self.sums[sample_index, y]
+        sum_x = self.sums[sample_index, x]
+        if sum_x == 0:
+            return None, None, None
+
+        ratio = sum_y / sum_x
+        n = self.chunks_sampled
+        if n >= self.num_chunks:
+            # Every chunk was sampled so the ratio is exact
+            return ratio, ratio, ratio
+        if n < self.MIN_CHUNKS:
+            return ratio, None, None
+
+        # Variance of the chunk residuals (y - ratio*x), which sum to zero
+        products = self.products[sample_index]
+        residual_var = (products[y, y] - 2*ratio*products[x, y] + ratio*ratio*products[x, x]) / (n - 1)
+        mean_x = sum_x / n
+        finite_population = max(1.0 - float(n) / self.num_chunks, 0.0)
+        score = self.T_SCORES[n - 2] if n - 1 <= len(self.T_SCORES) else self.Z_SCORE
+        half_width = score * math.sqrt(max(finite_population * residual_var / (n * mean_x * mean_x), 0.0))
+        return ratio, max(ratio - half_width, 0.0), ratio + half_width
+
+    def __str__(self):
+        # Get string representation of the sampling section of a report
+        to_ret = "#SAMPLING\n"
+        to_ret += "##Total_Chunks=%d\n" % self.num_chunks
+        to_ret += "##Sampled_Chunks=%d\n" % self.chunks_sampled
+        to_ret += "##Sampled_Records=%d\n" % self.records_sampled
+        to_ret += "##Scale_Factor=%f\n" % (float(self.num_chunks) / max(self.chunks_sampled, 1))
+
+        header = ["Sample"]
+        for name, _, _ in self.RATIOS:
+            header += [name, "%s_Lower_95" % name, "%s_Upper_95" % name]
+        to_ret += "\t".join(header) + "\n"
+
+        for i, sample in enumerate(self.sample_names):
+            row = [sample]
+            for j in range(len(self.RATIOS)):
+                row += ["NA" if x is None else "%f" % x for x in self.get_ratio(i, j)]
+            to_ret += "\t".join(row) + "\n"
+        return to_ret
@@ -1,23 +1,43 @@
 import logging
-import vcf
 
-from VCF import AnnotationParser
+from VCF import AnnotationParser, VCFHelper
 from SummarizeVCF.VariantAnalyzer import VariantAnalyzerFactory
 from VCFSummary import VCFSummary
+from SamplingReport import SamplingReport
 
 class VCFSummarizer(object):
 
+    # Number of records passed to the variant analyzer at once
+    # Analyzers summarize the genotypes of a block of records with array operations
+    BLOCK_SIZE = 1000
+
     # Class for parsing VCF objects
     def __init__(self, vcf_file, summary_type, max_records, **kwargs):
 
         # Get VCFParser
-        self.vcf_parser = vcf.Reader(open(vcf_file, "r"))
+        self.vcf_parser = VCFHelper.get_vcf_parser(vcf_file,
+                                                   fast_reader=kwargs.pop("fast_reader", False),
+                                                   regions=kwargs.pop("regions", None),
+                                                   byte_range=kwargs.pop("byte_range", None),
+                                                   samples=kwargs.pop("samples", None),
+                                                   checkpoint=kwargs.get("checkpoint"),
+                                                   sampler=kwargs.get("sampler"))
+
+        # Optional VCFCheckpoint used to periodically save progress and resume interrupted runs
+        self.checkpoint = kwargs.pop("checkpoint", None)
+
+        # Optional VCFSampler used to only summarize randomly sampled records
+        self.sampler = kwargs.pop("sampler", None)
 
         # Set number of records to summarize
         self.max_records = max_records
 
         # Get annotation parser specific to this vcf
-        self.annotation_parser = AnnotationParser(self.vcf_parser)
+        # Only the INFO fields used to summarize variants are decoded
+        info_fields = VCFHelper.get_summary_info_fields(VCFHelper.get_info_field_names(self.vcf_parser))
+        self.annotation_parser = AnnotationParser(self.vcf_parser,
+                                                  info_fields=info_fields,
+                                                  snpeff_most_severe=kwargs.pop("snpeff_most_severe", False))
 
         # Get variant analyzer
         variant_analyzer_factory = VariantAnalyzerFactory(self.annotation_parser)
@@ -28,11 +48,24 @@ class VCFSummarizer(object):
                                   required_count_names=self.variant_analyzer.declare_required_count_fields(),
                                   **kwargs)
 
+        # Continue from the summary saved by a resumed checkpoint
+        if self.checkpoint is not None and self.checkpoint.is_resumed():
+            self.summary = self.checkpoint.get_data("summary")
+
+        # Track counts of each sampled chunk to estimate confidence intervals of ratios
+        self.sampling_report = SamplingReport(self.summary) if self.sampler is not None else None
+
     def summarize(self):
         # Parse VCF and generate summary statistics
 
-        # Num lines processed
-        processed = 0
+        # Num lines processed, including lines processed before a resumed checkpoint
+        processed = self.checkpoint.get_records_processed() if self.checkpoint is not None else 0
+
+        # Records waiting to be summarized
+        block = []
+
+        # Sampled chunk the records in the block were read from
+        chunk = None
 
         for variant_record in self.vcf_parser:
 
@@ -48,8 +81,16 @@ class VCFSummarizer(object):
                 # Failing to raise this error could cause some weirdo unintended bugs
                 raise IOError("Multiple alternate alleles detected at one or more positions in vcf file!")
 
-            # Add data from summarizer to report
-            self.variant_analyzer.analyze(record=variant_record, vcf_summary=self.summary)
+            # Summarize the records of each sampled chunk separately so the counts of each chunk can be tracked
+            if self.sampler is not None and self.sampler.chunk != chunk:
+                if len(block) > 0:
+                    self.variant_analyzer.analyze_block(records=block, vcf_summary=self.summary)
+                    block = []
+                self.sampling_report.add_chunk(self.summary)
+                chunk = self.sampler.chunk
+
+            # Add record to the block of records summarized together
+            block.append(variant_record)
 
             # Increment number of records processed
             processed += 1
@@ -58,6 +99,29 @@ class VCFSummarizer(object):
             if processed >= self.max_records and self.max_records != -1:
                 break
 
+            # Add data from summarizer to report once the block is full
+            checkpoint_due = self.checkpoint is not None and self.checkpoint.is_due(processed)
+            if len(block) >= self.BLOCK_SIZE or checkpoint_due:
+                self.variant_analyzer.analyze_block(records=block, vcf_summary=self.summary)
+                block = []
+
+            # Save progress along with the summary so far
+            if checkpoint_due:
+                self.checkpoint.save(processed, summary=self.summary)
+
+        # Add data from the last block of records
+        if len(block) > 0:
+            self.variant_analyzer.analyze_block(records=block, vcf_summary=self.summary)
+
+        # Scale counts of sampled records to estimates for the whole VCF
+        if self.sampler is not None:
+            self.sampling_report.add_chunk(self.summary)
+            self.sampling_report.set_sample_size(self.sampler.num_chunks,
+                                                 self.sampler.chunks_sampled,
+                                                 self.sampler.records_sampled)
+            self.summary.scale(self.sampler.get_scale())
+            self.summary.sampling = self.sampling_report
+
     def get_summary(self):
         return self.summary
 
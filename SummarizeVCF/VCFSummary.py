@@ -1,13 +1,29 @@
+import operator
+import numpy as np
+
 from SummarizeVCF.SampleSummary import SampleSummary
+from SummarizeVCF.CountFieldRegistry import CountFieldRegistry
 
 class VCFSummary(object):
-    def __init__(self, sample_names, required_count_names=None, **kwargs):
+    # Summary statistics of the samples of a VCF
+    # Counts are stored in a single (samples x count fields) matrix and each histogram in a (samples x bins) matrix, so
+    # merging two summaries is an array addition. Columns of the count matrix are allocated in growing blocks so count
+    # fields first seen while summarizing are added without copying the matrix each time.
+    # The SampleSummary of each sample is a view of its row in the matrices.
+    # Count fields are registered in a CountFieldRegistry mapping each count name to its column. Analyzers resolve the ids
+    # of samples and count fields once per record and increment counts by id.
+
+    # Histogram matrices of each summary
+    HISTOGRAMS = ["depths", "quals", "inserts", "deletes", "afs"]
 
-        # List of samples to be contained in report
-        self.sample_names   = sample_names
+    # Minimum number of count columns allocated at once
+    MIN_COUNT_COLUMNS = 64
 
-        # List of colnames that will be counted in report
-        self.count_names    = [] if required_count_names is None else required_count_names
+    def __init__(self, sample_names, required_count_names=None, **kwargs):
+
+        # List of samples to be contained in report and the row of each sample in the summary matrices
+        self.sample_names   = list(sample_names)
+        self.sample_index   = dict([(x, i) for i, x in enumerate(self.sample_names)])
 
         # Upper bin for depth, qual, indel distribution summaries
         self.max_indel_len  = kwargs.get("max_indel_len",   100)
@@ -16,114 +32,242 @@ class VCFSummary(object):
 
         # Number of bins to use for allele frequency spectrum counts
         self.num_afs_bins   = kwargs.get("num_afs_bins",    20)
+        self.afs_bin_width  = 1.0/self.num_afs_bins
+
+        # Registry of colnames that will be counted in report and the (samples x count fields) count matrix
+        self.count_fields   = CountFieldRegistry()
+        self.counts         = np.zeros((len(self.sample_names), self.MIN_COUNT_COLUMNS), dtype=np.int64)
 
-        # Main summary where values are incremented
+        # Histogram counts of each sample
+        self.depths         = self.__init_histogram(self.max_depth + 1)
+        self.quals          = self.__init_histogram(self.max_qual + 1)
+        self.inserts        = self.__init_histogram(self.max_indel_len + 1)
+        self.deletes        = self.__init_histogram(self.max_indel_len + 1)
+        self.afs            = self.__init_histogram(self.num_afs_bins)
+
+        if required_count_names is not None:
+            self.init_count_fields(required_count_names)
+
+        # Optional SamplingReport of summaries estimated from randomly sampled records
+        self.sampling       = None
+
+        # Per-sample views of the summary
         self.summary = self.init_summary()
 
+    def __init_histogram(self, num_bins):
+        return np.zeros((len(self.sample_names), num_bins), dtype=np.int64)
+
     def init_summary(self):
-        # Create new summaries for each sample and initialize counters for each count_name
-        summary = {}
-        for sample_name in self.sample_names:
-            summary[sample_name] = SampleSummary(self.max_depth, self.max_qual, self.max_indel_len, self.num_afs_bins)
-            for count_name in self.count_names:
-                summary[sample_name].init_count(count_name)
-        return summary
+        # Create a view of the counts and histograms of each sample
+        return dict([(x, SampleSummary(self, i)) for i, x in enumerate(self.sample_names)])
+
+    def __getstate__(self):
+        # Views are recreated when a pickled summary is loaded (e.g. from a checkpoint)
+        state = self.__dict__.copy()
+        del state["summary"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.summary = self.init_summary()
+
+    @property
+    def count_names(self):
+        # Count names in output order
+        return self.count_fields.names
+
+    @property
+    def count_ids(self):
+        # Column of each count name in the count matrix
+        return self.count_fields.ids
 
     def init_count_field(self, count_name):
-        # Initialize a new count field for all samples
-        for sample_name in self.sample_names:
-            self.summary[sample_name].init_count(count_name)
-        self.count_names.append(count_name)
+        # Initialize a count field for all samples and return its id
+        return self.init_count_fields([count_name])[0]
+
+    def init_count_fields(self, count_names):
+        # Initialize count fields for all samples and return their ids. Fields that already exist keep their ids.
+        count_ids = [self.count_fields.add(x) for x in count_names]
+        num_columns = self.counts.shape[1]
+        if len(self.count_fields) > num_columns:
+            # Double the number of allocated columns so adding fields takes amortized constant time
+            counts = np.zeros((len(self.sample_names), max(2*num_columns, len(self.count_fields), self.MIN_COUNT_COLUMNS)),
+                              dtype=np.int64)
+            counts[:, :num_columns] = self.counts
+            self.counts = counts
+        return count_ids
+
+    def get_count_id(self, count_name):
+        # Return the id of a count field, initializing the field if it hasn't been seen before
+        count_id = self.count_fields.ids.get(count_name)
+        return self.init_count_field(count_name) if count_id is None else count_id
+
+    def get_sample_id(self, sample_name):
+        # Return the row of a sample in the summary matrices
+        return self.sample_index[sample_name]
+
+    def add_samples(self, sample_names):
+        # Add samples with empty counts and histograms
+        if len(sample_names) == 0:
+            return
+        for sample_name in sample_names:
+            self.sample_index[sample_name] = len(self.sample_names)
+            self.summary[sample_name] = SampleSummary(self, len(self.sample_names))
+            self.sample_names.append(sample_name)
+
+        self.counts = np.vstack([self.counts, np.zeros((len(sample_names), self.counts.shape[1]), dtype=np.int64)])
+        for histogram in self.HISTOGRAMS:
+            values = getattr(self, histogram)
+            setattr(self, histogram, np.vstack([values, np.zeros((len(sample_names), values.shape[1]), dtype=np.int64)]))
+
+    def get_counts(self):
+        # Return the (samples x count fields) matrix of counts
+        return self.counts[:, :len(self.count_names)]
+
+    def set_counts(self, sample_name, counts):
+        # Set the counts of a sample to a list of values in count field order
+        self.counts[self.sample_index[sample_name], :len(counts)] = counts
+
+    def scale(self, factor):
+        # Multiply counts and histograms by a factor, rounding to the nearest integer
+        self.counts = np.rint(self.counts * factor).astype(np.int64)
+        for histogram in self.HISTOGRAMS:
+            setattr(self, histogram, np.rint(getattr(self, histogram) * factor).astype(np.int64))
 
     def add_count(self, sample_name, count_name):
-        if count_name not in self.count_names:
-            self.init_count_field(count_name)
-        self.summary[sample_name].add_count(count_name)
+        # Get the id first as initializing a new field can reallocate the count matrix
+        count_id = self.get_count_id(count_name)
+        self.counts[self.sample_index[sample_name], count_id] += 1
+
+    def add_count_id(self, sample_id, count_id):
+        # Increment a count by the ids of its sample and count field
+        self.counts[sample_id, count_id] += 1
+
+    def add_count_ids(self, sample_id, count_ids):
+        # Increment several counts of a sample by the ids of their count fields
+        counts = self.counts
+        for count_id in count_ids:
+            counts[sample_id, count_id] += 1
+
+    def add_count_block(self, rows, count_ids, counts):
+        # Add a (samples x count fields) matrix of counts to the summary
+        # Rows are the samples' rows in the summary (or a slice of every row) and count ids must be unique
+        if isinstance(rows, slice):
+            self.counts[rows, count_ids] += counts
+        else:
+            self.counts[np.ix_(rows, count_ids)] += counts
+
+    def add_record_counts_block(self, rows, record_count_names, mask):
+        # Increment the counts named for each record of a block for every sample in the record's row of a mask
+        # Count fields that haven't been seen before are initialized in the order they first appear in the block
+        count_ids = []
+        columns = {}
+        entries = []
+        for i, count_names in enumerate(record_count_names):
+            for count_name in count_names:
+                count_id = self.get_count_id(count_name)
+                if count_id not in columns:
+                    columns[count_id] = len(count_ids)
+                    count_ids.append(count_id)
+                entries.append((i, columns[count_id]))
+
+        if len(count_ids) == 0:
+            return
+
+        # Number of times each record increments each count field
+        record_counts = np.zeros((len(record_count_names), len(count_ids)), dtype=np.int64)
+        for i, column in entries:
+            record_counts[i, column] += 1
+        self.add_count_block(rows, count_ids, mask.T.astype(np.int64).dot(record_counts))
+
+    @staticmethod
+    def add_block_to_histogram(histogram, rows, values, mask, max_value):
+        # Add the values in a mask of a (records x samples) array to the histogram rows of the samples
+        # Values can also be any array that broadcasts to the mask, e.g. a column of per-record values
+        # Values >= max_value are counted in the last bin
+        num_bins = histogram.shape[1]
+        num_samples = mask.shape[1]
+        values = np.broadcast_to(values, mask.shape)
+        bins = np.minimum(values[mask], max_value) + num_bins*np.nonzero(mask)[1]
+        histogram[rows] += np.bincount(bins, minlength=num_samples*num_bins).reshape(num_samples, num_bins)
+
+    @staticmethod
+    def add_to_histogram(histogram, index, value, max_value):
+        # Increment the bin of a value in a row of a histogram matrix. Values >= max_value are counted in the last bin.
+        value = operator.index(value)
+        histogram[index, max_value if value >= max_value else value] += 1
+
+    def get_aaf_bin(self, aaf):
+        # Return the allele frequency spectrum bin of an alternate allele frequency
+        return int(aaf//self.afs_bin_width)
 
     def add_depth(self, sample_name, depth):
-        self.summary[sample_name].add_depth(depth)
+        self.add_to_histogram(self.depths, self.sample_index[sample_name], depth, self.max_depth)
 
     def add_qual(self, sample_name, qual):
-        self.summary[sample_name].add_qual(qual)
+        self.add_to_histogram(self.quals, self.sample_index[sample_name], qual, self.max_qual)
 
     def add_del(self, sample_name, del_len):
-        self.summary[sample_name].add_del(del_len)
+        self.add_to_histogram(self.deletes, self.sample_index[sample_name], del_len, self.max_indel_len)
 
     def add_ins(self, sample_name, ins_len):
-        self.summary[sample_name].add_ins(ins_len)
+        self.add_to_histogram(self.inserts, self.sample_index[sample_name], ins_len, self.max_indel_len)
 
     def add_aaf(self, sample_name, aaf):
-        self.summary[sample_name].add_aaf(aaf)
+        self.afs[self.sample_index[sample_name], self.get_aaf_bin(aaf)] += 1
+
+    def add_depth_block(self, rows, depths, mask):
+        self.add_block_to_histogram(self.depths, rows, depths, mask, self.max_depth)
+
+    def add_qual_block(self, rows, quals, mask):
+        self.add_block_to_histogram(self.quals, rows, quals, mask, self.max_qual)
+
+    def add_del_block(self, rows, del_lens, mask):
+        self.add_block_to_histogram(self.deletes, rows, del_lens, mask, self.max_indel_len)
+
+    def add_ins_block(self, rows, ins_lens, mask):
+        self.add_block_to_histogram(self.inserts, rows, ins_lens, mask, self.max_indel_len)
+
+    def add_aaf_block(self, rows, aafs, mask):
+        # Alternate allele frequencies of 1 are counted in the last bin
+        aaf_bins = (np.asarray(aafs, dtype=np.float64)//self.afs_bin_width).astype(np.int64)
+        self.add_block_to_histogram(self.afs, rows, aaf_bins, mask, self.num_afs_bins - 1)
+
+    @staticmethod
+    def get_histogram_labels(max_value):
+        # Return labels of histogram bins 0 to max_value, where the last bin holds every larger value
+        labels = [str(x) for x in range(max_value + 1)]
+        labels[-1] = ">%s" % labels[-1]
+        return labels
+
+    def get_aaf_labels(self):
+        bin_width = 1.0/self.num_afs_bins
+        return [str(i*bin_width) for i in range(self.num_afs_bins)]
 
     def __str__(self):
         # Get string representation of current report
-        return self.__get_count_data_string() + self.__get_depth_summary_string() + self.__get_qual_summary_string() + self.__get_afs_summary_string() + self.__get_insert_summary_string() + self.__get_delete_summary_string()
+        return self.__get_count_data_string() + \
+               self.__get_histogram_string("#DEPTH", self.get_histogram_labels(self.max_depth), self.depths) + \
+               self.__get_histogram_string("#QUAL", self.get_histogram_labels(self.max_qual), self.quals) + \
+               self.__get_histogram_string("#AAFS", self.get_aaf_labels(), self.afs) + \
+               self.__get_histogram_string("#INSERT_LEN", self.get_histogram_labels(self.max_indel_len), self.inserts) + \
+               self.__get_histogram_string("#DELETE_LEN", self.get_histogram_labels(self.max_indel_len), self.deletes) + \
+               ("" if self.sampling is None else str(self.sampling))
 
     def __get_count_data_string(self):
         to_ret = "#COUNTS\n"
         count_names = [x.replace(" ", "_") for x in self.count_names]
         to_ret += "\t".join(["Sample"] + count_names) + "\n"
-        for sample in self.sample_names:
-            sample_data = [sample] + ["%d" % self.summary[sample].get_count(count_name) for count_name in self.count_names]
-            to_ret += "\t".join(sample_data) + "\n"
-        return to_ret
-
-    def __get_depth_summary_string(self):
-        to_ret = "#DEPTH\n"
-        first_sample = True
-        for sample in self.sample_names:
-            labels, data = self.summary[sample].get_depth_summary()
-            if first_sample:
-                to_ret += "\t".join(["Sample"] + labels) + "\n"
-                first_sample = False
-            sample_data = [sample] + ["%d" % x for x in data]
-            to_ret += "\t".join(sample_data) + "\n"
-        return to_ret
-
-    def __get_qual_summary_string(self):
-        to_ret = "#QUAL\n"
-        first_sample = True
-        for sample in self.sample_names:
-            labels, data = self.summary[sample].get_qual_summary()
-            if first_sample:
-                to_ret += "\t".join(["Sample"] + labels) + "\n"
-                first_sample = False
-            sample_data = [sample] + ["%d" % x for x in data]
-            to_ret += "\t".join(sample_data) + "\n"
-        return to_ret
-
-    def __get_insert_summary_string(self):
-        to_ret = "#INSERT_LEN\n"
-        first_sample = True
-        for sample in self.sample_names:
-            labels, data = self.summary[sample].get_ins_summary()
-            if first_sample:
-                to_ret += "\t".join(["Sample"] + labels) + "\n"
-                first_sample = False
-            sample_data = [sample] + ["%d" % x for x in data]
-            to_ret += "\t".join(sample_data) + "\n"
-        return to_ret
-
-    def __get_delete_summary_string(self):
-        to_ret = "#DELETE_LEN\n"
-        first_sample = True
-        for sample in self.sample_names:
-            labels, data = self.summary[sample].get_del_summary()
-            if first_sample:
-                to_ret += "\t".join(["Sample"] + labels) + "\n"
-                first_sample = False
-            sample_data = [sample] + ["%d" % x for x in data]
-            to_ret += "\t".join(sample_data) + "\n"
-        return to_ret
-
-    def __get_afs_summary_string(self):
-        to_ret = "#AAFS\n"
-        first_sample = True
-        for sample in self.sample_names:
-            labels, data = self.summary[sample].get_aaf_summary()
-            if first_sample:
-                to_ret += "\t".join(["Sample"] + labels) + "\n"
-                first_sample = False
-            sample_data = [sample] + ["%d" % x for x in data]
-            to_ret += "\t".join(sample_data) + "\n"
-        return to_ret
+        return to_ret + self.__get_rows_string(self.get_counts())
+
+    def __get_histogram_string(self, section, labels, histogram):
+        # Header of histogram sections is only written if there are samples
+        to_ret = section + "\n"
+        if len(self.sample_names) > 0:
+            to_ret += "\t".join(["Sample"] + labels) + "\n"
+        return to_ret + self.__get_rows_string(histogram)
+
+    def __get_rows_string(self, values):
+        # Return the rows of a (samples x columns) matrix labelled with sample names
+        return "".join(["\t".join([sample] + ["%d" % x for x in row]) + "\n"
+                        for sample, row in zip(self.sample_names, values.tolist())])
@@ -1,4 +1,5 @@
 import logging
+import numpy as np
 
 class VCFSummeryMergeError(Exception):
     pass
@@ -11,30 +12,23 @@ def merge_two_vcf_summaries(vcf_summary_1, vcf_summary_2):
         logging.error("Unable to merge VCF Summaries! %s" % reason)
         raise VCFSummeryMergeError("Unable to merge VCF summaries!")
 
-    # Init uninitialized counts in each VCF summary
-    count_names_1 = vcf_summary_1.count_names
-    count_names_2 = vcf_summary_2.count_names
-    for count_name in count_names_1:
-        # Add counts from summary 1 that don't appear in summary 2
-        if count_name not in count_names_2:
-            vcf_summary_2.init_count_field(count_name)
-    for count_name in count_names_2:
-        # Add counts from summary 2 that don't appear in summary 1
-        if count_name not in count_names_1:
-            vcf_summary_1.init_count_field(count_name)
-
-    # Merge all sample summaries that appear in both VCFSummaries
-    sample_names_1 = vcf_summary_1.sample_names
-    sample_names_2 = vcf_summary_2.sample_names
-    for sample_name in sample_names_1:
-        if sample_name in sample_names_2:
-            merge_sample_summaries(vcf_summary_1.summary[sample_name], vcf_summary_2.summary[sample_name])
+    # Add count fields of summary 2 that don't appear in summary 1 in the order they appear in summary 2
+    columns = vcf_summary_1.init_count_fields(vcf_summary_2.count_names)
 
     # Add any samples in VCFSummary_2 that don't appear in VCFSummary 1
-    for sample_name in sample_names_2:
-        if sample_name not in sample_names_1:
-            vcf_summary_1.summary[sample_name] = vcf_summary_2.summary[sample_name]
-            vcf_summary_1.sample_names.append(sample_name)
+    vcf_summary_1.add_samples([x for x in vcf_summary_2.sample_names if x not in vcf_summary_1.sample_index])
+
+    # Add counts and histograms of summary 2 to the rows and columns of the same samples and counts in summary 1
+    rows = [vcf_summary_1.sample_index[x] for x in vcf_summary_2.sample_names]
+    if rows == range(len(rows)) and columns == range(len(columns)):
+        # Samples and counts are in the same order in both summaries
+        vcf_summary_1.counts[:len(rows), :len(columns)] += vcf_summary_2.get_counts()
+        for histogram in vcf_summary_1.HISTOGRAMS:
+            getattr(vcf_summary_1, histogram)[:len(rows)] += getattr(vcf_summary_2, histogram)
+    else:
+        vcf_summary_1.counts[np.ix_(rows, columns)] += vcf_summary_2.get_counts()
+        for histogram in vcf_summary_1.HISTOGRAMS:
+            getattr(vcf_summary_1, histogram)[rows] += getattr(vcf_summary_2, histogram)
 
     # Return merged VCFSummary
     return vcf_summary_1
@@ -42,23 +36,14 @@ def merge_two_vcf_summaries(vcf_summary_1, vcf_summary_2):
 def merge_sample_summaries(sample_1, sample_2):
 
     # Combine counts
-    for count_name in sample_1.summary:
-        sample_1.summary[count_name] += sample_2.summary[count_name]
-
-    # Combine depths
-    sample_1.depths = [sample_1.depths[i] + sample_2.depths[i] for i in range(len(sample_1.depths))]
-
-    # Combine depths
-    sample_1.quals = [sample_1.quals[i] + sample_2.quals[i] for i in range(len(sample_1.quals))]
-
-    # Combine depths
-    sample_1.afs = [sample_1.afs[i] + sample_2.afs[i] for i in range(len(sample_1.afs))]
-
-    # Combine depths
-    sample_1.inserts = [sample_1.inserts[i] + sample_2.inserts[i] for i in range(len(sample_1.inserts))]
-
-    # Combine depths
-    sample_1.deletes = [sample_1.deletes[i] + sample_2.deletes[i] for i in range(len(sample_1.deletes))]
+    for count_name in sample_1.vcf_summary.count_names:
+        if count_name in sample_2.vcf_summary.count_fields:
+            sample_1.vcf_summary.counts[sample_1.index, sample_1.vcf_summary.count_fields.get_id(count_name)] += \
+                sample_2.get_count(count_name)
+
+    # Combine histograms
+    for histogram in sample_1.vcf_summary.HISTOGRAMS:
+        getattr(sample_1.vcf_summary, histogram)[sample_1.index] += getattr(sample_2.vcf_summary, histogram)[sample_2.index]
 
 def can_merge_summaries(vcf_summary_1, vcf_summary_2):
     # Check to see if two summaries can be merged
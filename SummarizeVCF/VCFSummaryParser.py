@@ -10,6 +10,7 @@ class VCFSummaryParser:
     AAFS    = 4
     INSERT  = 5
     DELETE  = 6
+    SAMPLING = 7
 
     def __init__(self, vcf_summary_file):
         self.vcf_summary_file = vcf_summary_file
@@ -48,9 +49,7 @@ class VCFSummaryParser:
                     data = line.split()[1:]
                     if curr_section == VCFSummaryParser.COUNT:
                         # Set each count to the value observed in VCFSummary file
-                        for i in range(len(data)):
-                            count_name = self.vcf_summary.count_names[i]
-                            self.vcf_summary.summary[sample].summary[count_name] = int(data[i])
+                        self.vcf_summary.set_counts(sample, [int(x) for x in data])
                     elif curr_section == VCFSummaryParser.DEPTH:
                         # Set sample depth distribution observed in VCFSummary file
                         self.vcf_summary.summary[sample].depths = [int(x) for x in data]
@@ -66,6 +65,9 @@ class VCFSummaryParser:
                     elif curr_section == VCFSummaryParser.DELETE:
                         # Set sample deletion length distribution observed in VCFSummary file
                         self.vcf_summary.summary[sample].deletes = [int(x) for x in data]
+                    elif curr_section == VCFSummaryParser.SAMPLING:
+                        # Skip ratio estimates of sampled summaries as they're only valid for the summary they came from
+                        continue
                     else:
                         logging.error("Invalid VCFSummary file: %s" % self.vcf_summary_file)
                         raise IOError("Invalid VCFSummary file!")
@@ -103,6 +105,9 @@ class VCFSummaryParser:
                         summary_params["max_indel_len"] = int(header_data[-2]) + 1
                     elif curr_section == VCFSummaryParser.DELETE:
                         summary_params["max_del_len"] = int(header_data[-2]) + 1
+                    elif curr_section == VCFSummaryParser.SAMPLING:
+                        # Sampling section isn't needed to initialize the summary
+                        pass
                     elif len(line) > 0:
                         # Throw error if a non-empty line is reach and the section is unknown
                         logging.error("Invalid VCFSummary file: %s" % self.vcf_summary_file)
@@ -150,5 +155,7 @@ class VCFSummaryParser:
             return VCFSummaryParser.INSERT
         elif line.startswith("#DELETE"):
             return VCFSummaryParser.DELETE
+        elif line.startswith("#SAMPLING"):
+            return VCFSummaryParser.SAMPLING
         else:
             return curr_section
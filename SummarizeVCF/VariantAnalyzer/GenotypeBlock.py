@@ -0,0 +1,45 @@
+import numpy as np
+
+class GenotypeBlock(object):
+    # Genotypes of a block of VCF records stored in a (records x samples) array so a block can be summarized with
+    # array operations instead of once per sample
+    # Genotype types use PyVCF's codes (0 = homo ref, 1 = hetero, 2 = homo alt). Missing genotypes are MISSING and
+    # genotypes of records without sample columns are ABSENT.
+
+    MISSING = -1
+    ABSENT  = -2
+
+    def __init__(self, records, vcf_summary):
+
+        # Records in the block and the genotype calls of each record
+        self.records    = records
+        self.calls      = [record.samples for record in records]
+
+        # Rows of the block's samples in the summary matrices
+        self.rows       = self.__get_sample_rows(vcf_summary)
+
+        # Genotype type of each sample in each record
+        num_samples     = len(vcf_summary.sample_names) if isinstance(self.rows, slice) else len(self.rows)
+        self.gt_types   = np.full((len(records), num_samples), self.ABSENT, dtype=np.int8)
+        for i, calls in enumerate(self.calls):
+            if len(calls) > 0:
+                self.gt_types[i] = [self.MISSING if x.gt_type is None else x.gt_type for x in calls]
+
+    def __get_sample_rows(self, vcf_summary):
+        # Return the rows of the samples of the block's records in the summary matrices
+        # Every record of a VCF lists its samples in the same order, so rows are taken from the first record with samples
+        for calls in self.calls:
+            if len(calls) > 0:
+                rows = [vcf_summary.get_sample_id(x.sample) for x in calls]
+                return slice(None) if rows == range(len(vcf_summary.sample_names)) else rows
+        return slice(None)
+
+    def get_format_values(self, get_value, mask):
+        # Return a (records x samples) array of a value computed from the FORMAT fields of each genotype in a mask
+        # Genotypes outside the mask are set to -1. get_value should also return -1 for missing values.
+        values = np.full(self.gt_types.shape, -1, dtype=np.int64)
+        for i, calls in enumerate(self.calls):
+            columns = np.flatnonzero(mask[i])
+            if len(columns) > 0:
+                values[i, columns] = [get_value(calls[j].data) for j in columns]
+        return values
@@ -1,4 +1,7 @@
+import numpy as np
+
 from VCF import VCFHelper, VCFAnnotationType
+from GenotypeBlock import GenotypeBlock
 
 class MutectMultiSampleAnalyzer(object):
 
@@ -46,114 +49,115 @@ class MutectMultiSampleAnalyzer(object):
 
     def analyze(self, record, vcf_summary):
         # Process VCF record and add any necessary information to the VCFSummary
-
-        # Determine whether variant is a spanning deletion (alternate allele will be '*')
-        spanning_deletion = record.alleles[1] == "*"
-
-        # Parse available variant annotations
-        record_info = self.annotation_parser.get_info(record)
-
-        # Get variant information before processing genotypes
-        if record.is_indel or spanning_deletion:
-            # Determine deletion length
-            indel_len = abs(VCFHelper.get_variant_size(record))
-
-        elif record.is_snp:
-            # Determine the type of transition (e.g. A->G, G-T)
-            transition_type = VCFHelper.get_snp_transition_type(record)
-            ts_tv_status = "Ts" if record.is_transition else "Tv"
-
-        variant_class   = VCFHelper.get_variant_class(record_info)
-        is_dbsnp        = VCFHelper.is_dbsnp(record, record_info)
-        variant_effect  = VCFHelper.get_snpeff_impact(record_info)
-        passed_filter   = len(record.FILTER) == 0
-
-        # Process each sample
-        for sample in record.samples:
-
-            sample_name = sample.sample
-
-            # Get sample genotype
-            gt = record.genotype(sample_name)
-            gt_type = gt.gt_type
-
-            if gt_type is None:
-                # Increment missing genotype count
-                vcf_summary.add_count(sample_name, "Missing GT")
-                continue
-
-            # Increment called genotype count regardless of whether it's called a variant
-            vcf_summary.add_count(sample_name, "Called GT")
-
-            if not passed_filter:
-                # Skip variants that didn't pass the filter
-                continue
-
-            if not gt_type > 0:
-                # Skip homo ref genotypes
-                continue
-
-            vcf_summary.add_count(sample_name, "Passed Filter")
-
-            # Report variant depth for somatic variant
-            if hasattr(gt.data, "AD") and gt.data.AD is not None:
-                vcf_summary.add_depth(sample_name, depth=gt.data.AD[1])
-            else:
-                dp = gt.data.F1R2[1] + gt.data.F2R1[1]
-                vcf_summary.add_depth(sample_name, dp)
-
-            # Increment total number of variants for sample
-            vcf_summary.add_count(sample_name, "Variant GT")
-
-            # Report alternate allele frequency for all variants
-            vcf_summary.add_aaf(sample_name, record.aaf[0])
-
-            # Add information for whether variant is hetero or homo alternate allele
-            if gt_type == 1:
-                # Heterozygous
-                vcf_summary.add_count(sample_name, "Heterozygous")
-
-            else:
-                # Homozygous alternate
-                vcf_summary.add_count(sample_name, "Homozygous-Alt")
-
-            # Add information for type of variant
+        self.analyze_block([record], vcf_summary)
+
+    def analyze_block(self, records, vcf_summary):
+        # Process a block of VCF records and add any necessary information to the VCFSummary
+        # Genotypes of the block are summarized with array operations on a (records x samples) matrix of genotype types
+        block = GenotypeBlock(records, vcf_summary)
+        gt_types = block.gt_types
+
+        # Only variants that passed the filter are summarized
+        passed_filter = np.array([len(record.FILTER) == 0 for record in records], dtype=bool)
+        variants = (gt_types > 0) & passed_filter[:, None]
+
+        # Increment missing and called genotype counts, and the total number of hetero and homo alt variants
+        count_ids = vcf_summary.init_count_fields(["Missing GT", "Called GT", "Passed Filter", "Variant GT",
+                                                   "Heterozygous", "Homozygous-Alt"])
+        counts = np.column_stack([(gt_types == GenotypeBlock.MISSING).sum(axis=0),
+                                  (gt_types >= 0).sum(axis=0),
+                                  variants.sum(axis=0),
+                                  variants.sum(axis=0),
+                                  (variants & (gt_types == 1)).sum(axis=0),
+                                  (variants & (gt_types == 2)).sum(axis=0)])
+        vcf_summary.add_count_block(block.rows, count_ids, counts)
+
+        # Report variant depth for somatic variants
+        depths = block.get_format_values(self.get_depth, variants)
+        vcf_summary.add_depth_block(block.rows, depths, variants)
+
+        # Summarize the variant information of records with variant genotypes
+        # Allele frequencies and variant annotations are only computed once per record
+        aafs = np.zeros(len(records))
+        del_lens = np.full(len(records), -1, dtype=np.int64)
+        ins_lens = np.full(len(records), -1, dtype=np.int64)
+        record_count_names = [[] for _ in records]
+        for i in np.flatnonzero(variants.any(axis=1)):
+            record = records[i]
+
+            # Alternate allele frequency
+            aafs[i] = record.aaf[0]
+
+            # Names of counts incremented for every variant genotype of the record
+            record_count_names[i] = self.get_variant_count_names(record)
+
+            # Determine whether variant is a spanning deletion (alternate allele will be '*')
+            spanning_deletion = record.alleles[1] == "*"
+
+            # Determine indel length
             if record.is_indel and record.is_deletion or spanning_deletion:
-                # Record deletion
-                vcf_summary.add_count(sample_name, "Deletions")
-                vcf_summary.add_del(sample_name, del_len=indel_len)
-
+                del_lens[i] = abs(VCFHelper.get_variant_size(record))
             elif record.is_indel:
-                # Record deletion
-                vcf_summary.add_count(sample_name, "Insertions")
-                vcf_summary.add_ins(sample_name, ins_len=indel_len)
+                ins_lens[i] = abs(VCFHelper.get_variant_size(record))
 
-            elif record.is_snp:
-                # Record SNP
-                vcf_summary.add_count(sample_name, "SNPs")
-                vcf_summary.add_count(sample_name, transition_type)
-                vcf_summary.add_count(sample_name, ts_tv_status)
+        # Report alternate allele frequency and indel lengths for all variants
+        vcf_summary.add_aaf_block(block.rows, aafs[:, None], variants)
+        vcf_summary.add_del_block(block.rows, del_lens[:, None], variants & (del_lens >= 0)[:, None])
+        vcf_summary.add_ins_block(block.rows, ins_lens[:, None], variants & (ins_lens >= 0)[:, None])
 
-            elif record.is_monomorphic:
-                # Record monomorphic loci
-                vcf_summary.add_count(sample_name, "Monomorphs")
+        # Increment variant type and annotation counts for all variants
+        vcf_summary.add_record_counts_block(block.rows, record_count_names, variants)
 
-            elif record.is_sv:
-                vcf_summary.add_count(sample_name, "Structural Variants")
+    def get_variant_count_names(self, record):
+        # Return the names of the counts incremented for every variant genotype of a record
 
-            else:
-                # Record unkown variant type
-                vcf_summary.add_count(sample_name, "Unknown Variant Type")
+        # Determine whether variant is a spanning deletion (alternate allele will be '*')
+        spanning_deletion = record.alleles[1] == "*"
 
+        # Parse available variant annotations
+        record_info = dict(zip(self.annotation_parser.get_selected_info_fields(), self.annotation_parser.get_info(record)))
 
-            if is_dbsnp:
-                # Increment if variant annotated as appearing in dbSNP
-                vcf_summary.add_count(sample_name, "dbSNP")
+        # Add information for type of variant
+        if record.is_indel and record.is_deletion or spanning_deletion:
+            count_names = ["Deletions"]
 
-            # Add additional information
-            if variant_class is not None:
-                vcf_summary.add_count(sample_name, variant_class)
+        elif record.is_indel:
+            count_names = ["Insertions"]
 
-            # Add snpeff variant effect info
-            if variant_effect is not None:
-                vcf_summary.add_count(sample_name, "%s_Impact" % variant_effect)
+        elif record.is_snp:
+            # Record SNP along with the type of transition (e.g. A->G, G-T)
+            count_names = ["SNPs", VCFHelper.get_snp_transition_type(record), "Ts" if record.is_transition else "Tv"]
+
+        elif record.is_monomorphic:
+            # Record monomorphic loci
+            count_names = ["Monomorphs"]
+
+        elif record.is_sv:
+            count_names = ["Structural Variants"]
+
+        else:
+            # Record unkown variant type
+            count_names = ["Unknown Variant Type"]
+
+        if VCFHelper.is_dbsnp(record, record_info):
+            # Increment if variant annotated as appearing in dbSNP
+            count_names.append("dbSNP")
+
+        # Add additional information
+        variant_class = VCFHelper.get_variant_class(record_info)
+        if variant_class is not None:
+            count_names.append(variant_class)
+
+        # Add snpeff variant effect info
+        variant_effect = VCFHelper.get_snpeff_impact(record_info)
+        if variant_effect is not None:
+            count_names.append("%s_Impact" % variant_effect)
+
+        return count_names
+
+    @staticmethod
+    def get_depth(data):
+        # Return the alternate allele read depth of a genotype
+        if hasattr(data, "AD") and data.AD is not None:
+            return data.AD[1]
+        return data.F1R2[1] + data.F2R1[1]
@@ -1,3 +1,4 @@
+from GenotypeBlock import GenotypeBlock
 from MultiSampleAnalyzer import MultiSampleAnalyzer
 from MutectMultiSampleAnalyzer import MutectMultiSampleAnalyzer
 from VariantAnalyzerFactory import VariantAnalyzerFactory
\ No newline at end of file
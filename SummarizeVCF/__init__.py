@@ -1,5 +1,8 @@
 from VCFSummarizer import VCFSummarizer
+from ParallelVCFSummarizer import ParallelVCFSummarizer
 from SampleSummary import SampleSummary
+from CountFieldRegistry import CountFieldRegistry
 from VCFSummary import VCFSummary
+from SamplingReport import SamplingReport
 from VCFSummaryParser import VCFSummaryParser
 from VCFSummaryFunctions import merge_two_vcf_summaries
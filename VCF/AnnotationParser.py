@@ -1,12 +1,40 @@
-from collections import OrderedDict
+import logging
 
 from VCFHelper import VCFHelper
 from VCFAnnotationType import VCFAnnotationType
+from FastReader import FastRecord
 
 class AnnotationParser(object):
     # Class for parsing annotation information from VCF files
 
-    def __init__(self, vcf_parser):
+    # Rank of snpeff putative impacts (higher is more severe)
+    SNPEFF_IMPACT_RANKS = {"HIGH": 3, "MODERATE": 2, "LOW": 1, "MODIFIER": 0}
+
+    # Snpeff consequence terms from most to least severe
+    SNPEFF_CONSEQUENCES = ["chromosome_number_variation", "exon_loss_variant", "transcript_ablation",
+                           "bidirectional_gene_fusion", "gene_fusion", "frameshift_variant", "stop_gained",
+                           "stop_lost", "start_lost", "splice_acceptor_variant", "splice_donor_variant",
+                           "rare_amino_acid_variant", "transcript_amplification", "disruptive_inframe_deletion",
+                           "disruptive_inframe_insertion", "conservative_inframe_deletion",
+                           "conservative_inframe_insertion", "inframe_deletion", "inframe_insertion",
+                           "missense_variant", "protein_altering_variant", "initiator_codon_variant",
+                           "5_prime_UTR_premature_start_codon_gain_variant", "splice_region_variant",
+                           "incomplete_terminal_codon_variant", "start_retained_variant", "stop_retained_variant",
+                           "synonymous_variant", "coding_sequence_variant", "mature_miRNA_variant",
+                           "5_prime_UTR_truncation", "3_prime_UTR_truncation", "5_prime_UTR_variant",
+                           "3_prime_UTR_variant", "non_coding_transcript_exon_variant", "non_coding_exon_variant",
+                           "exon_variant", "intron_variant", "NMD_transcript_variant", "non_coding_transcript_variant",
+                           "upstream_gene_variant", "downstream_gene_variant", "TFBS_ablation", "TFBS_amplification",
+                           "TF_binding_site_variant", "regulatory_region_ablation", "regulatory_region_amplification",
+                           "regulatory_region_variant", "feature_elongation", "feature_truncation",
+                           "protein_protein_contact", "structural_interaction_variant", "sequence_feature",
+                           "conserved_intron_variant", "intragenic_variant", "conserved_intergenic_variant",
+                           "intergenic_region", "intergenic_variant"]
+
+    # Rank of each snpeff consequence term (higher is more severe). Unknown terms are ranked below all known terms.
+    SNPEFF_CONSEQUENCE_RANKS = dict([(x, len(SNPEFF_CONSEQUENCES) - i) for i, x in enumerate(SNPEFF_CONSEQUENCES)])
+
+    def __init__(self, vcf_parser, info_fields=None, snpeff_most_severe=False):
 
         # Determine annotation type
         self.annotation_type = self.calc_annotation_type(vcf_parser)
@@ -14,28 +42,130 @@ class AnnotationParser(object):
         # Get list of info fields that should appear in each VCF record in the correct order
         self.info_fields = VCFHelper.get_info_field_names(vcf_parser)
 
+        self.snpeff_info_fields = []
         if self.annotation_type is VCFAnnotationType.SNPEFF:
             self.snpeff_info_fields = VCFHelper.get_snpeff_ann_field_names(vcf_parser)
 
+        # Info fields returned by get_info (in order). Only these fields are decoded for each record.
+        self.selected_info_fields = self.info_fields if info_fields is None else list(info_fields)
+
+        # Precompute where each selected field comes from
+        # Fields unpacked from the snpeff 'ANN' field are looked up by position, all others by INFO key
+        self.__field_sources = []
+        self.__record_info_keys = set()
+        self.__ann_max_split = -1
+        for info_field in self.selected_info_fields:
+            if info_field in self.snpeff_info_fields:
+                ann_index = self.snpeff_info_fields.index(info_field)
+                self.__field_sources.append((True, ann_index))
+                self.__ann_max_split = max(self.__ann_max_split, ann_index + 1)
+            else:
+                self.__field_sources.append((False, info_field))
+                self.__record_info_keys.add(info_field)
+
+        # Whether to use the most severe snpeff annotation of a record instead of the first
+        self.snpeff_most_severe = snpeff_most_severe
+        if self.snpeff_most_severe:
+            self.__check_snpeff_most_severe()
+
+        # Severity of (impact, consequence) pairs already ranked
+        self.__severity_cache = {}
+
     def get_info(self, record):
-        # Return a sorted dictionary of annotations associated with a record
-        # Guaranteed to have value for all entries declared in VCF header
-        # Guaranteed to be in same order as they appear in VCF header
-        if self.annotation_type is VCFAnnotationType.SNPEFF:
-            # Unpack the snpeff 'ANN' annotation field into the record info
-            self.__unpack_snpeff_info(record)
-
-        # Put data in correct order
-        info_data = OrderedDict()
-
-        for info_field in self.info_fields:
-            # Get data if present in current info, set to 'None' otherwise
-            info_data[info_field] = None if info_field not in record.INFO else record.INFO[info_field]
-            # Remove from list if data is list
-            if isinstance(info_data[info_field], list):
-                info_data[info_field] = info_data[info_field][0]
+        # Return a list of annotation values for the selected info fields of a record
+        # Guaranteed to have a value for every selected field ('None' if not present in the record)
+        # Guaranteed to be in the same order as get_selected_info_fields()
+        if isinstance(record, FastRecord):
+            # Only decode the INFO entries that are needed
+            record_info = record.get_info_fields(self.__record_info_keys)
+        else:
+            record_info = record.INFO
+
+        ann_info = None
+        if self.__ann_max_split != -1:
+            # Only split the snpeff annotation as far as the last field needed
+            annotation = self.__get_snpeff_annotation(record)
+            if annotation is not None:
+                ann_info = annotation.split("|", self.__ann_max_split)
+
+        info_data = []
+        for is_ann_field, key in self.__field_sources:
+            if is_ann_field:
+                # Convert empty string to NoneType
+                value = ann_info[key] if ann_info is not None and key < len(ann_info) else None
+                info_data.append(None if value == "" else value)
+            else:
+                # Get data if present in current info, set to 'None' otherwise
+                value = record_info.get(key)
+                # Remove from list if data is list
+                info_data.append(value[0] if isinstance(value, list) else value)
         return info_data
 
+    def __get_snpeff_annotation(self, record):
+        # Return the snpeff annotation (one transcript of the 'ANN' field) used for a record without modifying it
+        # Uses the first annotation unless the most severe annotation was requested
+        if isinstance(record, FastRecord):
+            # Read 'ANN' straight from the INFO column so annotations after the first never have to be split
+            ann = record.get_raw_info_field("ANN")
+            if ann is None:
+                return None
+            if not self.snpeff_most_severe:
+                ann = ann.split(",", 1)[0]
+                return ann if ann != "." else None
+            annotations = ann.split(",")
+        else:
+            annotations = record.INFO.get("ANN")
+            if annotations is None:
+                return None
+            if not self.snpeff_most_severe:
+                return annotations[0]
+
+        return self.__get_most_severe(annotations)
+
+    def __get_most_severe(self, annotations):
+        # Return the annotation with the most severe impact, breaking ties with the most severe consequence
+        # The first annotation is kept when annotations are equally severe
+        most_severe = None
+        most_severe_rank = None
+        for annotation in annotations:
+            if annotation is None or annotation == ".":
+                continue
+            fields = annotation.split("|", self.__severity_max_split)
+            if len(fields) < self.__severity_max_split:
+                continue
+            rank = self.__get_severity(fields[self.__impact_index], fields[self.__consequence_index])
+            if most_severe_rank is None or rank > most_severe_rank:
+                most_severe = annotation
+                most_severe_rank = rank
+        return most_severe
+
+    def __get_severity(self, impact, consequence):
+        # Return a comparable severity rank for an impact and consequence
+        # Consequences joined by '&' are ranked by the most severe term
+        key = (impact, consequence)
+        if key not in self.__severity_cache:
+            impact_rank = AnnotationParser.SNPEFF_IMPACT_RANKS.get(impact, -1)
+            consequence_rank = max([AnnotationParser.SNPEFF_CONSEQUENCE_RANKS.get(x, 0) for x in consequence.split("&")])
+            self.__severity_cache[key] = (impact_rank, consequence_rank)
+        return self.__severity_cache[key]
+
+    def __check_snpeff_most_severe(self):
+        # Check that snpeff annotations can be ranked by severity
+        if self.annotation_type is not VCFAnnotationType.SNPEFF:
+            logging.warning("(AnnotationParser) Most severe annotation requested but VCF isn't annotated by snpeff!")
+            self.snpeff_most_severe = False
+            return
+
+        missing_fields = [x for x in ["Annotation", "Annotation_Impact"] if x not in self.snpeff_info_fields]
+        if len(missing_fields) != 0:
+            logging.error("(AnnotationParser) Unable to rank snpeff annotations! 'ANN' field is missing the following "
+                          "subfields: %s" % ", ".join(missing_fields))
+            raise IOError("Unable to rank snpeff annotations by severity!")
+
+        self.__consequence_index = self.snpeff_info_fields.index("Annotation")
+        self.__impact_index = self.snpeff_info_fields.index("Annotation_Impact")
+        self.__severity_max_split = max(self.__consequence_index, self.__impact_index) + 1
+
     def get_annotation_type(self):
         # Return the annotation type
         return self.annotation_type
@@ -43,14 +173,8 @@ class AnnotationParser(object):
     def get_available_info_fields(self):
         return self.info_fields
 
-    def __unpack_snpeff_info(self, record):
-        # Unpack the snpeff 'ANN' annotation field into the record info
-        ann_info = record.INFO.pop("ANN")[0].split("|")
-        # Convert empty string to NoneType
-        ann_info = [None if x == "" else x for x in ann_info]
-        # Add new annotations to dictionary
-        for i in range(len(self.snpeff_info_fields)):
-            record.INFO[self.snpeff_info_fields[i]] = ann_info[i]
+    def get_selected_info_fields(self):
+        return self.selected_info_fields
 
     @staticmethod
     def calc_annotation_type(vcf_parser):
@@ -0,0 +1,175 @@
+import struct
+import zlib
+
+class BGZFError(IOError):
+    pass
+
+class BGZFReader(object):
+    # Line reader for BGZF (blocked gzip) files with support for random access by virtual file offset
+    # A virtual offset is the compressed offset of a block shifted left 16 bits OR'd with the offset within the
+    # decompressed block, as used by tabix/CSI indices.
+
+    MAGIC = "\x1f\x8b\x08\x04"
+
+    # Number of bytes searched at once when looking for the next block header
+    SEARCH_SIZE = 64*1024
+
+    def __init__(self, path):
+        self.path = path
+        self._fh = open(path, "rb")
+
+        # Compressed offset of the currently loaded block and the block following it
+        self._block_offset = 0
+        self._next_block_offset = 0
+
+        # Decompressed data of current block and read position within it
+        self._buffer = ""
+        self._within = 0
+
+        self.__load_block(0)
+
+    @staticmethod
+    def is_gzip(path):
+        # Return True if a file is gzip compressed (includes BGZF)
+        with open(path, "rb") as fh:
+            return fh.read(2) == "\x1f\x8b"
+
+    @staticmethod
+    def is_bgzf(path):
+        # Return True if a file is BGZF compressed
+        with open(path, "rb") as fh:
+            header = fh.read(18)
+        return len(header) == 18 and header[:4] == BGZFReader.MAGIC and header[12:14] == "BC"
+
+    @staticmethod
+    def get_block_offsets(path):
+        # Return the compressed offsets of all non-empty blocks without decompressing them
+        offsets = []
+        with open(path, "rb") as fh:
+            offset = 0
+            while True:
+                fh.seek(offset)
+                block_size, data_size = BGZFReader.__read_block_sizes(fh)
+                if block_size is None:
+                    break
+                if data_size > 0:
+                    offsets.append(offset)
+                offset += block_size
+        return offsets
+
+    @staticmethod
+    def find_block(fh, offset):
+        # Return the compressed offset of the first block starting at or after a compressed offset of an open file
+        # Blocks are found by searching for a gzip header with a 'BC' extra subfield. Returns None if no block is found.
+        header_size = 14
+        while True:
+            fh.seek(offset)
+            data = fh.read(BGZFReader.SEARCH_SIZE + header_size)
+            i = data.find(BGZFReader.MAGIC)
+            while i != -1 and i + header_size <= len(data):
+                if data[i+12:i+14] == "BC":
+                    return offset + i
+                i = data.find(BGZFReader.MAGIC, i + 1)
+            if len(data) < BGZFReader.SEARCH_SIZE + header_size:
+                return None
+            offset += BGZFReader.SEARCH_SIZE
+
+    @staticmethod
+    def __read_block_sizes(fh):
+        # Read the header of the block at the current position and return the total block size and data size
+        header = fh.read(12)
+        if len(header) == 0:
+            return None, None
+        if len(header) < 12 or header[:4] != BGZFReader.MAGIC:
+            raise BGZFError("Invalid BGZF block header in file!")
+        extra_len = struct.unpack("<H", header[10:12])[0]
+        block_size = BGZFReader.__get_block_size(fh.read(extra_len))
+
+        # Uncompressed size is stored in the last 4 bytes of the block
+        fh.seek(block_size - 12 - extra_len - 4, 1)
+        data_size = struct.unpack("<I", fh.read(4))[0]
+        return block_size, data_size
+
+    @staticmethod
+    def __get_block_size(extra):
+        # Parse total block size from the 'BC' subfield of the gzip extra field
+        i = 0
+        while i + 4 <= len(extra):
+            sub_len = struct.unpack("<H", extra[i+2:i+4])[0]
+            if extra[i:i+2] == "BC" and sub_len == 2:
+                return struct.unpack("<H", extra[i+4:i+6])[0] + 1
+            i += 4 + sub_len
+        raise BGZFError("BGZF block is missing the BC extra subfield!")
+
+    def __load_block(self, offset):
+        # Decompress the block starting at a compressed offset
+        # Blocks are usually read sequentially so only seek when necessary
+        if offset != self._next_block_offset:
+            self._fh.seek(offset)
+
+        header = self._fh.read(12)
+        self._block_offset = offset
+        self._within = 0
+
+        if len(header) == 0:
+            # End of file
+            self._buffer = ""
+            self._next_block_offset = offset
+            return
+
+        if len(header) < 12 or header[:4] != BGZFReader.MAGIC:
+            raise BGZFError("Invalid BGZF block header in %s at offset %d!" % (self.path, offset))
+
+        extra_len = struct.unpack("<H", header[10:12])[0]
+        block_size = self.__get_block_size(self._fh.read(extra_len))
+        data = self._fh.read(block_size - 12 - extra_len)
+        self._buffer = zlib.decompress(data[:-8], -15)
+        self._next_block_offset = offset + block_size
+
+    def tell(self):
+        # Return virtual offset of the next unread byte
+        if self._within == len(self._buffer) and len(self._buffer) > 0:
+            return self._next_block_offset << 16
+        return (self._block_offset << 16) | self._within
+
+    def seek(self, virtual_offset):
+        # Move to a virtual offset
+        block_offset = virtual_offset >> 16
+        within = virtual_offset & 0xFFFF
+        if block_offset != self._block_offset or len(self._buffer) == 0:
+            self.__load_block(block_offset)
+        self._within = within
+
+    def readline(self):
+        # Return the next line including the newline character. Returns an empty string at end of file.
+        pieces = []
+        while True:
+            end = self._buffer.find("\n", self._within)
+            if end != -1:
+                pieces.append(self._buffer[self._within:end+1])
+                self._within = end + 1
+                break
+
+            pieces.append(self._buffer[self._within:])
+            self._within = len(self._buffer)
+
+            # Move to next block, skipping empty blocks
+            while self._within == len(self._buffer):
+                if self._next_block_offset == self._block_offset:
+                    # End of file
+                    return "".join(pieces)
+                self.__load_block(self._next_block_offset)
+
+        return "".join(pieces) if len(pieces) > 1 else pieces[0]
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def close(self):
+        self._fh.close()
@@ -0,0 +1,148 @@
+import struct
+import zlib
+from array import array
+from bisect import bisect_right
+from functools import partial
+from multiprocessing.pool import ThreadPool
+
+class BGZFWriter(object):
+    # Writer for BGZF (blocked gzip) files, which can be read by gzip and indexed by tabix
+    # Written data is buffered and compressed in batches of independent blocks
+    # Blocks can be compressed in a pool of threads as zlib releases the GIL while compressing
+
+    # Maximum uncompressed size of a block. Leaves room for deflate overhead within the 64KB block size limit.
+    MAX_BLOCK_DATA_SIZE = 0xff00
+
+    # Number of blocks compressed at a time by each thread
+    BLOCKS_PER_THREAD = 16
+
+    # Empty block marking the end of a BGZF file
+    EOF_BLOCK = "\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00\x42\x43\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+
+    def __init__(self, path, num_threads=1, compress_level=6, write_eof=True, append=False, index_blocks=False):
+        self.path = path
+
+        # Blocks can be appended to an existing BGZF file without an EOF block
+        self._fh = open(path, "ab" if append else "wb")
+        self._fh.seek(0, 2)
+
+        # Compression level passed to zlib
+        self.compress_level = compress_level
+
+        # Whether to end the file with an EOF block. Files without one can be concatenated into a single BGZF file.
+        self.write_eof = write_eof
+
+        # Data written but not yet compressed
+        self._buffer = []
+        self._buffer_size = 0
+
+        # Uncompressed size of the data compressed at a time
+        self._batch_size = max(num_threads, 1) * self.BLOCKS_PER_THREAD * self.MAX_BLOCK_DATA_SIZE
+
+        # Threads for compressing blocks and the result of the batch currently being compressed
+        self._pool = ThreadPool(num_threads) if num_threads > 1 else None
+        self._pending = None
+        self._pending_sizes = None
+
+        # Optional uncompressed and compressed offsets of each block written, used to convert uncompressed offsets to
+        # virtual offsets (see get_virtual_offset)
+        self.index_blocks = index_blocks
+        self._block_data_offsets = array("L")
+        self._block_offsets = array("L")
+        self._data_offset = 0
+
+    @staticmethod
+    def compress_block(data, compress_level=6):
+        # Return a single BGZF block containing data (at most MAX_BLOCK_DATA_SIZE bytes)
+        compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush()
+
+        # Header with 'BC' extra subfield holding the total block size minus 1
+        header = "\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00\x42\x43\x02\x00" + \
+                 struct.pack("<H", len(compressed) + 25)
+        return header + compressed + struct.pack("<II", zlib.crc32(data) & 0xffffffff, len(data))
+
+    @staticmethod
+    def compress(data, compress_level=6):
+        # Return data compressed as a series of BGZF blocks (without an EOF block)
+        return "".join([BGZFWriter.compress_block(data[i:i+BGZFWriter.MAX_BLOCK_DATA_SIZE], compress_level)
+                        for i in range(0, len(data), BGZFWriter.MAX_BLOCK_DATA_SIZE)])
+
+    def write(self, data):
+        # Buffer data and compress it once a full batch of blocks is available
+        self._buffer.append(data)
+        self._buffer_size += len(data)
+        if self._buffer_size >= self._batch_size:
+            self.__flush_buffer(final=False)
+
+    def __flush_buffer(self, final):
+        # Split buffered data into blocks and compress them
+        # Unless this is the final flush, data that doesn't fill a whole block stays in the buffer
+        data = "".join(self._buffer)
+        num_blocks = len(data) / self.MAX_BLOCK_DATA_SIZE
+        if final and len(data) % self.MAX_BLOCK_DATA_SIZE != 0:
+            num_blocks += 1
+
+        blocks = [data[i*self.MAX_BLOCK_DATA_SIZE:(i+1)*self.MAX_BLOCK_DATA_SIZE] for i in range(num_blocks)]
+        remainder = data[num_blocks*self.MAX_BLOCK_DATA_SIZE:]
+        self._buffer = [remainder] if remainder else []
+        self._buffer_size = len(remainder)
+
+        if self._pool is None:
+            self.__write_blocks([self.compress_block(x, self.compress_level) for x in blocks], [len(x) for x in blocks])
+            return
+
+        # Write the previous batch while the next one is compressed
+        self.__write_pending()
+        self._pending = self._pool.map_async(partial(BGZFWriter.compress_block, compress_level=self.compress_level),
+                                             blocks)
+        self._pending_sizes = [len(x) for x in blocks]
+
+    def __write_pending(self):
+        # Wait for the batch being compressed and write it to the file
+        if self._pending is not None:
+            self.__write_blocks(self._pending.get(), self._pending_sizes)
+            self._pending = None
+            self._pending_sizes = None
+
+    def __write_blocks(self, compressed_blocks, data_sizes):
+        # Write compressed blocks to the file and record their offsets if blocks are indexed
+        if self.index_blocks:
+            offset = self._fh.tell()
+            for compressed_block, data_size in zip(compressed_blocks, data_sizes):
+                self._block_data_offsets.append(self._data_offset)
+                self._block_offsets.append(offset)
+                self._data_offset += data_size
+                offset += len(compressed_block)
+        self._fh.write("".join(compressed_blocks))
+
+    def get_virtual_offset(self, data_offset):
+        # Return the virtual offset of an uncompressed offset in the data written to the file
+        # Requires index_blocks and is only valid once the block containing the offset has been written (e.g. after close)
+        i = bisect_right(self._block_data_offsets, data_offset) - 1
+        if not self.index_blocks or i < 0 or data_offset >= self._data_offset:
+            raise ValueError("Offset %d hasn't been written to an indexed BGZF block!" % data_offset)
+        return (self._block_offsets[i] << 16) | (data_offset - self._block_data_offsets[i])
+
+    def flush(self):
+        # Compress and write all buffered data, ending the current block early if it isn't full
+        self.__flush_buffer(final=True)
+        self.__write_pending()
+        self._fh.flush()
+
+    def tell(self):
+        # Return the compressed size of the data written so far. Only accurate after a flush.
+        return self._fh.tell()
+
+    def close(self):
+        # Compress any remaining data and close the file
+        try:
+            self.__flush_buffer(final=True)
+            self.__write_pending()
+            if self.write_eof:
+                self._fh.write(self.EOF_BLOCK)
+        finally:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+            self._fh.close()
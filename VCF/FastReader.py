@@ -0,0 +1,358 @@
+import vcf
+from collections import Counter
+from vcf.parser import RESERVED_FORMAT
+
+from SampleSelector import SampleSelector
+
+class FastReader(vcf.Reader):
+    # Lightweight drop-in replacement for the PyVCF reader
+    # Header is parsed by PyVCF so INFO/FORMAT declarations are identical, but records are only split into
+    # their fixed columns when read. INFO and per-sample FORMAT fields are decoded the first time they're accessed.
+    # Columns must be tab-delimited as required by the VCF spec.
+    # If a list of samples is given, records only contain the columns of those samples
+
+    def __init__(self, fsock=None, filename=None, compressed=None, samples=None, source=None, **kwargs):
+        super(FastReader, self).__init__(fsock, filename, compressed, **kwargs)
+
+        # File or generator the VCF's lines are read from, which is closed when the reader is closed
+        self.source = source
+
+        # Drop unselected sample columns before records are parsed
+        if samples is not None:
+            selector = SampleSelector(self.samples, samples)
+            self.samples = selector.samples
+            self._sample_indexes = dict([(x, i) for (i, x) in enumerate(self.samples)])
+            self.reader = selector.select(self.reader)
+
+    def close(self):
+        # Close the source of the VCF's lines so a parser that isn't read to the end doesn't leave its file open
+        if self.source is not None:
+            self.source.close()
+
+    def next(self):
+        # Return the next record in the file without decoding INFO or sample columns
+        # FORMAT and sample columns are kept together as a single slice of the line
+        row = next(self.reader).split("\t", 8)
+        return FastRecord(self, row)
+
+    def parse_call(self, record, sample_name, fmt, sample_data):
+        # Create a call for a single sample column. FORMAT fields are decoded when they're accessed.
+        if fmt not in self._format_cache:
+            self._format_cache[fmt] = self.__make_call_data_type(fmt)
+        return FastCall(record, sample_name, self._format_cache[fmt](sample_data.split(":")))
+
+    def __make_call_data_type(self, fmt):
+        # Create a class for holding the FORMAT fields of a sample
+        # Fields are decoded using the type declared in the VCF header the first time they're accessed
+        fields = fmt.split(":")
+        decoders = {}
+        for i, field in enumerate(fields):
+            if field == "GT":
+                # GT is never decoded, just like in PyVCF
+                decoders[field] = (i, None)
+                continue
+            try:
+                entry_type = self.formats[field].type
+                entry_num = self.formats[field].num
+            except KeyError:
+                entry_num = None
+                entry_type = RESERVED_FORMAT.get(field, "String")
+            decoders[field] = (i, self.__make_field_decoder(entry_type, entry_num))
+
+        class CallData(object):
+            _fields = tuple(fields)
+
+            def __init__(self, values):
+                self._values = values
+
+            def __getattr__(self, name):
+                # Only called for fields that haven't been decoded yet
+                try:
+                    index, decode = decoders[name]
+                except KeyError:
+                    raise AttributeError(name)
+                if index >= len(self._values):
+                    value = None
+                else:
+                    value = self._values[index] if decode is None else decode(self._values[index])
+                self.__dict__[name] = value
+                return value
+
+            def __repr__(self):
+                return "CallData(%s)" % ", ".join(["%s=%s" % (x, getattr(self, x)) for x in self._fields])
+
+        return CallData
+
+    def __make_field_decoder(self, entry_type, entry_num):
+        # Return a function that decodes a single FORMAT value
+        # Type conversions mirror PyVCF's sample parsing so values are identical
+        _map = self._map
+
+        def decode(vals):
+            if not vals or vals == ".":
+                return None
+
+            # Single entries don't need to be split
+            if entry_num == 1 or ',' not in vals:
+                if entry_type == 'Integer':
+                    try:
+                        return int(vals)
+                    except ValueError:
+                        return float(vals)
+                elif entry_type == 'Float':
+                    return float(vals)
+                return vals
+
+            vals = vals.split(',')
+            if entry_type == 'Integer':
+                try:
+                    return _map(int, vals)
+                except ValueError:
+                    return _map(float, vals)
+            elif entry_type == 'Float' or entry_type == 'Numeric':
+                return _map(float, vals)
+            return vals
+
+        return decode
+
+
+class FastCall(object):
+    # Genotype call for a single sample with the same attributes as PyVCF's _Call
+
+    __slots__ = ["site", "sample", "data", "gt_nums", "gt_alleles", "called", "ploidity", "gt_type"]
+
+    def __init__(self, site, sample, data):
+        self.site = site
+        self.sample = sample
+        self.data = data
+
+        gt = data.GT if "GT" in data._fields else None
+        if gt is None:
+            # A call without a genotype is not defined as called or not
+            self.gt_alleles = None
+            self.ploidity = None
+            self.called = None
+            self.gt_nums = None
+            self.gt_type = None
+            return
+
+        alleles = gt.replace("|", "/").split("/")
+        self.ploidity = len(alleles)
+        self.called = "." not in alleles
+        if self.called:
+            self.gt_alleles = alleles
+            self.gt_nums = gt
+            if alleles.count(alleles[0]) == len(alleles):
+                self.gt_type = 0 if alleles[0] == "0" else 2
+            else:
+                self.gt_type = 1
+        else:
+            self.gt_alleles = [(al if al != '.' else None) for al in alleles]
+            self.gt_nums = None
+            self.gt_type = None
+
+    def __repr__(self):
+        return "Call(sample=%s, %s)" % (self.sample, self.data)
+
+    def __getitem__(self, key):
+        return getattr(self.data, key)
+
+    @property
+    def phased(self):
+        return self.gt_nums is not None and self.gt_nums.find("|") >= 0
+
+    @property
+    def is_variant(self):
+        if not self.called:
+            return None
+        return self.gt_type != 0
+
+    @property
+    def is_het(self):
+        if not self.called:
+            return None
+        return self.gt_type == 1
+
+
+class FastRecord(object):
+    # Compact VCF record exposing the subset of the PyVCF _Record interface used by Pipeline-Tools
+
+    __slots__ = ["CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "FORMAT", "raw_genotype_columns",
+                 "_reader", "_info_string", "_info", "_sample_strings", "_calls", "_aaf"]
+
+    def __init__(self, reader, row):
+        self._reader = reader
+
+        # Fixed columns
+        self.CHROM  = row[0]
+        self.POS    = int(row[1])
+        self.ID     = row[2] if row[2] != "." else None
+        self.REF    = row[3]
+        self.ALT    = reader._map(reader._parse_alt, row[4].split(','))
+
+        try:
+            self.QUAL = int(row[5])
+        except ValueError:
+            try:
+                self.QUAL = float(row[5])
+            except ValueError:
+                self.QUAL = None
+
+        filt = row[6]
+        if filt == ".":
+            self.FILTER = None
+        elif filt == "PASS":
+            self.FILTER = []
+        else:
+            self.FILTER = filt.split(';')
+
+        # INFO is decoded on first access
+        self._info_string = row[7]
+        self._info = None
+
+        # FORMAT and sample columns are left as a single string until a genotype is requested
+        self.raw_genotype_columns = row[8] if len(row) > 8 else None
+        self.FORMAT = None
+        if self.raw_genotype_columns is not None:
+            self.FORMAT = self.raw_genotype_columns.split("\t", 1)[0]
+            if self.FORMAT == ".":
+                self.FORMAT = None
+        self._sample_strings = None
+        self._calls = None
+        self._aaf = None
+
+    @property
+    def INFO(self):
+        if self._info is None:
+            self._info = self._reader._parse_info(self._info_string)
+        return self._info
+
+    def get_info_fields(self, fields):
+        # Return a dictionary of decoded values for a subset of INFO fields
+        # Only entries of the INFO column belonging to the requested fields are decoded
+        if self._info is not None:
+            return self._info
+        entries = [x for x in self._info_string.split(";") if x.partition("=")[0] in fields]
+        if len(entries) == 0:
+            return {}
+        return self._reader._parse_info(";".join(entries))
+
+    def get_raw_info_field(self, field):
+        # Return the undecoded value of an INFO field. Returns None if the field isn't present in the record.
+        prefix = field + "="
+        if self._info_string.startswith(prefix):
+            start = len(prefix)
+        else:
+            start = self._info_string.find(";" + prefix)
+            if start == -1:
+                return None
+            start += len(prefix) + 1
+        end = self._info_string.find(";", start)
+        return self._info_string[start:] if end == -1 else self._info_string[start:end]
+
+    @property
+    def alleles(self):
+        return [self.REF] + self.ALT
+
+    @property
+    def start(self):
+        return self.POS - 1
+
+    @property
+    def end(self):
+        return self.POS - 1 + len(self.REF)
+
+    def genotype(self, name):
+        # Return a _Call for a sample, decoding its FORMAT fields if they haven't been already
+        return self.__get_call(self._reader._sample_indexes[name])
+
+    @property
+    def samples(self):
+        # Return calls for every sample in the order they appear in the VCF
+        if self.FORMAT is None:
+            return []
+        return [self.__get_call(i) for i in range(len(self._reader.samples))]
+
+    def __get_call(self, index):
+        if self._calls is None:
+            # First column is FORMAT
+            self._sample_strings = self.raw_genotype_columns.split("\t")
+            self._calls = [None] * (len(self._sample_strings) - 1)
+        call = self._calls[index]
+        if call is None:
+            call = self._reader.parse_call(self, self._reader.samples[index], self.FORMAT, self._sample_strings[index+1])
+            self._calls[index] = call
+        return call
+
+    def __iter__(self):
+        return iter(self.samples)
+
+    def __str__(self):
+        return "Record(CHROM=%s, POS=%s, REF=%s, ALT=%s)" % (self.CHROM, self.POS, self.REF, self.ALT)
+
+    @property
+    def num_called(self):
+        return sum(s.called for s in self.samples)
+
+    @property
+    def aaf(self):
+        # Alternate allele frequencies computed over called genotypes
+        # Computed once and cached as analyzers request it for every variant sample
+        if self._aaf is None:
+            num_chroms = 0.0
+            allele_counts = Counter()
+            for s in self.samples:
+                if s.gt_type is not None:
+                    allele_counts.update(s.gt_alleles)
+                    num_chroms += len(s.gt_alleles)
+            self._aaf = [allele_counts[str(i)]/num_chroms for i in range(1, len(self.ALT)+1)]
+        return self._aaf
+
+    @property
+    def is_snp(self):
+        if len(self.REF) > 1:
+            return False
+        for alt in self.ALT:
+            if alt is None or alt.type != "SNV":
+                return False
+            if alt not in ['A', 'C', 'G', 'T', 'N', '*']:
+                return False
+        return True
+
+    @property
+    def is_indel(self):
+        is_sv = self.is_sv
+        if len(self.REF) > 1 and not is_sv:
+            return True
+        for alt in self.ALT:
+            if alt is None:
+                return True
+            if alt.type != "SNV" and alt.type != "MNV":
+                return False
+            elif len(alt) != len(self.REF):
+                return not is_sv
+        return False
+
+    @property
+    def is_sv(self):
+        # Avoid decoding INFO when SVTYPE can't possibly be present
+        if "SVTYPE" not in self._info_string:
+            return False
+        return self.INFO.get('SVTYPE') is not None
+
+    @property
+    def is_transition(self):
+        if len(self.ALT) > 1 or not self.is_snp:
+            return False
+        return "%s%s" % (self.REF, self.ALT[0]) in ("AG", "GA", "CT", "TC")
+
+    @property
+    def is_deletion(self):
+        if len(self.ALT) > 1 or not self.is_indel:
+            return False
+        alt_allele = self.ALT[0]
+        return alt_allele is None or len(self.REF) > len(alt_allele)
+
+    @property
+    def is_monomorphic(self):
+        return len(self.ALT) == 1 and self.ALT[0] is None
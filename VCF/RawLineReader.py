@@ -0,0 +1,47 @@
+import vcf
+
+from SampleSelector import SampleSelector
+
+class RawLineReader(vcf.Reader):
+    # PyVCF reader that attaches the raw FORMAT and sample columns of each record's line to the record
+    # Allows callers to copy genotype columns through to output without reading the VCF a second time
+    # If a list of samples is given, records only contain the columns of those samples
+
+    def __init__(self, fsock=None, filename=None, compressed=None, samples=None, source=None, **kwargs):
+        super(RawLineReader, self).__init__(fsock, filename, compressed, **kwargs)
+
+        # File or generator the VCF's lines are read from, which is closed when the reader is closed
+        self.source = source
+
+        # Drop unselected sample columns before records are parsed
+        if samples is not None:
+            selector = SampleSelector(self.samples, samples)
+            self.samples = selector.samples
+            self._sample_indexes = dict([(x, i) for (i, x) in enumerate(self.samples)])
+            self.reader = selector.select(self.reader)
+
+        # Raw text of the line the most recent record was parsed from
+        self.line = None
+        self.reader = self.__track_lines(self.reader)
+
+    def __track_lines(self, lines):
+        for line in lines:
+            self.line = line
+            yield line
+
+    def close(self):
+        # Close the source of the VCF's lines so a parser that isn't read to the end doesn't leave its file open
+        if self.source is not None:
+            self.source.close()
+
+    def next(self):
+        record = super(RawLineReader, self).next()
+
+        # Slice line after the 8th tab (start of the FORMAT column)
+        offset = -1
+        for i in range(8):
+            offset = self.line.find("\t", offset + 1)
+            if offset == -1:
+                break
+        record.raw_genotype_columns = self.line[offset+1:] if offset != -1 else None
+        return record
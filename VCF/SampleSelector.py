@@ -0,0 +1,51 @@
+import logging
+
+class SampleSelector(object):
+    # Restrict the sample columns of VCF records to a subset of samples
+    # Selected columns are located by index so the columns of other samples are never split or decoded.
+    # Each record line is rewritten to contain only the fixed columns, FORMAT, and the selected sample columns,
+    # so readers parse it as if the VCF only contained the selected samples.
+
+    # Number of columns before the first sample column (fixed columns + FORMAT)
+    NUM_FIXED_COLUMNS = 9
+
+    def __init__(self, vcf_samples, samples):
+
+        # Check that every selected sample appears in the VCF exactly once
+        missing_samples = [x for x in samples if x not in vcf_samples]
+        if len(missing_samples) != 0:
+            logging.error("(SampleSelector) The following samples were selected but don't appear in the VCF:\n%s" %
+                          missing_samples)
+            raise IOError("One or more selected samples don't appear in the VCF!")
+
+        duplicate_samples = sorted(set([x for x in samples if samples.count(x) > 1]))
+        if len(duplicate_samples) != 0:
+            logging.error("(SampleSelector) The following samples were selected more than once:\n%s" % duplicate_samples)
+            raise IOError("One or more samples were selected more than once!")
+
+        # Names of selected samples in output order
+        self.samples = list(samples)
+
+        # Indices of the selected sample columns within a record line
+        self.columns = [vcf_samples.index(x) + self.NUM_FIXED_COLUMNS for x in self.samples]
+
+        # Lines only need to be split up to the last selected column
+        self.max_split = max(self.columns) + 1 if len(self.columns) > 0 else self.NUM_FIXED_COLUMNS
+
+    def select(self, lines):
+        # Generate record lines containing only the selected sample columns
+        columns = self.columns
+        max_split = self.max_split
+        for line in lines:
+            cols = line.split("\t", max_split)
+            if len(cols) <= self.NUM_FIXED_COLUMNS:
+                # Records without sample columns are passed through as is
+                yield line
+                continue
+
+            if len(cols) < max_split:
+                logging.error("(SampleSelector) Record doesn't contain a column for every selected sample:\n%s" %
+                              "\t".join(cols[:self.NUM_FIXED_COLUMNS-1]))
+                raise IOError("VCF Record contains different number of columns than header!")
+
+            yield "\t".join(cols[:self.NUM_FIXED_COLUMNS] + [cols[i] for i in columns])
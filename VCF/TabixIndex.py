@@ -0,0 +1,176 @@
+import os
+import struct
+
+from BGZFReader import BGZFReader
+
+class TabixIndexError(IOError):
+    pass
+
+class TabixIndex(object):
+    # Reader for tabix (.tbi) and coordinate-sorted index (.csi) files of BGZF compressed VCFs
+    # Returns the virtual file offset ranges that may contain records overlapping a region
+
+    def __init__(self, index_file):
+        self.index_file = index_file
+
+        # Sequence names in the order they appear in the index
+        self.names = []
+
+        # Per-sequence bin -> list of (begin, end) virtual offset chunks
+        self.bins = []
+
+        # Per-sequence minimum virtual offset of records overlapping a genomic window
+        # For tabix this is the linear index, for CSI the offsets are stored with each bin
+        self.linear_index = []
+        self.bin_loffsets = []
+
+        # Binning scheme parameters
+        self.min_shift = 14
+        self.depth = 5
+
+        data = self.__read_index_data(index_file)
+        if data[:4] == "TBI\1":
+            self.__parse_tbi(data)
+        elif data[:4] == "CSI\1":
+            self.__parse_csi(data)
+        else:
+            raise TabixIndexError("Unrecognized index format: %s" % index_file)
+
+        self.name_to_id = dict([(name, i) for i, name in enumerate(self.names)])
+
+    @staticmethod
+    def find_index(vcf_file):
+        # Return path to the tabix or CSI index of a VCF file. Returns None if neither exist.
+        for ext in [".tbi", ".csi"]:
+            if os.path.exists(vcf_file + ext):
+                return vcf_file + ext
+        return None
+
+    @staticmethod
+    def __read_index_data(index_file):
+        # Index files are BGZF compressed
+        reader = BGZFReader(index_file)
+        data = []
+        chunk = reader.readline()
+        while chunk:
+            data.append(chunk)
+            chunk = reader.readline()
+        reader.close()
+        return "".join(data)
+
+    def __parse_names(self, data, offset):
+        # Parse tabix header (format, column indices, meta char, skip) and sequence names
+        l_nm = struct.unpack_from("<i", data, offset + 24)[0]
+        names = data[offset+28:offset+28+l_nm]
+        self.names = [x for x in names.split("\0") if x != ""]
+        return offset + 28 + l_nm
+
+    def __parse_tbi(self, data):
+        n_ref = struct.unpack_from("<i", data, 4)[0]
+        offset = self.__parse_names(data, 8)
+        for i in range(n_ref):
+            bins = {}
+            n_bin = struct.unpack_from("<i", data, offset)[0]
+            offset += 4
+            for j in range(n_bin):
+                bin_id, n_chunk = struct.unpack_from("<Ii", data, offset)
+                offset += 8
+                chunks = struct.unpack_from("<%dQ" % (2 * n_chunk), data, offset)
+                offset += 16 * n_chunk
+                bins[bin_id] = zip(chunks[0::2], chunks[1::2])
+            n_intv = struct.unpack_from("<i", data, offset)[0]
+            offset += 4
+            self.linear_index.append(struct.unpack_from("<%dQ" % n_intv, data, offset))
+            offset += 8 * n_intv
+            self.bins.append(bins)
+            self.bin_loffsets.append(None)
+
+    def __parse_csi(self, data):
+        self.min_shift, self.depth, l_aux = struct.unpack_from("<iii", data, 4)
+        offset = 16
+        if l_aux >= 28:
+            self.__parse_names(data, offset)
+        offset += l_aux
+        n_ref = struct.unpack_from("<i", data, offset)[0]
+        offset += 4
+        for i in range(n_ref):
+            bins = {}
+            loffsets = {}
+            n_bin = struct.unpack_from("<i", data, offset)[0]
+            offset += 4
+            for j in range(n_bin):
+                bin_id, loffset, n_chunk = struct.unpack_from("<IQi", data, offset)
+                offset += 16
+                chunks = struct.unpack_from("<%dQ" % (2 * n_chunk), data, offset)
+                offset += 16 * n_chunk
+                bins[bin_id] = zip(chunks[0::2], chunks[1::2])
+                loffsets[bin_id] = loffset
+            self.bins.append(bins)
+            self.bin_loffsets.append(loffsets)
+            self.linear_index.append(None)
+
+    def __reg2bins(self, beg, end):
+        # Return ids of all bins that may overlap a 0-based, half-open interval
+        bins = []
+        end -= 1
+        level = 0
+        t = 0
+        s = self.min_shift + self.depth * 3
+        while level <= self.depth:
+            b = t + (beg >> s)
+            e = t + (end >> s)
+            bins.extend(range(b, e + 1))
+            s -= 3
+            t += 1 << (level * 3)
+            level += 1
+        return bins
+
+    def __get_min_offset(self, ref_id, beg):
+        # Return smallest virtual offset a record overlapping position 'beg' can start at
+        if self.linear_index[ref_id] is not None:
+            linear_index = self.linear_index[ref_id]
+            window = beg >> 14
+            if len(linear_index) == 0:
+                return 0
+            return linear_index[min(window, len(linear_index) - 1)]
+
+        # CSI: use loffset of the first existing bin at or to the left of beg, moving up levels as needed
+        loffsets = self.bin_loffsets[ref_id]
+        bin_id = ((1 << (self.depth * 3)) - 1) // 7 + (beg >> self.min_shift)
+        while bin_id > 0 and bin_id not in loffsets:
+            first = (((bin_id - 1) >> 3) << 3) + 1
+            if bin_id > first:
+                bin_id -= 1
+            else:
+                bin_id = (bin_id - 1) >> 3
+        return loffsets.get(bin_id, 0)
+
+    def query(self, chrom, beg, end):
+        # Return sorted, merged (begin, end) virtual offset chunks that may contain records overlapping a
+        # 0-based, half-open interval on a sequence. Returns an empty list if the sequence isn't indexed.
+        if chrom not in self.name_to_id:
+            return []
+        ref_id = self.name_to_id[chrom]
+        bins = self.bins[ref_id]
+
+        # Clamp interval to the maximum coordinate supported by the binning scheme
+        max_pos = 1 << (self.min_shift + self.depth * 3)
+        beg = min(beg, max_pos - 1)
+        end = min(end, max_pos)
+        min_offset = self.__get_min_offset(ref_id, beg)
+
+        chunks = []
+        for bin_id in self.__reg2bins(beg, end):
+            for chunk_beg, chunk_end in bins.get(bin_id, []):
+                if chunk_end > min_offset:
+                    chunks.append((chunk_beg, chunk_end))
+
+        # Merge overlapping chunks
+        chunks.sort()
+        merged = []
+        for chunk_beg, chunk_end in chunks:
+            if len(merged) > 0 and chunk_beg <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], chunk_end))
+            else:
+                merged.append((chunk_beg, chunk_end))
+        return merged
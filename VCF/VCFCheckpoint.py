@@ -0,0 +1,141 @@
+import cPickle
+import logging
+import os
+
+from VCFHelper import VCFHelper
+from BGZFReader import BGZFReader
+
+class VCFCheckpoint(object):
+    # Progress of a single pass over a VCF file that is saved periodically so an interrupted run can be resumed
+    # A checkpoint records the offset of the next unread record in the VCF, the number of records processed,
+    # the size of the output written so far, and any other state needed to resume (e.g. a pickled VCFSummary).
+    # Offsets are byte offsets for plain text files, uncompressed offsets for gzip files, and virtual offsets for BGZF.
+
+    # Default number of records processed between checkpoints
+    DEFAULT_INTERVAL = 100000
+
+    def __init__(self, checkpoint_file, vcf_file, interval=DEFAULT_INTERVAL, resume=False):
+
+        if vcf_file == "-":
+            logging.error("(VCFCheckpoint) VCF read from stdin can't be resumed from a checkpoint!")
+            raise IOError("Checkpoints require a VCF file!")
+
+        # Path to checkpoint file
+        self.checkpoint_file = checkpoint_file
+
+        # Path to VCF file being processed
+        self.vcf_file = vcf_file
+
+        # Minimum number of records processed between checkpoints
+        self.interval = interval
+
+        # State saved by the checkpoint being resumed. None if starting from the first record.
+        self.state = None
+        if resume:
+            if os.path.exists(self.checkpoint_file):
+                self.state = self.__load()
+                logging.info("(VCFCheckpoint) Resuming after %d records from checkpoint: %s" %
+                             (self.state["records_processed"], self.checkpoint_file))
+            else:
+                logging.warning("(VCFCheckpoint) Checkpoint file doesn't exist! Starting from the first record: %s" %
+                                self.checkpoint_file)
+
+        # Offset of the next unread record in the VCF
+        self.offset = None
+
+        # Number of records processed when the last checkpoint was saved
+        self.last_saved = self.get_records_processed()
+
+    def is_resumed(self):
+        # Return True if the run is resumed from a saved checkpoint
+        return self.state is not None
+
+    def get_records_processed(self):
+        # Return the number of records processed before the checkpoint being resumed
+        return self.state["records_processed"] if self.state is not None else 0
+
+    def get_output_size(self):
+        # Return the size of the output written before the checkpoint being resumed
+        return self.state["output_size"] if self.state is not None else None
+
+    def get_data(self, key):
+        # Return additional state saved with the checkpoint being resumed
+        return self.state["data"].get(key) if self.state is not None else None
+
+    def read_vcf(self):
+        # Generate the VCF header lines followed by the record lines after the checkpoint being resumed
+        # Tracks the offset of the next unread record as lines are read
+        vcf_fh = VCFHelper.open_vcf(self.vcf_file)
+        is_bgzf = isinstance(vcf_fh, BGZFReader)
+        pos = 0
+        try:
+            for line in iter(vcf_fh.readline, ""):
+                pos += len(line)
+                yield line
+                if line.startswith("#CHROM"):
+                    break
+
+            if self.state is not None:
+                pos = self.state["offset"]
+                vcf_fh.seek(pos)
+
+            # Offset is updated before each line is yielded, so between records it's the offset of the next record
+            for line in iter(vcf_fh.readline, ""):
+                if is_bgzf:
+                    self.offset = vcf_fh.tell()
+                else:
+                    pos += len(line)
+                    self.offset = pos
+                yield line
+        finally:
+            vcf_fh.close()
+
+    def is_due(self, records_processed):
+        # Return True if enough records have been processed since the last checkpoint
+        return records_processed - self.last_saved >= self.interval
+
+    def save(self, records_processed, output_size=None, **data):
+        # Save a checkpoint after a number of records have been processed
+        # Output must be flushed before output_size is measured
+        if self.offset is None:
+            # No records have been read from the VCF
+            return
+
+        state = {"vcf_file"             : os.path.abspath(self.vcf_file),
+                 "vcf_size"             : os.path.getsize(self.vcf_file),
+                 "offset"               : self.offset,
+                 "records_processed"    : records_processed,
+                 "output_size"          : output_size,
+                 "data"                 : data}
+
+        # Write to a temporary file first so an interruption never leaves a partially written checkpoint
+        tmp_file = "%s.tmp" % self.checkpoint_file
+        with open(tmp_file, "wb") as fh:
+            cPickle.dump(state, fh, cPickle.HIGHEST_PROTOCOL)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.rename(tmp_file, self.checkpoint_file)
+
+        self.last_saved = records_processed
+        logging.debug("(VCFCheckpoint) Saved checkpoint after %d records" % records_processed)
+
+    def remove(self):
+        # Delete the checkpoint file once a run has finished
+        if os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+
+    def __load(self):
+        # Load a saved checkpoint and check that it belongs to the VCF being processed
+        try:
+            with open(self.checkpoint_file, "rb") as fh:
+                state = cPickle.load(fh)
+        except (cPickle.UnpicklingError, EOFError, AttributeError, ImportError, IndexError, ValueError):
+            logging.error("(VCFCheckpoint) Unable to read checkpoint file: %s" % self.checkpoint_file)
+            raise IOError("Invalid checkpoint file!")
+
+        if state["vcf_file"] != os.path.abspath(self.vcf_file) or state["vcf_size"] != os.path.getsize(self.vcf_file):
+            logging.error("(VCFCheckpoint) Checkpoint was saved for a different VCF file!\n"
+                          "Checkpoint VCF: %s\n"
+                          "Current VCF: %s" % (state["vcf_file"], os.path.abspath(self.vcf_file)))
+            raise IOError("Checkpoint doesn't match VCF file!")
+        return state
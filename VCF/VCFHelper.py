@@ -1,8 +1,19 @@
+import gzip
+import itertools
 import logging
+import os
+import re
+import sys
 import vcf
+import zlib
+from cStringIO import StringIO
 from collections import OrderedDict
 
 from VCFAnnotationType import VCFAnnotationType
+from FastReader import FastReader
+from RawLineReader import RawLineReader
+from BGZFReader import BGZFReader
+from TabixIndex import TabixIndex
 
 class VCFHelper:
     # Collection of static functions relating to VCF files
@@ -10,80 +21,456 @@ class VCFHelper:
     # Canoncial columns in the order they're supposed to appear in a VCF
     HEADER_FIELDS = ["CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO", "FORMAT"]
 
+    # Largest position a region can end at when no end coordinate is given
+    MAX_REGION_POS = 1 << 31
+
+    # Size of reads from stdin
+    STREAM_CHUNK_SIZE = 1024*1024
+
+    @staticmethod
+    def open_vcf(path):
+        # Open a plain text, gzip, or BGZF compressed VCF file for reading lines
+        # A path of '-' reads from stdin
+        if path == "-":
+            return VCFHelper.__read_stdin()
+        elif BGZFReader.is_bgzf(path):
+            return BGZFReader(path)
+        elif BGZFReader.is_gzip(path):
+            return gzip.open(path, "r")
+        return open(path, "r")
+
+    @staticmethod
+    def __read_stdin():
+        # Generate lines from stdin, which may be plain text or gzip/BGZF compressed
+        # Compression is detected from the first chunk as stdin can't be rewound
+        data = sys.stdin.read(VCFHelper.STREAM_CHUNK_SIZE)
+        if data[:2] == "\x1f\x8b":
+            for line in VCFHelper.__read_gzip_stream(sys.stdin, data):
+                yield line
+            return
+
+        # Complete the last line of the first chunk and read remaining lines directly from stdin
+        for line in StringIO(data + sys.stdin.readline()):
+            yield line
+        for line in sys.stdin:
+            yield line
+
+    @staticmethod
+    def __read_gzip_stream(fh, data):
+        # Generate lines from a gzip compressed stream that can't be seeked, starting with an already read chunk
+        # Files can contain multiple gzip members (e.g. every block of a BGZF file)
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        remainder = ""
+        while data:
+            text = decompressor.decompress(data)
+
+            # Start a new decompressor whenever a member ends within the chunk
+            while decompressor.unused_data:
+                data = decompressor.unused_data
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                text += decompressor.decompress(data)
+
+            lines = (remainder + text).split("\n")
+            remainder = lines.pop()
+            for line in lines:
+                yield line + "\n"
+            data = fh.read(VCFHelper.STREAM_CHUNK_SIZE)
+
+        if remainder:
+            yield remainder
+
     @staticmethod
     def is_valid_vcf(path):
+        # Check to make sure VCF file is valid format
+        vcf_fh = VCFHelper.open_vcf(path)
+        try:
+            VCFHelper.validate_vcf(vcf_fh, path)
+            return True
+        except IOError:
+            return False
+        finally:
+            vcf_fh.close()
+
+    @staticmethod
+    def validate_vcf(vcf_lines, path):
+        # Validate the header and first record of a VCF as its lines are read
+        # Returns an iterator over every line of the VCF so validation doesn't need a separate pass over the file
+        # Raises an IOError if the VCF is invalid
 
         num_samples = 0
 
-        # Check to make sure VCF file is valid format
-        with open(path, "r") as vcf_fh:
+        # Lines consumed during validation
+        lines_read = []
+        vcf_lines = iter(vcf_lines)
 
-            # Boolean state variable determining which checks have been performed
-            state = "FormatDeclaration"
+        # Boolean state variable determining which checks have been performed
+        state = "FormatDeclaration"
 
-            for line in vcf_fh:
+        for line in vcf_lines:
+
+            lines_read.append(line)
 
-                if state == "FormatDeclaration":
+            if state == "FormatDeclaration":
 
-                    # Check to make sure the first line says ##fileformat=VCFv4.X
-                    if not line.startswith("##fileformat=VCF"):
-                        logging.error("Invalid VCF file format! First line of file doesn't look like '##fileformat=VCF'")
-                        return False
-                    state = "MetadataHeader"
+                # Check to make sure the first line says ##fileformat=VCFv4.X
+                if not line.startswith("##fileformat=VCF"):
+                    logging.error("Invalid VCF file format! First line of file doesn't look like '##fileformat=VCF'")
+                    raise IOError("Invalid VCF file!")
+                state = "MetadataHeader"
 
-                elif state == "MetadataHeader":
+            elif state == "MetadataHeader":
 
-                    # Check format of metadata header section
-                    if line.startswith("#CHROM"):
-                        # Check to see that required fields are present in header line
-                        line = line.lstrip("#")
-                        line = line.split()
+                # Check format of metadata header section
+                if line.startswith("#CHROM"):
+                    # Check to see that required fields are present in header line
+                    line = line.lstrip("#")
+                    line = line.split()
 
-                        # Get the number of samples in the VCF
-                        num_samples = len(line) - len(VCFHelper.HEADER_FIELDS)
+                    # Get the number of samples in the VCF
+                    num_samples = len(line) - len(VCFHelper.HEADER_FIELDS)
 
-                        expected_header_string  = "".join(VCFHelper.HEADER_FIELDS)
-                        actual_header_string    = "".join(line[0:len(VCFHelper.HEADER_FIELDS)])
+                    expected_header_string  = "".join(VCFHelper.HEADER_FIELDS)
+                    actual_header_string    = "".join(line[0:len(VCFHelper.HEADER_FIELDS)])
 
-                        # Check to make sure the header fields are present in the correct order
-                        if actual_header_string != expected_header_string:
-                            logging.error("Invalid VCF file format! Invalid static column lables.\n"
-                                          "Expected: %s\n"
-                                          "Received: %s" % (expected_header_string, actual_header_string))
-                            return False
+                    # Check to make sure the header fields are present in the correct order
+                    if actual_header_string != expected_header_string:
+                        logging.error("Invalid VCF file format! Invalid static column lables.\n"
+                                      "Expected: %s\n"
+                                      "Received: %s" % (expected_header_string, actual_header_string))
+                        raise IOError("Invalid VCF file!")
 
-                        # Update current state
-                        state = "FirstRecord"
+                    # Update current state
+                    state = "FirstRecord"
 
-                    elif not line.startswith("##"):
-                        # Return false if header line doesn't start with '##'
-                        logging.error("Invalid VCF file format! Metadata header lines must begin with '##'!")
-                        return False
+                elif not line.startswith("##"):
+                    # Raise error if header line doesn't start with '##'
+                    logging.error("Invalid VCF file format! Metadata header lines must begin with '##'!")
+                    raise IOError("Invalid VCF file!")
 
-                elif state == "FirstRecord":
+            elif state == "FirstRecord":
 
-                    # Validate first record
-                    line = line.split()
+                # Validate first record
+                line = line.split()
 
-                    # Check if the VCF is empty
-                    if len(line) == 0:
-                        logging.warning("VCF is valid, but it's empty!")
-                        return True
+                # Check if the VCF is empty
+                if len(line) == 0:
+                    logging.warning("VCF is valid, but it's empty!")
+                    break
 
-                    # Check if the number of columns is as expected
-                    if len(line) != num_samples + len(VCFHelper.HEADER_FIELDS):
-                        logging.error("Invalid VCF file format! First record did not contain the correct number of columns!")
-                        return False
+                # Check if the number of columns is as expected
+                if len(line) != num_samples + len(VCFHelper.HEADER_FIELDS):
+                    logging.error("Invalid VCF file format! First record did not contain the correct number of columns!")
+                    raise IOError("Invalid VCF file!")
 
-                    # Return True as VCF has been validated to the point that I give a shit about
-                    logging.debug("VCF file is valid: %s" % path)
-                    return True
+                # VCF has been validated to the point that I give a shit about
+                logging.debug("VCF file is valid: %s" % path)
+                break
+
+        else:
+            # Reached end of file before the first record
+            if state != "FirstRecord":
+                logging.error("Invalid VCF file format! File ended before the '#CHROM' header line!")
+                raise IOError("Invalid VCF file!")
+            logging.warning("VCF is valid, but it's empty!")
+
+        # Lines already read are returned ahead of the rest of the file
+        return itertools.chain(lines_read, vcf_lines)
+
+    @staticmethod
+    def get_vcf_parser(path, fast_reader=False, byte_range=None, regions=None, samples=None, checkpoint=None, sampler=None):
+        # Return a record parser for a plain text, gzip, or BGZF compressed VCF file
+        # FastReader only decodes the INFO/FORMAT fields that are actually accessed
+        # Records from either parser carry their raw FORMAT/sample columns as 'raw_genotype_columns'
+        # If a byte range is given, only records starting within the range are parsed
+        # If a list of (chrom, start, end) regions is given, only records overlapping the regions are parsed
+        # A path of '-' reads from stdin. The header is validated as it's parsed.
+        # If a list of samples is given, records only contain the columns of those samples (in the order given)
+        # If a VCFCheckpoint is given, records are read from the checkpoint being resumed and their offsets are tracked
+        # If a VCFSampler is given, only the records of randomly sampled chunks of the file are parsed
+        # Parsers that aren't read to the end should be closed with close()
+        if regions is not None:
+            vcf_fh = VCFHelper.read_regions(path, regions)
+        elif byte_range is not None:
+            vcf_fh = VCFHelper.read_byte_range(path, byte_range)
+        elif checkpoint is not None:
+            vcf_fh = checkpoint.read_vcf()
+        elif sampler is not None:
+            vcf_fh = sampler.read_vcf()
+        else:
+            vcf_fh = VCFHelper.open_vcf(path)
+
+        vcf_lines = VCFHelper.validate_vcf(vcf_fh, path)
+
+        # Decompression is already handled so stop PyVCF from wrapping '.gz' files a second time
+        # Closing the parser closes the opened file
+        if fast_reader:
+            return FastReader(vcf_lines, compressed=False, samples=samples, source=vcf_fh)
+        return RawLineReader(vcf_lines, compressed=False, samples=samples, source=vcf_fh)
+
+    @staticmethod
+    def get_byte_range_shards(path, num_shards):
+        # Split the records of a VCF file into (start, end) byte ranges of roughly equal size
+        # Range boundaries always fall at the start of a line
+        # Ranges of BGZF files are virtual offsets and are split at block boundaries
+        # Plain gzip files can't be read from an offset so a single range covering the whole file is returned
+        if BGZFReader.is_bgzf(path):
+            return VCFHelper.__get_bgzf_shards(path, num_shards)
+        elif BGZFReader.is_gzip(path):
+            return [None]
+
+        file_size = os.path.getsize(path)
+        with open(path, "r") as vcf_fh:
+
+            # Skip header
+            line = vcf_fh.readline()
+            while line and not line.startswith("#CHROM"):
+                line = vcf_fh.readline()
+            data_start = vcf_fh.tell()
+
+            boundaries = [data_start]
+            for i in range(1, num_shards):
+                offset = data_start + (file_size - data_start) * i / num_shards
+                if offset <= boundaries[-1]:
+                    continue
+                # Move to start of next line
+                vcf_fh.seek(offset - 1)
+                vcf_fh.readline()
+                offset = vcf_fh.tell()
+                if boundaries[-1] < offset < file_size:
+                    boundaries.append(offset)
+            boundaries.append(file_size)
+
+        return zip(boundaries[:-1], boundaries[1:])
+
+    @staticmethod
+    def __get_bgzf_shards(path, num_shards):
+        # Split the records of a BGZF file into (start, end) virtual offset ranges with roughly equal numbers of blocks
+        vcf_fh = BGZFReader(path)
+        try:
+            # Skip header
+            line = vcf_fh.readline()
+            while line and not line.startswith("#CHROM"):
+                line = vcf_fh.readline()
+            data_start = vcf_fh.tell()
+
+            # Offset past the last record in the file
+            file_end = os.path.getsize(path) << 16
+
+            block_offsets = [x for x in BGZFReader.get_block_offsets(path) if x << 16 > data_start]
+            boundaries = [data_start]
+            for i in range(1, num_shards):
+                block_offset = block_offsets[len(block_offsets) * i / num_shards] << 16
+                if block_offset <= boundaries[-1]:
+                    continue
+                # Move to start of the first line beginning in the block
+                vcf_fh.seek(block_offset)
+                if vcf_fh.readline() == "":
+                    break
+                offset = vcf_fh.tell()
+                if boundaries[-1] < offset and vcf_fh.readline() != "":
+                    boundaries.append(offset)
+            boundaries.append(file_end)
+        finally:
+            vcf_fh.close()
+
+        return zip(boundaries[:-1], boundaries[1:])
+
+    @staticmethod
+    def read_byte_range(path, byte_range):
+        # Generate VCF header lines followed by the record lines within a byte range
+        # A byte range of None covers the whole file
+        vcf_fh = VCFHelper.open_vcf(path)
+        try:
+            for line in vcf_fh:
+                yield line
+                if line.startswith("#CHROM"):
+                    break
+
+            if byte_range is None:
+                for line in vcf_fh:
+                    yield line
+                return
+
+            start, end = byte_range
+            vcf_fh.seek(start)
+            if isinstance(vcf_fh, BGZFReader):
+                # Virtual offsets can't be computed from line lengths
+                while vcf_fh.tell() < end:
+                    line = vcf_fh.readline()
+                    if not line:
+                        break
+                    yield line
+                return
+
+            pos = start
+            for line in vcf_fh:
+                if pos >= end:
+                    break
+                yield line
+                pos += len(line)
+        finally:
+            vcf_fh.close()
+
+    @staticmethod
+    def parse_region(region):
+        # Parse a region string formatted as 'chrom', 'chrom:start', or 'chrom:start-end' into a
+        # (chrom, start, end) tuple of 1-based, inclusive coordinates
+        # Commas in coordinates are ignored. Contig names may contain ':' if coordinates are given.
+        match = re.match(r"^(.+):([\d,]+)(?:-([\d,]*))?$", region)
+        if match is None:
+            if region == "":
+                raise ValueError("Invalid region: empty string")
+            return region, 1, VCFHelper.MAX_REGION_POS
+
+        chrom = match.group(1)
+        start = int(match.group(2).replace(",", ""))
+        end = match.group(3)
+        end = int(end.replace(",", "")) if end else VCFHelper.MAX_REGION_POS
+        if start < 1 or end < start:
+            raise ValueError("Invalid region: %s" % region)
+        return chrom, start, end
+
+    @staticmethod
+    def parse_samples(samples):
+        # Parse a comma-separated list of sample names, or the path to a file with one sample name per line
+        if os.path.isfile(samples):
+            with open(samples, "r") as samples_fh:
+                sample_names = [x.strip() for x in samples_fh]
+        else:
+            sample_names = [x.strip() for x in samples.split(",")]
+
+        # Remove empty names left by blank lines or trailing commas
+        sample_names = [x for x in sample_names if x != ""]
+        if len(sample_names) == 0:
+            raise ValueError("No samples in sample list: %s" % samples)
+        return sample_names
+
+    @staticmethod
+    def parse_contigs(contigs):
+        # Parse a comma-separated list of contig names, or the path to a file with a contig name in the first column of each
+        # line (e.g. a FASTA index)
+        if os.path.isfile(contigs):
+            with open(contigs, "r") as contigs_fh:
+                contig_names = [x.split("\t")[0].strip() for x in contigs_fh]
+        else:
+            contig_names = [x.strip() for x in contigs.split(",")]
+
+        # Remove empty names left by blank lines or trailing commas
+        contig_names = [x for x in contig_names if x != ""]
+        if len(contig_names) == 0:
+            raise ValueError("No contigs in contig list: %s" % contigs)
+        return contig_names
+
+    @staticmethod
+    def read_bed_regions(bed_file):
+        # Return the (chrom, start, end) regions of a BED file as 1-based, inclusive coordinates
+        # Header, track, and browser lines are skipped
+        regions = []
+        with open(bed_file, "r") as bed_fh:
+            for line in bed_fh:
+                if line.strip() == "" or line.startswith(("#", "track", "browser")):
+                    continue
+                fields = line.rstrip("\r\n").split("\t")
+                try:
+                    chrom, start, end = fields[0], int(fields[1]) + 1, int(fields[2])
+                except (IndexError, ValueError):
+                    logging.error("Invalid BED line in %s:\n%s" % (bed_file, line))
+                    raise IOError("Invalid BED file!")
+                if end >= start:
+                    regions.append((chrom, start, end))
+        return regions
+
+    @staticmethod
+    def merge_regions(regions):
+        # Merge overlapping (chrom, start, end) regions
+        # Contigs are kept in the order they're first seen and regions are sorted by position within each contig
+        contig_regions = OrderedDict()
+        for chrom, start, end in regions:
+            contig_regions.setdefault(chrom, []).append((start, end))
+
+        merged = []
+        for chrom, intervals in contig_regions.iteritems():
+            intervals.sort()
+            curr_start, curr_end = intervals[0]
+            for start, end in intervals[1:]:
+                if start <= curr_end + 1:
+                    curr_end = max(curr_end, end)
+                else:
+                    merged.append((chrom, curr_start, curr_end))
+                    curr_start, curr_end = start, end
+            merged.append((chrom, curr_start, curr_end))
+        return merged
+
+    @staticmethod
+    def read_regions(path, regions):
+        # Generate VCF header lines followed by the record lines overlapping a list of (chrom, start, end) regions
+        # Requires a BGZF compressed VCF with a tabix (.tbi) or CSI (.csi) index
+        # Records overlapping more than one region are only generated once
+        index_file = TabixIndex.find_index(path) if path != "-" else None
+        if index_file is None or not BGZFReader.is_bgzf(path):
+            logging.error("Region queries require a BGZF compressed VCF with a tabix (.tbi) or CSI (.csi) index: %s" % path)
+            raise IOError("VCF file not indexed!")
+
+        index = TabixIndex(index_file)
+        vcf_fh = BGZFReader(path)
+        try:
+            for line in vcf_fh:
+                yield line
+                if line.startswith("#CHROM"):
+                    break
+
+            last_chrom = None
+            for chrom, start, end in VCFHelper.merge_regions(regions):
+
+                # Virtual offset following the last record generated on the current contig
+                if chrom != last_chrom:
+                    last_offset = 0
+                    last_chrom = chrom
+
+                for chunk_start, chunk_end in index.query(chrom, start - 1, end):
+                    if chunk_end <= last_offset:
+                        continue
+                    vcf_fh.seek(max(chunk_start, last_offset))
+                    past_region = False
+                    while vcf_fh.tell() < chunk_end:
+                        line = vcf_fh.readline()
+                        if not line:
+                            break
+                        fields = line.split("\t", 8)
+                        if fields[0] != chrom:
+                            continue
+                        pos = int(fields[1])
+                        if pos > end:
+                            # Records are sorted so remaining chunks are past the region
+                            past_region = True
+                            break
+                        if VCFHelper.get_record_end(pos, fields[3], fields[7]) >= start:
+                            yield line
+                            last_offset = vcf_fh.tell()
+                    if past_region:
+                        break
+        finally:
+            vcf_fh.close()
+
+    @staticmethod
+    def get_record_end(pos, ref, info):
+        # Return the last position covered by a record from its POS, REF and raw INFO columns
+        # Records with an INFO/END field (e.g. structural variants and gVCF blocks) end at END, like tabix indexes them
+        if "END=" in info:
+            for entry in info.split(";"):
+                if entry.startswith("END="):
+                    try:
+                        return int(entry[4:])
+                    except ValueError:
+                        break
+        return pos + len(ref) - 1
 
     @staticmethod
     def get_annotation_type(path):
         # Determine whether VCF file has been annotated by snpeff, annovar, or other
-        with open(path, 'r') as vcf_fh:
-            vcf_parser = vcf.Reader(vcf_fh)
+        vcf_fh = VCFHelper.open_vcf(path)
+        try:
+            vcf_parser = vcf.Reader(vcf_fh, compressed=False)
             if "ANNOVAR_DATE" in vcf_parser.infos.keys():
                 # Return 'annovar' if 'ANNOVAR_DATE' appears in VCF
                 return VCFAnnotationType.ANNOVAR
@@ -95,6 +482,8 @@ class VCFHelper:
                     return VCFAnnotationType.SNPEFF
             else:
                 return VCFAnnotationType.UNKNOWN
+        finally:
+            vcf_fh.close()
 
     @staticmethod
     def get_info_field_names(vcf_parser):
@@ -127,6 +516,12 @@ class VCFHelper:
     def get_snp_transition_type(record):
         return "%s%s" % (record.alleles[0], record.alleles[1])
 
+    @staticmethod
+    def get_summary_info_fields(info_fields):
+        # Return the subset of info fields read by get_variant_class, get_snpeff_impact, and is_dbsnp
+        summary_fields = ["ExonicFunc.refGene", "Func.refGene", "Annotation", "Annotation_Impact"]
+        return [x for x in info_fields if x in summary_fields or x.startswith("snp1")]
+
     @staticmethod
     def get_variant_class(record_info):
         # Return the type of variant (e.g. intronic, missense)
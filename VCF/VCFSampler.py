@@ -0,0 +1,140 @@
+import logging
+import os
+import random
+
+from VCFHelper import VCFHelper
+from BGZFReader import BGZFReader
+
+class VCFSampler(object):
+    # Random sample of the records of a VCF file drawn uniformly across the whole file
+    # The file is split into fixed-size chunks of bytes that are sampled without replacement. Each record belongs to the
+    # chunk its first byte falls in, so every record is equally likely to be sampled and estimates are unbiased.
+    # Chunks of plain text files are byte ranges that are read by seeking into the chunk and moving to the start of the
+    # next line. Chunks of BGZF files are ranges of compressed offsets holding every block that starts in the range.
+    # Sampled chunks are read in file order when sampling a fraction of the file, or in random order until enough
+    # records have been read when sampling a number of records.
+
+    # Number of bytes per chunk
+    CHUNK_SIZE = 64*1024
+
+    def __init__(self, vcf_file, fraction=None, num_records=None, seed=None):
+
+        if vcf_file == "-":
+            logging.error("(VCFSampler) VCF read from stdin can't be randomly sampled!")
+            raise IOError("Sampling records requires a VCF file!")
+
+        if not BGZFReader.is_bgzf(vcf_file) and BGZFReader.is_gzip(vcf_file):
+            logging.error("(VCFSampler) Gzip compressed VCF can't be randomly sampled! Compress with bgzip instead: %s"
+                          % vcf_file)
+            raise IOError("Sampling records requires a plain text or BGZF compressed VCF file!")
+
+        if (fraction is None) == (num_records is None):
+            logging.error("(VCFSampler) Either a fraction of the VCF or a number of records must be sampled!")
+            raise IOError("Invalid sampling options!")
+
+        # Path to VCF file being sampled
+        self.vcf_file = vcf_file
+
+        # Fraction of chunks to sample or minimum number of records to sample
+        self.fraction = fraction
+        self.num_records = num_records
+
+        # Random number generator used to sample chunks
+        self.random = random.Random(seed)
+
+        # Number of chunks in the file
+        self.num_chunks = max((os.path.getsize(vcf_file) + self.CHUNK_SIZE - 1) / self.CHUNK_SIZE, 1)
+
+        # Number of chunks and records sampled so far
+        self.chunks_sampled = 0
+        self.records_sampled = 0
+
+        # Index of the chunk the most recently read record belongs to
+        self.chunk = None
+
+    def get_scale(self):
+        # Return the factor that scales counts of sampled records to estimates for the whole file
+        return float(self.num_chunks) / max(self.chunks_sampled, 1)
+
+    def read_vcf(self):
+        # Generate the VCF header lines followed by the record lines of sampled chunks
+        vcf_fh = VCFHelper.open_vcf(self.vcf_file)
+        is_bgzf = isinstance(vcf_fh, BGZFReader)
+        raw_fh = open(self.vcf_file, "rb") if is_bgzf else None
+        try:
+            for line in iter(vcf_fh.readline, ""):
+                yield line
+                if line.startswith("#CHROM"):
+                    break
+
+            # Offset of the first record
+            data_start = vcf_fh.tell()
+
+            for chunk in self.__get_chunks():
+
+                # Records starting after the start offset and at or before the end offset belong to the chunk
+                start, end = self.__get_chunk_range(raw_fh, chunk)
+                self.chunks_sampled += 1
+                if start is None:
+                    continue
+
+                # Move to the start of the first record in the chunk
+                vcf_fh.seek(start)
+                vcf_fh.readline()
+
+                pos = vcf_fh.tell()
+                while end is None or pos <= end:
+                    line = vcf_fh.readline()
+                    if not line:
+                        break
+                    if pos >= data_start:
+                        self.chunk = chunk
+                        self.records_sampled += 1
+                        yield line
+                    pos = vcf_fh.tell()
+
+                if self.num_records is not None and self.records_sampled >= self.num_records:
+                    break
+
+            logging.info("(VCFSampler) Sampled %d records from %d of %d chunks" %
+                         (self.records_sampled, self.chunks_sampled, self.num_chunks))
+        finally:
+            vcf_fh.close()
+            if raw_fh is not None:
+                raw_fh.close()
+
+    def __get_chunks(self):
+        # Generate the indices of sampled chunks
+        chunks = self.__get_random_permutation(self.num_chunks)
+        if self.fraction is None:
+            return chunks
+
+        # Read a fixed number of chunks in file order
+        num_sampled = min(max(int(round(self.fraction * self.num_chunks)), 1), self.num_chunks)
+        return sorted([next(chunks) for _ in xrange(num_sampled)])
+
+    def __get_random_permutation(self, n):
+        # Generate a random permutation of range(n) with a Fisher-Yates shuffle that only stores swapped elements
+        # Memory used is proportional to the number of elements generated rather than n
+        swapped = {}
+        for i in xrange(n):
+            j = self.random.randrange(i, n)
+            yield swapped.get(j, j)
+            swapped[j] = swapped.get(i, i)
+
+    def __get_chunk_range(self, raw_fh, chunk):
+        # Return the offsets bounding the records of a chunk. Returns (None, None) if no records can start in the chunk.
+        # Records of plain text files starting within (start, end] belong to the chunk
+        start = chunk * self.CHUNK_SIZE
+        end = start + self.CHUNK_SIZE
+        if raw_fh is None:
+            return start, end
+
+        # Records of BGZF files belong to the block their first byte falls in. A line starting at the beginning of a block
+        # is assigned to the previous block so records are found by moving to the first line start in the block.
+        # Chunks hold the records of the blocks starting within the chunk.
+        start_block = BGZFReader.find_block(raw_fh, start)
+        if start_block is None or start_block >= end:
+            return None, None
+        end_block = BGZFReader.find_block(raw_fh, end)
+        return start_block << 16, None if end_block is None else end_block << 16
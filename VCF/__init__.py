@@ -1,4 +1,11 @@
 from AnnotationParser import AnnotationParser
 from VCFAnnotationType import VCFAnnotationType
 from VCFHelper import VCFHelper
-
+from FastReader import FastReader
+from RawLineReader import RawLineReader
+from BGZFReader import BGZFReader
+from TabixIndex import TabixIndex
+from BGZFWriter import BGZFWriter
+from SampleSelector import SampleSelector
+from VCFCheckpoint import VCFCheckpoint
+from VCFSampler import VCFSampler
@@ -0,0 +1,82 @@
+import gzip
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+class ScriptTestCase(unittest.TestCase):
+    # Base class for tests that run the command line tools on the VCF files in tests/data
+    # Each test gets its own temporary directory for output files, which is removed when the test finishes.
+
+    REPO_DIR    = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    DATA_DIR    = os.path.join(REPO_DIR, "tests", "data")
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix="pipeline_tools_test_")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def get_data_file(self, name):
+        # Return the path of a file in tests/data
+        return os.path.join(self.DATA_DIR, name)
+
+    def get_tmp_file(self, name):
+        # Return a path in the test's temporary directory
+        return os.path.join(self.tmp_dir, name)
+
+    def run_script(self, script, *args, **kwargs):
+        # Run a command line tool with the current python interpreter and return its standard output
+        # Fails the test if the tool exits with an error unless expect_error is True
+        # The contents of the file named by stdin_file are piped to the tool's standard input
+        expect_error = kwargs.get("expect_error", False)
+        stdin_file = kwargs.get("stdin_file", None)
+        cmd = [sys.executable, os.path.join(self.REPO_DIR, script)] + [str(x) for x in args]
+        stdin = None if stdin_file is None else open(stdin_file, "rb")
+        try:
+            proc = subprocess.Popen(cmd, cwd=self.REPO_DIR, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            out, err = proc.communicate()
+        finally:
+            if stdin is not None:
+                stdin.close()
+        if expect_error:
+            self.assertNotEqual(proc.returncode, 0, "%s didn't fail!" % " ".join(cmd))
+        else:
+            self.assertEqual(proc.returncode, 0, "%s failed:\n%s" % (" ".join(cmd), err))
+        return out
+
+    def write_multiallelic_vcf(self, vcf_name, record_num=150):
+        # Write a copy of a plain text VCF in tests/data to the temporary directory with a second ALT allele added to one
+        # record, so recoding the copy fails partway through the VCF
+        vcf_file = self.get_tmp_file("multiallelic.vcf")
+        with open(self.get_data_file(vcf_name), "r") as in_fh, open(vcf_file, "w") as out_fh:
+            num_records = 0
+            for line in in_fh:
+                if not line.startswith("#"):
+                    num_records += 1
+                    if num_records == record_num:
+                        fields = line.split("\t")
+                        fields[4] += ",C" if fields[4] != "C" else ",G"
+                        line = "\t".join(fields)
+                out_fh.write(line)
+        return vcf_file
+
+    @staticmethod
+    def read_file(path):
+        # Return the contents of a file
+        with open(path, "rb") as fh:
+            return fh.read()
+
+    @staticmethod
+    def read_text(path):
+        # Return the decompressed contents of a plain text or gzip/BGZF compressed file
+        with open(path, "rb") as fh:
+            is_gzip = fh.read(2) == "\x1f\x8b"
+        with gzip.open(path, "rb") if is_gzip else open(path, "rb") as fh:
+            return fh.read()
+
+    def assertFilesEqual(self, path1, path2):
+        # Assert two files are byte-identical
+        self.assertEqual(self.read_file(path1), self.read_file(path2), "%s and %s differ!" % (path1, path2))
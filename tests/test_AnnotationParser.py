@@ -0,0 +1,108 @@
+from ScriptTestCase import ScriptTestCase
+from VCF import VCFHelper, AnnotationParser
+
+class AnnotationParserTest(ScriptTestCase):
+    # Tests that the INFO fields selected from a record equal the same fields of the record's fully decoded INFO
+
+    # Selected INFO fields of snpeff.vcf, with and without subfields of 'ANN'
+    SNPEFF_INFO_FIELDS = [["AC", "Gene_Name", "DP", "Annotation"],
+                          ["ERRORS / WARNINGS / INFO", "Allele", "AF"],
+                          ["Distance", "Annotation_Impact"],
+                          ["DP", "NOTE", "DB", "LOF", "FS"]]
+
+    @staticmethod
+    def get_full_info(record, info_fields, snpeff_info_fields):
+        # Return the values of info fields from every INFO field of a record, with the first snpeff annotation split
+        # into all of its subfields
+        info = dict(record.INFO)
+        annotations = info.pop("ANN", None)
+        if annotations is not None:
+            info.update(zip(snpeff_info_fields, annotations[0].split("|")))
+        values = []
+        for info_field in info_fields:
+            value = info.get(info_field)
+            values.append(value[0] if isinstance(value, list) else None if value == "" else value)
+        return values
+
+    def assertInfoEqual(self, vcf_file, info_fields):
+        for fast_reader in [False, True]:
+            vcf_parser = VCFHelper.get_vcf_parser(vcf_file, fast_reader=fast_reader)
+            annotation_parser = AnnotationParser(vcf_parser, info_fields=info_fields)
+            snpeff_info_fields = annotation_parser.snpeff_info_fields
+            selected_info_fields = annotation_parser.get_available_info_fields() if info_fields is None else info_fields
+            num_records = 0
+            for record in vcf_parser:
+                self.assertEqual(annotation_parser.get_info(record),
+                                 self.get_full_info(record, selected_info_fields, snpeff_info_fields),
+                                 "INFO of %s:%s differs!" % (record.CHROM, record.POS))
+                num_records += 1
+            self.assertEqual(num_records, 240)
+
+    def test_selected_info(self):
+        for info_fields in self.SNPEFF_INFO_FIELDS:
+            self.assertInfoEqual(self.get_data_file("snpeff.vcf"), info_fields)
+
+    def test_missing_annotation(self):
+        # Subfields of records without an 'ANN' field are None
+        vcf_file = self.get_tmp_file("no_ann.vcf")
+        with open(self.get_data_file("snpeff.vcf"), "r") as in_fh, open(vcf_file, "w") as out_fh:
+            for i, line in enumerate(in_fh):
+                if not line.startswith("#") and i % 3 == 0:
+                    fields = line.split("\t")
+                    fields[7] = ";".join([x for x in fields[7].split(";") if not x.startswith("ANN=")])
+                    line = "\t".join(fields)
+                out_fh.write(line)
+        for info_fields in self.SNPEFF_INFO_FIELDS[:2]:
+            self.assertInfoEqual(vcf_file, info_fields)
+
+    def test_all_info(self):
+        for vcf_name in ["snpeff.vcf", "annovar.vcf", "mutect.vcf"]:
+            self.assertInfoEqual(self.get_data_file(vcf_name), None)
+
+class MostSevereAnnotationTest(ScriptTestCase):
+    # Tests that the most severe snpeff annotation is selected by impact, then by consequence
+
+    HEADER = ["##fileformat=VCFv4.2",
+              "##INFO=<ID=ANN,Number=.,Type=String,Description=\"Functional annotations: 'Allele | Annotation | "
+              "Annotation_Impact | Gene_Name'\">",
+              '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">',
+              "##contig=<ID=chr1,length=100000>",
+              "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1"]
+
+    # Annotations of each record and the gene of the most severe annotation
+    ANNOTATIONS = [(["G|upstream_gene_variant|MODIFIER|GENE0", "G|frameshift_variant|HIGH|GENE1",
+                     "G|missense_variant|MODERATE|GENE2"], "GENE1"),
+                   # Impact ties are broken by the consequence
+                   (["G|missense_variant|MODERATE|GENE0", "G|inframe_deletion|MODERATE|GENE1"], "GENE1"),
+                   # Consequences joined by '&' are ranked by their most severe term
+                   (["G|synonymous_variant|LOW|GENE0", "G|intron_variant&splice_region_variant|LOW|GENE1"], "GENE1"),
+                   # The first of equally severe annotations is kept
+                   (["G|intron_variant|MODIFIER|GENE0", "G|intron_variant|MODIFIER|GENE1",
+                     "G|intergenic_region|MODIFIER|GENE2"], "GENE0"),
+                   # Unknown impacts and consequences are ranked below known ones
+                   (["G|frameshift_variant|UNKNOWN|GENE0", "G|new_variant|MODIFIER|GENE1",
+                     "G|intergenic_variant|MODIFIER|GENE2"], "GENE2"),
+                   (["G|missense_variant|MODERATE|GENE0"], "GENE0")]
+
+    def write_vcf(self):
+        vcf_file = self.get_tmp_file("most_severe.vcf")
+        lines = list(self.HEADER)
+        for i, (annotations, _) in enumerate(self.ANNOTATIONS):
+            lines.append("\t".join(["chr1", str(100 * (i + 1)), ".", "A", "G", "50", "PASS",
+                                    "ANN=%s" % ",".join(annotations), "GT", "0/1"]))
+        with open(vcf_file, "w") as fh:
+            fh.write("\n".join(lines) + "\n")
+        return vcf_file
+
+    def get_genes(self, vcf_file, fast_reader, snpeff_most_severe):
+        # Return the gene of the annotation selected for each record
+        vcf_parser = VCFHelper.get_vcf_parser(vcf_file, fast_reader=fast_reader)
+        annotation_parser = AnnotationParser(vcf_parser, info_fields=["Gene_Name"],
+                                             snpeff_most_severe=snpeff_most_severe)
+        return [annotation_parser.get_info(record)[0] for record in vcf_parser]
+
+    def test_most_severe(self):
+        vcf_file = self.write_vcf()
+        for fast_reader in [False, True]:
+            self.assertEqual(self.get_genes(vcf_file, fast_reader, True), [x[1] for x in self.ANNOTATIONS])
+            self.assertEqual(self.get_genes(vcf_file, fast_reader, False), ["GENE0"] * len(self.ANNOTATIONS))
@@ -0,0 +1,63 @@
+import gzip
+import random
+
+from ScriptTestCase import ScriptTestCase
+from VCF import BGZFReader, BGZFWriter
+
+class BGZFTest(ScriptTestCase):
+    # Tests that BGZF files written by BGZFWriter and RecodeVCF can be read back by BGZFReader and gzip
+
+    def get_lines(self):
+        # Return enough random lines to fill several blocks
+        rand = random.Random(1)
+        return ["%d\t%s\n" % (i, "".join(rand.choice("ACGT") for _ in range(rand.randint(0, 300)))) for i in range(3000)]
+
+    def write_bgzf(self, path, lines, num_threads):
+        # Write lines to a BGZF file and return the virtual offset of each line
+        writer = BGZFWriter(path, num_threads=num_threads, index_blocks=True)
+        data_offsets = []
+        data_offset = 0
+        for line in lines:
+            data_offsets.append(data_offset)
+            writer.write(line)
+            data_offset += len(line)
+        writer.close()
+        return [writer.get_virtual_offset(x) for x in data_offsets]
+
+    def test_round_trip(self):
+        lines = self.get_lines()
+        for num_threads in [1, 3]:
+            path = self.get_tmp_file("out_%d.gz" % num_threads)
+            virtual_offsets = self.write_bgzf(path, lines, num_threads)
+            self.assertTrue(BGZFReader.is_bgzf(path))
+            self.assertTrue(self.read_file(path).endswith(BGZFWriter.EOF_BLOCK))
+            self.assertGreater(len(BGZFReader.get_block_offsets(path)), 3)
+
+            # Read sequentially with gzip and BGZFReader
+            with gzip.open(path, "rb") as fh:
+                self.assertEqual(fh.read(), "".join(lines))
+            reader = BGZFReader(path)
+            self.assertEqual(list(reader), lines)
+
+            # Read lines by seeking to their virtual offsets
+            for i in random.Random(2).sample(range(len(lines)), 200) + [0, len(lines) - 1]:
+                reader.seek(virtual_offsets[i])
+                self.assertEqual(reader.readline(), lines[i])
+            reader.close()
+
+        # Blocks don't depend on the number of compression threads
+        self.assertFilesEqual(self.get_tmp_file("out_1.gz"), self.get_tmp_file("out_3.gz"))
+
+    def test_recode_compressed_output(self):
+        vcf_file = self.get_data_file("snpeff.vcf")
+        plain_out = self.get_tmp_file("out.tsv")
+        self.run_script("RecodeVCF.py", "--vcf", vcf_file, "--output", plain_out)
+        for out_name, args in [("out.tsv.gz", []), ("out.tsv.bgz", []), ("out_threads.tsv.gz", ["--compress-threads", 3])]:
+            gz_out = self.get_tmp_file(out_name)
+            self.run_script("RecodeVCF.py", "--vcf", vcf_file, "--output", gz_out, *args)
+            self.assertTrue(BGZFReader.is_bgzf(gz_out))
+            self.assertEqual(self.read_text(gz_out), self.read_file(plain_out))
+            reader = BGZFReader(gz_out)
+            self.assertEqual("".join(reader), self.read_file(plain_out))
+            reader.close()
+        self.assertFilesEqual(self.get_tmp_file("out.tsv.gz"), self.get_tmp_file("out_threads.tsv.gz"))
@@ -0,0 +1,104 @@
+from collections import namedtuple
+
+from ScriptTestCase import ScriptTestCase
+from VCF import VCFHelper
+from RecodeVCF import VCFRecoder, BatchGenotypeRecoder
+
+class BatchGenotypeRecoderTest(ScriptTestCase):
+    # Tests that genotypes and depths recoded in blocks are identical to the ones recoded one sample at a time by
+    # VCFRecoder.get_recoded_genotype and VCFRecoder.get_depth_data
+
+    HEADER = ["##fileformat=VCFv4.2",
+              '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">',
+              '##FORMAT=<ID=AD,Number=R,Type=%s,Description="Allelic depths">',
+              '##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Depth">',
+              '##FORMAT=<ID=F1R2,Number=R,Type=Integer,Description="Count of reads in F1R2 pair orientation">',
+              '##FORMAT=<ID=F2R1,Number=R,Type=Integer,Description="Count of reads in F2R1 pair orientation">',
+              "##contig=<ID=chr1,length=100000>",
+              "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\tS2\tS3"]
+
+    # FORMAT and sample columns of records recoded in bulk
+    RECORDS = [["GT:AD:DP", "0/0:12,0:12", "0/1:5,5:10", "1/1:0,3:3"],
+               # Depths at min_call_depth
+               ["GT:AD:DP", "0/0:10,0:10", "0/1:0,10:10", "1|1:9,9:18"],
+               # Depths of zero and missing AD of an uncalled genotype
+               ["GT:AD:DP", "0/0:0,0:0", "./.:.:.", "0/1:3,0:3"],
+               # Partially called and haploid genotypes
+               ["GT:AD", "./1:4,6", "1:4,2", "0:15"],
+               # Single AD values of homozygous REF genotypes
+               ["GT:AD", "0/0:4", "./.:.", "0/0:11"],
+               # Missing AD of called genotypes falls back to Mutect's F1R2 and F2R1
+               ["GT:AD:F1R2:F2R1", "0/0:.:6,0:5,0", "0/1:.:3,2:2,3", "./.:.:.:."],
+               # Mutect depths only, with missing trailing fields
+               ["GT:F1R2:F2R1", "0/0:6,0:4,0", "0/1:1,4:2,3", "./."],
+               # FORMAT fields in a different order
+               ["DP:AD:GT", "12:12,0:0/0", "9:0,9:0/1", ".:.:./."]]
+
+    # FORMAT and sample columns of records recode_block can't recode, which are recoded one sample at a time
+    FALLBACK_RECORDS = [["GT:AD", "0/0:-1,0", "0/1:3,4", "./.:."],
+                        ["GT:DP", "./.:5", "./.:.", "./.:3"],
+                        ["DP", "5", "3", "."]]
+
+    def write_vcf(self, records, ad_type="Integer"):
+        # Write a VCF with a record for each list of FORMAT and sample columns
+        vcf_file = self.get_tmp_file("genotypes.vcf")
+        lines = [x % ad_type if "%s" in x else x for x in self.HEADER]
+        for i, columns in enumerate(records):
+            lines.append("\t".join(["chr1", str(1000 + i), ".", "A", "G", "50", "PASS", "."] + columns))
+        with open(vcf_file, "w") as fh:
+            fh.write("\n".join(lines) + "\n")
+        return vcf_file
+
+    def recode(self, vcf_file, fast_reader):
+        # Return the rows of recode_block and the rows recoded one sample at a time for every record of a VCF
+        vcf_parser = VCFHelper.get_vcf_parser(vcf_file, fast_reader=fast_reader)
+        vcf_recoder = VCFRecoder(vcf_parser, vcf_file, self.get_tmp_file("out.tsv"), min_call_depth=10)
+        records = list(vcf_parser)
+        block_rows = vcf_recoder.batch_recoder.recode_block(records)
+        sample_rows = [[str(x) for x in vcf_recoder.get_genotype_data(record) + vcf_recoder.get_depth_data(record)]
+                       for record in records]
+        return block_rows, sample_rows
+
+    def test_recode_block(self):
+        vcf_file = self.write_vcf(self.RECORDS + self.FALLBACK_RECORDS)
+        for fast_reader in [False, True]:
+            block_rows, sample_rows = self.recode(vcf_file, fast_reader)
+            self.assertEqual(block_rows[:len(self.RECORDS)], sample_rows[:len(self.RECORDS)])
+            self.assertEqual(block_rows[len(self.RECORDS):], [None] * len(self.FALLBACK_RECORDS))
+
+        # Spot check values of the original recoding rules
+        self.assertEqual(sample_rows[0], ["-1", "0.5", "0.3", "12", "10", "3"])
+        self.assertEqual(sample_rows[1], ["-1", "1", "0.9", "10", "10", "18"])
+        self.assertEqual(sample_rows[2], ["-0", "NA", "0", "0", "0", "3"])
+        self.assertEqual(sample_rows[3], ["NA", "0.2", "-1", "10", "6", "15"])
+        self.assertEqual(sample_rows[6], ["-1", "0.7", "NA", "10", "10", "0"])
+
+    def test_float_depths(self):
+        # Records with Float allelic depths are recoded one sample at a time
+        vcf_file = self.write_vcf([["GT:AD", "0/0:4.5,0", "0/1:2,7.5", "./.:."]], ad_type="Float")
+        for fast_reader in [False, True]:
+            block_rows, sample_rows = self.recode(vcf_file, fast_reader)
+            self.assertEqual(block_rows, [None])
+            self.assertEqual(sample_rows, [["-0.45", "0.75", "NA", "4.5", "9.5", "0"]])
+
+    def test_genotype_table(self):
+        # Table strings equal the strings get_recoded_genotype computes for depths it doesn't look up in the table
+        CallData = namedtuple("CallData", ["AD"])
+        Call = namedtuple("Call", ["called", "gt_type", "data"])
+        vcf_file = self.get_data_file("snpeff.vcf")
+        for min_call_depth in [0, 1, 3, 7, 10, 13, 30]:
+            vcf_recoder = VCFRecoder(VCFHelper.get_vcf_parser(vcf_file), vcf_file, self.get_tmp_file("out.tsv"),
+                                     min_call_depth=min_call_depth)
+            table = BatchGenotypeRecoder.get_genotype_table(min_call_depth, "NA")
+            self.assertEqual([len(x) for x in table], [max(min_call_depth, 0) + 1] * 3)
+            self.assertEqual(table[2], ["NA"] * len(table[2]))
+            for dp in range(min_call_depth + 1):
+                # Float depths are recoded from the formula rather than the table
+                ref_call = Call(True, 0, CallData([float(dp), 0.0]))
+                variant_call = Call(True, 1, CallData([0.0, float(dp)]))
+                self.assertEqual(table[0][dp], vcf_recoder.get_recoded_genotype(ref_call))
+                self.assertEqual(table[1][dp], vcf_recoder.get_recoded_genotype(variant_call))
+
+        table = BatchGenotypeRecoder.get_genotype_table(3, ".")
+        self.assertEqual(table[0], ["-0", "-0.333333333333", "-0.666666666667", "-1"])
+        self.assertEqual(table[1], ["0", "0.333333333333", "0.666666666667", "1"])
@@ -0,0 +1,60 @@
+import unittest
+import numpy as np
+
+from SummarizeVCF import CountFieldRegistry, VCFSummary, merge_two_vcf_summaries
+
+class CountFieldRegistryTest(unittest.TestCase):
+    # Tests that count fields keep the id they were first given and are reported in the order they were first seen
+
+    def test_ids(self):
+        registry = CountFieldRegistry(["Called GT", "SNPs"])
+        self.assertEqual(registry.add("Ts"), 2)
+        # Adding an existing field returns its original id
+        self.assertEqual(registry.add("SNPs"), 1)
+        self.assertEqual(registry.add("Called GT"), 0)
+        self.assertEqual(registry.add("Tv"), 3)
+
+        self.assertEqual(registry.names, ["Called GT", "SNPs", "Ts", "Tv"])
+        self.assertEqual(list(registry), registry.names)
+        self.assertEqual(len(registry), 4)
+        self.assertEqual(registry.get_ids(["Tv", "Called GT"]), [3, 0])
+        self.assertIn("Ts", registry)
+        self.assertNotIn("dbSNP", registry)
+
+    def test_report_order(self):
+        # Fields first seen while counting follow the required fields in the order they were first seen
+        vcf_summary = VCFSummary(["S1", "S2"], required_count_names=["Called GT", "SNPs"])
+        for sample_name, count_name in [("S2", "dbSNP"), ("S1", "SNPs"), ("S1", "Ts"), ("S2", "dbSNP"),
+                                        ("S1", "Called GT")]:
+            vcf_summary.add_count(sample_name, count_name)
+        self.assertEqual(vcf_summary.get_count_id("dbSNP"), 2)
+        self.assertEqual(vcf_summary.get_count_id("Ts"), 3)
+        self.assertEqual(str(vcf_summary).split("\n")[:4], ["#COUNTS",
+                                                            "Sample\tCalled_GT\tSNPs\tdbSNP\tTs",
+                                                            "S1\t1\t1\t0\t1",
+                                                            "S2\t0\t0\t2\t0"])
+
+    def test_allocated_columns(self):
+        # Counts are kept when more fields are added than there are allocated columns
+        vcf_summary = VCFSummary(["S1"])
+        count_names = ["Field%d" % i for i in range(VCFSummary.MIN_COUNT_COLUMNS + 10)]
+        for i, count_name in enumerate(count_names):
+            for _ in range(i % 3 + 1):
+                vcf_summary.add_count("S1", count_name)
+        self.assertEqual(vcf_summary.count_names, count_names)
+        self.assertEqual(vcf_summary.get_counts()[0].tolist(), [i % 3 + 1 for i in range(len(count_names))])
+
+    def test_merge_field_sets(self):
+        # Initializing the fields of another summary before merging gives the columns its counts are added to
+        summary_1 = VCFSummary(["S1"], required_count_names=["Called GT", "SNPs"])
+        summary_2 = VCFSummary(["S1"], required_count_names=["Ts", "Called GT", "dbSNP"])
+        summary_1.set_counts("S1", [5, 2])
+        summary_2.set_counts("S1", [1, 3, 4])
+
+        self.assertEqual(summary_1.init_count_fields(summary_2.count_names), [2, 0, 3])
+        self.assertEqual(summary_1.count_names, ["Called GT", "SNPs", "Ts", "dbSNP"])
+        np.testing.assert_array_equal(summary_1.get_counts(), [[5, 2, 0, 0]])
+
+        merged = merge_two_vcf_summaries(summary_1, summary_2)
+        self.assertEqual(merged.count_names, ["Called GT", "SNPs", "Ts", "dbSNP"])
+        np.testing.assert_array_equal(merged.get_counts(), [[8, 2, 1, 4]])
@@ -0,0 +1,44 @@
+from ScriptTestCase import ScriptTestCase
+
+class FastReaderTest(ScriptTestCase):
+    # Tests that the output of tools run with --fast-reader is byte-identical to the output of tools run with PyVCF
+
+    def assertRecodeIdentical(self, vcf_name, *args):
+        # Recode a VCF with both readers and assert the outputs are identical
+        vcf_file = self.get_data_file(vcf_name)
+        pyvcf_out = self.get_tmp_file("pyvcf.txt")
+        fast_out = self.get_tmp_file("fast.txt")
+        self.run_script("RecodeVCF.py", "--vcf", vcf_file, "--output", pyvcf_out, *args)
+        self.run_script("RecodeVCF.py", "--vcf", vcf_file, "--output", fast_out, "--fast-reader", *args)
+        self.assertGreater(len(self.read_file(pyvcf_out).splitlines()), 1)
+        self.assertFilesEqual(pyvcf_out, fast_out)
+
+    def assertSummaryIdentical(self, summary_type, vcf_name, *args):
+        # Summarize a VCF with both readers and assert the summaries are identical
+        vcf_file = self.get_data_file(vcf_name)
+        pyvcf_summary = self.run_script("SummarizeVCF.py", summary_type, "--vcf", vcf_file, *args)
+        fast_summary = self.run_script("SummarizeVCF.py", summary_type, "--vcf", vcf_file, "--fast-reader", *args)
+        self.assertTrue(pyvcf_summary.startswith("#COUNTS"))
+        self.assertEqual(pyvcf_summary, fast_summary)
+
+    def test_recode_snpeff(self):
+        self.assertRecodeIdentical("snpeff.vcf")
+        self.assertRecodeIdentical("snpeff.vcf", "--snpeff-most-severe", "--min-call-depth", "10")
+
+    def test_recode_annovar(self):
+        self.assertRecodeIdentical("annovar.vcf")
+        self.assertRecodeIdentical("annovar.vcf", "--info-columns", "AC,DP,Func.refGene,Gene.refGene")
+
+    def test_recode_mutect(self):
+        self.assertRecodeIdentical("mutect.vcf")
+        self.assertRecodeIdentical("mutect.vcf", "--min-call-depth", "10", "--missing-gt-char", "NA")
+
+    def test_summarize_snpeff(self):
+        self.assertSummaryIdentical("Multisample", "snpeff.vcf")
+        self.assertSummaryIdentical("Multisample", "snpeff.vcf", "--snpeff-most-severe")
+
+    def test_summarize_annovar(self):
+        self.assertSummaryIdentical("Multisample", "annovar.vcf")
+
+    def test_summarize_mutect(self):
+        self.assertSummaryIdentical("Mutect", "mutect.vcf")
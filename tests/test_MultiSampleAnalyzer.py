@@ -0,0 +1,117 @@
+from ScriptTestCase import ScriptTestCase
+from SummarizeVCF import VCFSummarizer
+
+class AnalyzerTestCase(ScriptTestCase):
+    # Base class for tests that summarize hand-written VCFs and compare the summary with counts worked out per record
+
+    HEADER = ["##fileformat=VCFv4.2",
+              '##FILTER=<ID=PASS,Description="All filters passed">',
+              '##FILTER=<ID=LowQual,Description="Low quality">',
+              '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">',
+              '##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allelic depths">',
+              '##FORMAT=<ID=GQ,Number=1,Type=Integer,Description="Genotype Quality">',
+              '##FORMAT=<ID=F1R2,Number=R,Type=Integer,Description="Count of reads in F1R2 pair orientation">',
+              '##FORMAT=<ID=F2R1,Number=R,Type=Integer,Description="Count of reads in F2R1 pair orientation">',
+              '##INFO=<ID=DP,Number=1,Type=Integer,Description="Depth">',
+              "##contig=<ID=chr1,length=100000>"]
+
+    def summarize(self, summary_type, samples, records):
+        # Summarize a VCF of records given as lists of columns with the PyVCF and fast readers
+        # Returns the summary of each reader
+        vcf_file = self.get_tmp_file("records.vcf")
+        lines = self.HEADER + ["\t".join(["#CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO", "FORMAT"] + samples)]
+        lines += ["\t".join(x) for x in records]
+        with open(vcf_file, "w") as fh:
+            fh.write("\n".join(lines) + "\n")
+
+        summaries = []
+        for fast_reader in [False, True]:
+            summarizer = VCFSummarizer(vcf_file, summary_type, -1, fast_reader=fast_reader)
+            summarizer.summarize()
+            summaries.append(summarizer.get_summary())
+        return summaries
+
+    @staticmethod
+    def get_bins(values):
+        # Return the non-empty bins of a histogram row as a dictionary of bin counts
+        return dict([(i, x) for i, x in enumerate(values.tolist()) if x > 0])
+
+    def assertCounts(self, vcf_summary, sample_name, counts):
+        # Assert the counts of a sample equal a dictionary of non-zero counts
+        row = vcf_summary.get_counts()[vcf_summary.get_sample_id(sample_name)].tolist()
+        self.assertEqual(dict([(x, y) for x, y in zip(vcf_summary.count_names, row) if y > 0]), counts)
+
+    def assertHistograms(self, vcf_summary, sample_name, **histograms):
+        # Assert the non-empty bins of a sample's histograms
+        sample_summary = vcf_summary.summary[sample_name]
+        for histogram, bins in histograms.items():
+            self.assertEqual(self.get_bins(getattr(sample_summary, histogram)), bins, "%s of %s differ!" %
+                             (histogram, sample_name))
+
+class MultiSampleAnalyzerTest(AnalyzerTestCase):
+
+    RECORDS = [["chr1", "100", "rs100", "A", "G", "50", "PASS", "DP=10", "GT:AD:GQ", "./.:.:.", "0/0:10,0:30", "0/1:5,7:50"],
+               ["chr1", "200", ".", "C", "A", "50", "LowQual", "DP=10", "GT:AD:GQ", "1/1:0,20:99", "0/1:3,3:.", "0/0:8,0:20"],
+               ["chr1", "300", ".", "AT", "A", "50", "PASS", "DP=10", "GT:AD:GQ", "0/1:4,4:10", "./.:.:.", "1/1:0,250:150"],
+               # Every called allele is ALT so the alternate allele frequency is 1
+               ["chr1", "400", ".", "A", "AGG", "50", "PASS", "DP=10", "GT:AD:GQ", "1/1:0,5:5", "1/1:0,6:6", "1/1:0,7:7"],
+               # Spanning deletion
+               ["chr1", "500", ".", "C", "*", "50", "PASS", "DP=10", "GT:AD:GQ", "0/1:2,2:40", "0/0:9,0:12", "0/0:11,0:12"],
+               ["chr1", "600", ".", "G", "<DEL>", "50", "PASS", "DP=10", "GT:AD:GQ", "0/1:6,1:15", "0/0:5,0:12", "./.:.:."]]
+
+    def test_analyze_block(self):
+        for vcf_summary in self.summarize("Multisample", ["S1", "S2", "S3"], self.RECORDS):
+            self.assertCounts(vcf_summary, "S1", {"Missing GT": 1, "Called GT": 5, "Variant GT": 5, "Heterozygous": 3,
+                                                  "Homozygous-Alt": 2, "Deletions": 2, "Insertions": 1, "SNPs": 1,
+                                                  "Tv": 1, "CA": 1, "Unknown Variant Type": 1})
+            self.assertCounts(vcf_summary, "S2", {"Missing GT": 1, "Called GT": 5, "Variant GT": 2, "Heterozygous": 1,
+                                                  "Homozygous-Alt": 1, "Insertions": 1, "SNPs": 1, "Tv": 1, "CA": 1})
+            self.assertCounts(vcf_summary, "S3", {"Missing GT": 1, "Called GT": 5, "Variant GT": 3, "Heterozygous": 1,
+                                                  "Homozygous-Alt": 2, "Deletions": 1, "Insertions": 1, "SNPs": 1,
+                                                  "Ts": 1, "AG": 1, "dbSNP": 1})
+
+            # Depths and qualities of called genotypes, with values above the maximum in the last bin
+            # Alternate allele frequencies, including a frequency of 1 in the last bin, and indel lengths of variants
+            self.assertHistograms(vcf_summary, "S1", depths={4: 1, 5: 1, 7: 1, 8: 1, 20: 1},
+                                  quals={5: 1, 10: 1, 15: 1, 40: 1, 99: 1}, afs={3: 1, 4: 1, 9: 1, 14: 1, 19: 1},
+                                  inserts={2: 1}, deletes={0: 1, 1: 1})
+            self.assertHistograms(vcf_summary, "S2", depths={5: 1, 6: 2, 9: 1, 10: 1}, quals={6: 1, 12: 2, 30: 1},
+                                  afs={9: 1, 19: 1}, inserts={2: 1}, deletes={})
+            self.assertHistograms(vcf_summary, "S3", depths={7: 1, 8: 1, 11: 1, 12: 1, 100: 1},
+                                  quals={7: 1, 12: 1, 20: 1, 50: 1, 100: 1}, afs={4: 1, 14: 1, 19: 1},
+                                  inserts={2: 1}, deletes={1: 1})
+
+            # Required count fields come first and fields first seen while summarizing follow in order of appearance
+            self.assertEqual(vcf_summary.count_names,
+                             ["Missing GT", "Called GT", "Variant GT", "Heterozygous", "Homozygous-Alt", "Deletions",
+                              "Insertions", "Monomorphs", "SNPs", "Ts", "Tv", "AC", "AG", "AT", "CA", "CG", "CT", "GA",
+                              "GC", "GT", "TA", "TC", "TG", "dbSNP", "Unknown Variant Type"])
+
+    def test_aaf_of_one(self):
+        # Frequencies of 1 are counted in the last bin rather than past the end of the histogram
+        for vcf_summary in self.summarize("Multisample", ["S1", "S2", "S3"], self.RECORDS[3:4]):
+            for sample_name in ["S1", "S2", "S3"]:
+                self.assertHistograms(vcf_summary, sample_name, afs={vcf_summary.num_afs_bins - 1: 1})
+
+class MutectMultiSampleAnalyzerTest(AnalyzerTestCase):
+
+    RECORDS = [["chr1", "100", ".", "A", "G", "50", "PASS", "DP=10", "GT:AD", "0/0:20,0", "0/1:10,6"],
+               # Filtered variants are only counted as called genotypes
+               ["chr1", "200", ".", "C", "T", "50", "LowQual", "DP=10", "GT:AD", "0/0:15,0", "0/1:8,4"],
+               # Depths from F1R2 and F2R1 only
+               ["chr1", "300", ".", "G", "GA", "50", "PASS", "DP=10", "GT:F1R2:F2R1", "0/0:5,0:6,0", "0/1:3,2:4,5"],
+               ["chr1", "400", ".", "T", "C", "50", "PASS", "DP=10", "GT:AD", "./.:.", "1/1:0,30"]]
+
+    def test_analyze_block(self):
+        for vcf_summary in self.summarize("Mutect", ["NORMAL", "TUMOR"], self.RECORDS):
+            self.assertCounts(vcf_summary, "NORMAL", {"Missing GT": 1, "Called GT": 3})
+            self.assertCounts(vcf_summary, "TUMOR", {"Called GT": 4, "Passed Filter": 3, "Variant GT": 3,
+                                                     "Heterozygous": 2, "Homozygous-Alt": 1, "Insertions": 1,
+                                                     "SNPs": 2, "Ts": 2, "AG": 1, "TC": 1})
+
+            # Alternate allele depths of variants that passed the filter
+            self.assertHistograms(vcf_summary, "NORMAL", depths={}, quals={}, afs={}, inserts={}, deletes={})
+            self.assertHistograms(vcf_summary, "TUMOR", depths={6: 1, 7: 1, 30: 1}, quals={}, afs={4: 2, 19: 1},
+                                  inserts={1: 1}, deletes={})
+            self.assertEqual(vcf_summary.count_names[:6], ["Missing GT", "Called GT", "Passed Filter", "Variant GT",
+                                                           "Heterozygous", "Homozygous-Alt"])
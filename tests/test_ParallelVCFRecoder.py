@@ -0,0 +1,42 @@
+from ScriptTestCase import ScriptTestCase
+from RecodeVCF import ParallelVCFRecoder
+
+class ParallelVCFRecoderTest(ScriptTestCase):
+    # Tests that recoding with --threads gives the same output as recoding with a single process
+
+    def assertThreadsIdentical(self, vcf_name, out_name, *args):
+        # Recode a VCF with one and three processes and assert the outputs are identical
+        # Compressed outputs are compared after decompression as blocks are split at different rows
+        vcf_file = self.get_data_file(vcf_name)
+        serial_out = self.get_tmp_file("serial_%s" % out_name)
+        parallel_out = self.get_tmp_file("parallel_%s" % out_name)
+        self.run_script("RecodeVCF.py", "--vcf", vcf_file, "--output", serial_out, *args)
+        self.run_script("RecodeVCF.py", "--vcf", vcf_file, "--output", parallel_out, "--threads", 3, *args)
+        self.assertGreater(len(self.read_text(serial_out)), 0)
+        self.assertEqual(self.read_text(serial_out), self.read_text(parallel_out))
+
+    def test_threads(self):
+        for vcf_name in ["snpeff.vcf", "annovar.vcf", "mutect.vcf"]:
+            self.assertThreadsIdentical(vcf_name, "out.tsv")
+
+    def test_threads_fast_reader(self):
+        self.assertThreadsIdentical("snpeff.vcf", "out.tsv", "--fast-reader", "--snpeff-most-severe")
+
+    def test_threads_samples(self):
+        self.assertThreadsIdentical("annovar.vcf", "out.tsv", "--samples", "S3,S1")
+
+    def test_threads_compressed_output(self):
+        self.assertThreadsIdentical("mutect.vcf", "out.tsv.gz")
+
+    def test_threads_stdout(self):
+        vcf_file = self.get_data_file("snpeff.vcf")
+        serial_out = self.run_script("RecodeVCF.py", "--vcf", vcf_file, "--output", "-")
+        parallel_out = self.run_script("RecodeVCF.py", "--vcf", vcf_file, "--output", "-", "--threads", 3)
+        self.assertEqual(serial_out, parallel_out)
+
+    def test_header_parser_closed(self):
+        # The parser only used to read the header is closed once the output is written
+        vcf_recoder = ParallelVCFRecoder(self.get_data_file("mutect.vcf"), self.get_tmp_file("out.tsv"), 2)
+        self.assertFalse(vcf_recoder.header_parser.source.closed)
+        vcf_recoder.recode_vcf()
+        self.assertTrue(vcf_recoder.header_parser.source.closed)
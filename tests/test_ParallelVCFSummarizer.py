@@ -0,0 +1,33 @@
+from ScriptTestCase import ScriptTestCase
+
+class ParallelVCFSummarizerTest(ScriptTestCase):
+    # Tests that summarizing with --threads gives the same summary as summarizing with a single process
+
+    def assertThreadsIdentical(self, summary_type, vcf_name, *args):
+        # Summarize a VCF with one and three processes and assert the summaries are identical
+        vcf_file = self.get_data_file(vcf_name)
+        serial_summary = self.run_script("SummarizeVCF.py", summary_type, "--vcf", vcf_file, *args)
+        parallel_summary = self.run_script("SummarizeVCF.py", summary_type, "--vcf", vcf_file, "--threads", 3, *args)
+        self.assertGreater(len(serial_summary), 0)
+        self.assertEqual(serial_summary, parallel_summary)
+
+    def test_threads(self):
+        for vcf_name in ["snpeff.vcf", "annovar.vcf"]:
+            self.assertThreadsIdentical("Multisample", vcf_name)
+
+    def test_threads_mutect(self):
+        self.assertThreadsIdentical("Mutect", "mutect.vcf")
+
+    def test_threads_bgzf(self):
+        # Shards of BGZF files are split at block boundaries
+        for vcf_name in ["snpeff.vcf.gz", "annovar.vcf.gz"]:
+            self.assertThreadsIdentical("Multisample", vcf_name)
+
+    def test_threads_regions(self):
+        self.assertThreadsIdentical("Multisample", "snpeff.vcf.gz", "--region", "chrX", "--region", "chr1:1-5000",
+                                    "--region", "chr10:14000-15000")
+
+    def test_threads_options(self):
+        self.assertThreadsIdentical("Multisample", "snpeff.vcf", "--snpeff-most-severe", "--fast-reader")
+        self.assertThreadsIdentical("Multisample", "annovar.vcf", "--samples", "S3,S1", "--max-depth", "40",
+                                    "--afs-bins", "5")
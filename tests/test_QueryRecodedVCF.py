@@ -0,0 +1,93 @@
+import random
+
+from ScriptTestCase import ScriptTestCase
+from RecodeVCF import RecodedVCFIndex
+from VCF import VCFHelper
+
+class QueryRecodedVCFTest(ScriptTestCase):
+    # Tests that QueryRecodedVCF returns the same records as scanning every row of a recoded file for records overlapping
+    # the queried regions
+
+    def setUp(self):
+        ScriptTestCase.setUp(self)
+
+        # Header and rows of the unindexed recoded file
+        recoded_file = self.get_tmp_file("recoded.tsv")
+        self.run_script("RecodeVCF.py", "--vcf", self.get_data_file("snpeff.vcf"), "--output", recoded_file)
+        lines = self.read_file(recoded_file).splitlines(True)
+        self.header = lines[0]
+        self.rows = lines[1:]
+
+    @staticmethod
+    def get_random_regions(seed):
+        # Return random regions of every contig along with whole contigs, overlapping regions, and a missing contig
+        rand = random.Random(seed)
+        regions = ["chr2", "chr3:1-100000", "chr10:5000", "chr1:100-200"]
+        for chrom in ["chr1", "chr2", "chr10", "chrX"]:
+            for _ in range(3):
+                start = rand.randint(1, 17000)
+                regions.append("%s:%d-%d" % (chrom, start, start + rand.choice([0, 5, 50, 500, 4000])))
+        return [regions[:1], regions[1:4], regions[4:10], regions]
+
+    def scan_regions(self, region_strings):
+        # Return the header and rows of the recoded file overlapping a list of regions
+        regions = [VCFHelper.parse_region(x) for x in region_strings]
+        rows = []
+        for row in self.rows:
+            fields = row.split("\t", 4)
+            pos, end = int(fields[1]), int(fields[1]) + len(fields[3]) - 1
+            if any([fields[0] == chrom and pos <= region_end and end >= start for chrom, start, region_end in regions]):
+                rows.append(row)
+        return self.header + "".join(rows)
+
+    def query(self, recoded_file, region_strings, *args, **kwargs):
+        region_args = []
+        for region in region_strings:
+            region_args += ["--region", region]
+        return self.run_script("QueryRecodedVCF.py", "-i", recoded_file, "--output", "-", *(region_args + list(args)),
+                               **kwargs)
+
+    def test_query(self):
+        for out_name, recode_args in [("indexed.tsv", []), ("indexed.tsv.gz", []), ("indexed_threads.tsv", ["--threads", 3]),
+                                      ("indexed_threads.tsv.gz", ["--threads", 3])]:
+            recoded_file = self.get_tmp_file(out_name)
+            self.run_script("RecodeVCF.py", "--vcf", self.get_data_file("snpeff.vcf"), "--output", recoded_file, "--index",
+                            *recode_args)
+            self.assertEqual(self.read_text(recoded_file), self.header + "".join(self.rows))
+            for region_strings in self.get_random_regions(1):
+                self.assertEqual(self.query(recoded_file, region_strings), self.scan_regions(region_strings))
+
+    def test_query_small_bins(self):
+        # Index a plain recoded file with small bins so records and regions span many bins
+        recoded_file = self.get_tmp_file("recoded.tsv")
+        index_file = self.get_tmp_file("recoded.small.rvi")
+        index = RecodedVCFIndex(bin_size=64)
+        offset = len(self.header)
+        for row in self.rows:
+            fields = row.split("\t", 4)
+            index.add_record(fields[0], int(fields[1]), int(fields[1]) + len(fields[3]) - 1, offset)
+            offset += len(row)
+        index.save(index_file, recoded_file)
+
+        for seed in range(3):
+            for region_strings in self.get_random_regions(seed):
+                self.assertEqual(self.query(recoded_file, region_strings, "--index", index_file),
+                                 self.scan_regions(region_strings))
+
+    def test_query_bed(self):
+        recoded_file = self.get_tmp_file("indexed.tsv.gz")
+        self.run_script("RecodeVCF.py", "--vcf", self.get_data_file("snpeff.vcf"), "--output", recoded_file, "--index")
+        bed_file = self.get_tmp_file("regions.bed")
+        with open(bed_file, "w") as fh:
+            fh.write("chr1\t999\t5000\nchrX\t12000\t12001\n")
+        out = self.run_script("QueryRecodedVCF.py", "-i", recoded_file, "--output", "-", "--bed", bed_file,
+                              "--region", "chr2:3000-4000")
+        self.assertEqual(out, self.scan_regions(["chr1:1000-5000", "chr2:3000-4000", "chrX:12001-12001"]))
+
+    def test_query_stale_index(self):
+        # Queries fail if the recoded file changed after it was indexed
+        recoded_file = self.get_tmp_file("indexed.tsv")
+        self.run_script("RecodeVCF.py", "--vcf", self.get_data_file("snpeff.vcf"), "--output", recoded_file, "--index")
+        with open(recoded_file, "a") as fh:
+            fh.write(self.rows[-1])
+        self.query(recoded_file, ["chr1"], expect_error=True)
@@ -0,0 +1,68 @@
+from ScriptTestCase import ScriptTestCase
+from VCF import BGZFWriter
+
+class RecodedVCFConcatenatorTest(ScriptTestCase):
+    # Tests that concatenating shards of a recoded file with CatRecodedVCF gives back the whole file
+
+    def setUp(self):
+        ScriptTestCase.setUp(self)
+
+        # Header and rows of the whole recoded file
+        self.recoded_file = self.get_tmp_file("recoded.tsv")
+        self.run_script("RecodeVCF.py", "--vcf", self.get_data_file("snpeff.vcf"), "--output", self.recoded_file)
+        lines = self.read_file(self.recoded_file).splitlines(True)
+        self.header = lines[0]
+        self.rows = lines[1:]
+
+    def write_shard(self, name, rows, legacy=False):
+        # Write the header and a list of rows to a shard file, which is BGZF compressed if its name ends with '.gz'
+        # Legacy shards have a blank line after every row, like files recoded before raw sample columns were passed through
+        path = self.get_tmp_file(name)
+        data = self.header + "".join(["%s\n" % x for x in rows] if legacy else rows)
+        fh = BGZFWriter(path) if name.endswith(".gz") else open(path, "w")
+        fh.write(data)
+        fh.close()
+        return path
+
+    def test_concat(self):
+        shards = [self.write_shard("shard_0.tsv", self.rows[:50]),
+                  self.write_shard("shard_1.tsv.gz", self.rows[50:51]),
+                  self.write_shard("shard_2.tsv", []),
+                  self.write_shard("shard_3.tsv", self.rows[51:])]
+        for out_name in ["out.tsv", "out.tsv.gz"]:
+            out_file = self.get_tmp_file(out_name)
+            self.run_script("CatRecodedVCF.py", "-i", *(shards + ["--output", out_file]))
+            self.assertEqual(self.read_text(out_file), self.read_file(self.recoded_file))
+
+    def test_concat_legacy_blank_lines(self):
+        # Blank lines are dropped instead of failing the column count check
+        shards = [self.write_shard("shard_0.tsv", self.rows[:100], legacy=True),
+                  self.write_shard("shard_1.tsv.gz", self.rows[100:], legacy=True)]
+        out = self.run_script("CatRecodedVCF.py", "-i", *(shards + ["--output", "-"]))
+        self.assertEqual(out, self.read_file(self.recoded_file))
+
+    def test_concat_different_columns(self):
+        shards = [self.write_shard("shard_0.tsv", self.rows[:100]),
+                  self.write_shard("shard_1.tsv", [x.replace("\t", "\t.\t", 1) for x in self.rows[100:]])]
+        self.run_script("CatRecodedVCF.py", "-i", *(shards + ["--output", self.get_tmp_file("out.tsv")]), expect_error=True)
+
+    def test_sorted_merge(self):
+        # Overlapping shards given out of order are merged into the whole file and duplicate records are written once
+        shards = [self.write_shard("shard_2.tsv", self.rows[150:]),
+                  self.write_shard("shard_0.tsv.gz", self.rows[:80]),
+                  self.write_shard("shard_1.tsv", self.rows[70:160], legacy=True)]
+        out = self.run_script("CatRecodedVCF.py", "-i", *(shards + ["--output", "-", "--sorted-merge"]))
+        self.assertEqual(out, self.read_file(self.recoded_file))
+
+    def test_sorted_merge_contig_order(self):
+        contig_order = ["chrX", "chr10", "chr2", "chr1"]
+        contig_rows = dict([(x, [y for y in self.rows if y.startswith(x + "\t")]) for x in contig_order])
+        shards = [self.write_shard("shard_%d.tsv" % i, contig_rows[x]) for i, x in enumerate(["chr1", "chr2", "chr10", "chrX"])]
+        out = self.run_script("CatRecodedVCF.py", "-i", *(shards + ["--output", "-", "--sorted-merge",
+                                                                    "--contig-order", ",".join(contig_order)]))
+        self.assertEqual(out, self.header + "".join([y for x in contig_order for y in contig_rows[x]]))
+
+    def test_sorted_merge_unsorted(self):
+        shards = [self.write_shard("shard_0.tsv", self.rows[:100]),
+                  self.write_shard("shard_1.tsv", self.rows[100:][::-1])]
+        self.run_script("CatRecodedVCF.py", "-i", *(shards + ["--output", "-", "--sorted-merge"]), expect_error=True)
@@ -0,0 +1,82 @@
+from ScriptTestCase import ScriptTestCase
+from RecodeVCF import RecodedVCFJoiner
+
+class RecodedVCFJoinerTest(ScriptTestCase):
+    # Tests that joining recoded files of different samples with CatRecodedVCF --join gives the file recoded with every
+    # sample, with missing values filled in for samples of files that don't contain a variant
+
+    SAMPLES = [["S0", "S1"], ["S2", "S3"]]
+
+    def recode(self, name, *args):
+        # Recode the SnpEff fixture and return its header and rows
+        out_file = self.get_tmp_file(name)
+        self.run_script("RecodeVCF.py", "--vcf", self.get_data_file("snpeff.vcf"), "--output", out_file, *args)
+        lines = self.read_file(out_file).splitlines(True)
+        return lines[0], lines[1:]
+
+    def write_file(self, name, header, rows, legacy=False):
+        # Write a recoded file. Legacy files have a blank line after every row.
+        path = self.get_tmp_file(name)
+        with open(path, "w") as fh:
+            fh.write(header + "".join(["%s\n" % x for x in rows] if legacy else rows))
+        return path
+
+    def fill_missing(self, row, missing_samples, missing_gt_char):
+        # Fill in the genotype, depth, and raw sample columns of samples missing from a row of the fully recoded file
+        cols = row.rstrip("\n").split("\t")
+        all_samples = sum(self.SAMPLES, [])
+        num_samples = len(all_samples)
+        first_sample = len(cols) - 3*num_samples - 1
+        for sample in missing_samples:
+            i = all_samples.index(sample)
+            cols[first_sample + i] = missing_gt_char
+            cols[first_sample + num_samples + i] = "0"
+            cols[first_sample + 2*num_samples + 1 + i] = RecodedVCFJoiner.MISSING_SAMPLE
+        return "\t".join(cols) + "\n"
+
+    def assertJoined(self, legacy=False, missing_gt_char="NA"):
+        full_header, full_rows = self.recode("full.tsv")
+        header_0, rows_0 = self.recode("samples_0.tsv", "--samples", ",".join(self.SAMPLES[0]))
+        header_1, rows_1 = self.recode("samples_1.tsv", "--samples", ",".join(self.SAMPLES[1]))
+
+        # Drop some variants from each file, keeping every variant in at least one file
+        only_0 = [i for i in range(len(full_rows)) if i % 5 == 0]
+        only_1 = [i for i in range(len(full_rows)) if i % 7 == 3 and i % 5 != 0]
+        input_files = [self.write_file("in_0.tsv", header_0, [x for i, x in enumerate(rows_0) if i not in only_1], legacy),
+                       self.write_file("in_1.tsv", header_1, [x for i, x in enumerate(rows_1) if i not in only_0], legacy)]
+
+        expected_rows = []
+        for i, row in enumerate(full_rows):
+            if i in only_0:
+                row = self.fill_missing(row, self.SAMPLES[1], missing_gt_char)
+            elif i in only_1:
+                row = self.fill_missing(row, self.SAMPLES[0], missing_gt_char)
+            expected_rows.append(row)
+
+        # Sorted files are joined in position order
+        join_args = ["--output", "-", "--join", "--missing-gt-char", missing_gt_char]
+        out = self.run_script("CatRecodedVCF.py", "-i", *(input_files + join_args + ["--sorted-merge"]))
+        self.assertEqual(out, full_header + "".join(expected_rows))
+
+        # Otherwise variants of the first file are followed by variants only in the second file
+        out = self.run_script("CatRecodedVCF.py", "-i", *(input_files + join_args))
+        self.assertEqual(out, full_header + "".join([x for i, x in enumerate(expected_rows) if i not in only_1] +
+                                                    [expected_rows[i] for i in only_1]))
+
+    def test_join(self):
+        self.assertJoined()
+
+    def test_join_missing_gt_char(self):
+        self.assertJoined(missing_gt_char="-9")
+
+    def test_join_legacy_blank_lines(self):
+        self.assertJoined(legacy=True)
+
+    def test_join_duplicate_samples(self):
+        header, rows = self.recode("samples.tsv", "--samples", "S0,S1")
+        input_files = [self.write_file("in_0.tsv", header, rows), self.write_file("in_1.tsv", header, rows)]
+        self.run_script("CatRecodedVCF.py", "-i", *(input_files + ["--output", "-", "--join"]), expect_error=True)
+
+    def test_reformat_samples(self):
+        self.assertEqual(RecodedVCFJoiner.reformat_samples(["0/1:3,4:7", "./.:.:."], "GT:AD:DP", "GT:DP:GQ"),
+                         ["0/1:7:.", "./.:.:."])
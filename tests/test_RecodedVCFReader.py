@@ -0,0 +1,150 @@
+import zipfile
+import numpy as np
+
+from ScriptTestCase import ScriptTestCase
+from RecodeVCF import RecodedVCFReader
+
+class RecodedVCFReaderTest(ScriptTestCase):
+    # Tests that RecodedVCFReader returns the same arrays for every recoded file format
+
+    def recode(self, out_name, *args, **kwargs):
+        # Recode the SnpEff fixture, or another VCF, and return the path of the output
+        out_file = self.get_tmp_file(out_name)
+        vcf_file = kwargs.get("vcf_file", self.get_data_file("snpeff.vcf"))
+        self.run_script("RecodeVCF.py", "--vcf", vcf_file, "--output", out_file, *args)
+        return out_file
+
+    def write_float_depth_vcf(self):
+        # Write a copy of the SnpEff fixture with Float allelic depths (which depths are summed from) and a depth that
+        # isn't a whole number
+        vcf_file = self.get_tmp_file("float_depth.vcf")
+        lines = self.read_text(self.get_data_file("snpeff.vcf")).split("\n")
+        for i, line in enumerate(lines):
+            if line.startswith("##FORMAT=<ID=AD,"):
+                lines[i] = line.replace("Type=Integer", "Type=Float")
+            elif line.startswith("chr1\t1227\t"):
+                lines[i] = line.replace("0/1:14,8:22:", "0/1:14,8.5:22:", 1)
+        with open(vcf_file, "w") as fh:
+            fh.write("\n".join(lines))
+        return vcf_file
+
+    @staticmethod
+    def read_all(path, **kwargs):
+        # Read every chunk of a recoded file and return the reader along with the chunks' concatenated genotypes,
+        # depths, and variant columns
+        reader = RecodedVCFReader(path, chunk_size=70, **kwargs)
+        chunks = list(reader)
+        genotypes = np.concatenate([x.genotypes for x in chunks])
+        depths = np.concatenate([x.depths for x in chunks])
+        variants = dict([(x, []) for x in reader.columns])
+        for chunk in chunks:
+            for column in reader.columns:
+                variants[column] += list(chunk.variants[column])
+        return reader, genotypes, depths, variants
+
+    def assertVariantsEqual(self, variants1, variants2):
+        # Assert the variant columns read from two files are equal. POS and QUAL are arrays, which may contain NaN.
+        self.assertEqual(sorted(variants1.keys()), sorted(variants2.keys()))
+        for column in variants1:
+            if column in ["POS", "QUAL"]:
+                np.testing.assert_array_equal(variants1[column], variants2[column])
+            else:
+                self.assertEqual(variants1[column], variants2[column], "Values of %s differ!" % column)
+
+    def test_parquet_matches_tsv(self):
+        # Missing values of tab-delimited files are read like the nulls of Parquet files, and depths have the same type
+        info_args = ["--info-columns", "NOTE"]
+        kwargs = {"columns": ["CHROM", "POS", "ID", "QUAL", "FILTER", "NOTE"],
+                  "categorical_columns": ["CHROM", "ID"]}
+        tsv_reader, genotypes, depths, variants = self.read_all(self.recode("dense.tsv", *info_args), **kwargs)
+        parquet_reader, parquet_genotypes, parquet_depths, parquet_variants = \
+            self.read_all(self.recode("dense.parquet", "--format", "parquet", *info_args), **kwargs)
+
+        np.testing.assert_array_equal(parquet_genotypes, genotypes)
+        np.testing.assert_array_equal(parquet_depths, depths)
+        self.assertEqual(depths.dtype, np.int32)
+        self.assertEqual(parquet_depths.dtype, np.int32)
+        self.assertEqual(tsv_reader.schema.depth_dtype, parquet_reader.schema.depth_dtype)
+        self.assertVariantsEqual(parquet_variants, variants)
+        self.assertEqual([tsv_reader.categories["ID"][x] if x >= 0 else None for x in variants["ID"]],
+                         [parquet_reader.categories["ID"][x] if x >= 0 else None for x in parquet_variants["ID"]])
+
+        # Fixture has records without an ID or NOTE, which are missing rather than the placeholder
+        self.assertIn(-1, variants["ID"])
+        self.assertIn(None, variants["NOTE"])
+        self.assertNotIn(".", variants["NOTE"])
+        self.assertNotIn(".", tsv_reader.categories["ID"])
+
+    def test_missing_data_char(self):
+        # Placeholders other than '.' are read as missing values when the reader is given the placeholder
+        out_file = self.recode("dense.tsv", "--info-columns", "NOTE", "--missing-data-char", "NA")
+        _, _, _, variants = self.read_all(out_file, columns=["NOTE"], missing_data_char="NA")
+        _, _, _, expected_variants = self.read_all(self.recode("default.tsv", "--info-columns", "NOTE"), columns=["NOTE"])
+        self.assertIn(None, variants["NOTE"])
+        self.assertEqual(variants, expected_variants)
+
+    def test_legacy_blank_lines(self):
+        # Blank lines after every record of files recoded before raw sample columns were passed through are skipped
+        out_file = self.recode("dense.tsv")
+        legacy_file = self.get_tmp_file("legacy.tsv")
+        lines = self.read_text(out_file).split("\n")
+        with open(legacy_file, "w") as fh:
+            fh.write("\n".join([lines[0]] + ["%s\n" % x for x in lines[1:] if x != ""]))
+        _, genotypes, depths, variants = self.read_all(out_file)
+        _, legacy_genotypes, legacy_depths, legacy_variants = self.read_all(legacy_file)
+        np.testing.assert_array_equal(legacy_genotypes, genotypes)
+        np.testing.assert_array_equal(legacy_depths, depths)
+        self.assertVariantsEqual(legacy_variants, variants)
+
+    def test_depth_dtype(self):
+        # Depths of every chunk have the schema's type, even chunks whose depths are all whole numbers
+        vcf_file = self.write_float_depth_vcf()
+        tsv_file = self.recode("float.tsv", vcf_file=vcf_file)
+        parquet_file = self.recode("float.parquet", "--format", "parquet", vcf_file=vcf_file)
+        sparse_file = self.recode("float.npz", "--genotype-matrix", "sparse", vcf_file=vcf_file)
+
+        reader = RecodedVCFReader(tsv_file, chunk_size=70, depth_dtype=np.float64)
+        self.assertEqual([x.depths.dtype for x in reader], [np.dtype(np.float64)] * 4)
+        for path in [parquet_file, sparse_file]:
+            reader = RecodedVCFReader(path, chunk_size=70)
+            self.assertEqual(reader.schema.depth_dtype, np.float64)
+            self.assertTrue(all(x.depths.dtype == np.float64 for x in reader))
+
+        _, _, depths, _ = self.read_all(tsv_file, depth_dtype=np.float64)
+        _, _, parquet_depths, _ = self.read_all(parquet_file)
+        np.testing.assert_array_equal(parquet_depths, depths)
+        self.assertEqual(depths[0, 0], 22.5)
+
+        # Depths that aren't integers can't be read as integers
+        with self.assertRaises(IOError):
+            self.read_all(tsv_file)
+
+    def test_sparse_matrix(self):
+        # Genotypes a sparse matrix doesn't store (homozygous REF and missing) are NaN with a depth of 0
+        _, genotypes, depths, variants = self.read_all(self.recode("dense.tsv"))
+        stored = ~np.isnan(genotypes) & ~np.signbit(genotypes)
+        expected_genotypes = np.where(stored, genotypes.astype(np.float32), np.nan)
+        expected_depths = np.where(stored, depths, 0)
+
+        for out_name, args in [("compressed.npz", []), ("uncompressed.npz", ["--uncompressed-matrix"])]:
+            out_file = self.recode(out_name, "--genotype-matrix", "sparse", *args)
+            with zipfile.ZipFile(out_file) as zip_fh:
+                compress_types = set([x.compress_type for x in zip_fh.infolist()])
+            self.assertEqual(compress_types, set([zipfile.ZIP_STORED if args else zipfile.ZIP_DEFLATED]))
+
+            for memory_map in [True, False]:
+                _, sparse_genotypes, sparse_depths, sparse_variants = self.read_all(out_file, memory_map=memory_map)
+                np.testing.assert_array_equal(sparse_genotypes, expected_genotypes)
+                np.testing.assert_array_equal(sparse_depths, expected_depths)
+                self.assertEqual(sparse_depths.dtype, depths.dtype)
+                self.assertVariantsEqual(sparse_variants, variants)
+
+    def test_sparse_matrix_memory_map(self):
+        # Arrays of uncompressed matrices are memory mapped instead of read into memory
+        out_file = self.recode("uncompressed.npz", "--genotype-matrix", "sparse", "--uncompressed-matrix")
+        reader = RecodedVCFReader(out_file)
+        with np.load(out_file) as npz:
+            for name in ["data", "indices", "indptr", "depths"]:
+                array = reader._RecodedVCFReader__load_npz_array(npz, name)
+                self.assertIsInstance(array, np.memmap)
+                np.testing.assert_array_equal(array, npz[name])
@@ -0,0 +1,20 @@
+import os
+
+from ScriptTestCase import ScriptTestCase
+
+class SparseGenotypeWriterTest(ScriptTestCase):
+    # Tests of the files written by --genotype-matrix sparse
+
+    def test_failed_recode_cleanup(self):
+        # Temporary arrays and the variant table are removed when recoding fails partway through the VCF
+        vcf_file = self.write_multiallelic_vcf("snpeff.vcf")
+        self.run_script("RecodeVCF.py", "--vcf", vcf_file, "--output", self.get_tmp_file("out.npz"),
+                        "--genotype-matrix", "sparse", expect_error=True)
+        self.assertEqual(os.listdir(self.tmp_dir), [os.path.basename(vcf_file)])
+
+    def test_files(self):
+        # Successful runs leave only the matrix and its variant table
+        out_file = self.get_tmp_file("out.npz")
+        self.run_script("RecodeVCF.py", "--vcf", self.get_data_file("snpeff.vcf"), "--output", out_file,
+                        "--genotype-matrix", "sparse")
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)), ["out.npz", "out.variants.tsv"])
@@ -0,0 +1,53 @@
+import os
+
+from ScriptTestCase import ScriptTestCase
+from VCF import VCFHelper
+from RecodeVCF import VCFRecoder, BatchGenotypeRecoder, TransposedRecodeWriter
+
+class TransposedRecodeWriterTest(ScriptTestCase):
+    # Tests that sample-major output written with --transpose is the transpose of the recoded genotypes of dense output
+
+    def get_expected_output(self, vcf_file, *args):
+        # Recode a VCF to dense output and return the lines of its transposed genotype columns
+        lines = self.run_script("RecodeVCF.py", "--vcf", vcf_file, "--output", "-", *args).rstrip("\n").split("\n")
+        header = lines[0].split("\t")
+        num_samples = len(header) - header.index("FORMAT") - 1
+        genotype_start = header.index("FORMAT") - 2*num_samples
+        rows = [x.split("\t") for x in lines[1:]]
+        columns = [["SAMPLE"] + [":".join(row[x] for x in [0, 1, 3, 4]) for row in rows]]
+        for i in range(genotype_start, genotype_start + num_samples):
+            columns.append([header[i]] + [row[i] for row in rows])
+        return ["\t".join(x) for x in columns]
+
+    def test_transpose(self):
+        for vcf_name in ["snpeff.vcf", "annovar.vcf", "mutect.vcf"]:
+            vcf_file = self.get_data_file(vcf_name)
+            out_file = self.get_tmp_file("out.tsv")
+            self.run_script("RecodeVCF.py", "--vcf", vcf_file, "--output", out_file, "--transpose")
+            self.assertEqual(self.read_text(out_file).rstrip("\n").split("\n"), self.get_expected_output(vcf_file))
+
+    def test_transpose_spills(self):
+        # Genotypes are spilled after every block and spill files are merged in several passes
+        block_size = BatchGenotypeRecoder.BLOCK_SIZE
+        max_open_spills = TransposedRecodeWriter.MAX_OPEN_SPILLS
+        BatchGenotypeRecoder.BLOCK_SIZE = 16
+        TransposedRecodeWriter.MAX_OPEN_SPILLS = 3
+        try:
+            for vcf_name, out_name in [("snpeff.vcf", "out.tsv"), ("mutect.vcf", "out.tsv.gz")]:
+                vcf_file = self.get_data_file(vcf_name)
+                out_file = self.get_tmp_file(out_name)
+                vcf_recoder = VCFRecoder(VCFHelper.get_vcf_parser(vcf_file), vcf_file, out_file, transpose=True,
+                                         max_memory=1)
+                vcf_recoder.recode_vcf()
+                self.assertEqual(self.read_text(out_file).rstrip("\n").split("\n"), self.get_expected_output(vcf_file))
+        finally:
+            BatchGenotypeRecoder.BLOCK_SIZE = block_size
+            TransposedRecodeWriter.MAX_OPEN_SPILLS = max_open_spills
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)), ["out.tsv", "out.tsv.gz"])
+
+    def test_failed_recode_cleanup(self):
+        # Spill files and the unwritten output are removed when recoding fails partway through the VCF
+        vcf_file = self.write_multiallelic_vcf("annovar.vcf")
+        self.run_script("RecodeVCF.py", "--vcf", vcf_file, "--output", self.get_tmp_file("out.tsv"), "--transpose",
+                        "--max-memory", 0, expect_error=True)
+        self.assertEqual(os.listdir(self.tmp_dir), [os.path.basename(vcf_file)])
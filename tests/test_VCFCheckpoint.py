@@ -0,0 +1,79 @@
+import os
+
+from ScriptTestCase import ScriptTestCase
+from VCF import VCFHelper, VCFCheckpoint
+from RecodeVCF import VCFRecoder, BatchGenotypeRecoder
+from SummarizeVCF import VCFSummarizer
+
+class VCFCheckpointTest(ScriptTestCase):
+    # Tests that runs resumed from a checkpoint give the same output as uninterrupted runs
+    # Runs are interrupted by raising KeyboardInterrupt from the VCF parser after a number of records
+
+    # Records processed between checkpoints and before runs are interrupted
+    INTERVAL = 40
+    INTERRUPT_AFTER = 120
+
+    @staticmethod
+    def interrupt_after(vcf_parser, num_records):
+        # Generate records of a VCF parser and raise KeyboardInterrupt after a number of records
+        for i, record in enumerate(vcf_parser):
+            if i == num_records:
+                raise KeyboardInterrupt
+            yield record
+
+    def recode_interrupted(self, vcf_file, out_file, checkpoint_file):
+        # Recode a VCF until it's interrupted, leaving a checkpoint and a partially written output file
+        # Blocks are made smaller than the checkpoint interval so rows written after the last checkpoint are discarded
+        checkpoint = VCFCheckpoint(checkpoint_file, vcf_file, interval=self.INTERVAL)
+        vcf_recoder = VCFRecoder(VCFHelper.get_vcf_parser(vcf_file, checkpoint=checkpoint), vcf_file, out_file,
+                                 checkpoint=checkpoint)
+        vcf_recoder.parser = self.interrupt_after(vcf_recoder.parser, self.INTERRUPT_AFTER)
+        block_size = BatchGenotypeRecoder.BLOCK_SIZE
+        BatchGenotypeRecoder.BLOCK_SIZE = 16
+        try:
+            self.assertRaises(KeyboardInterrupt, vcf_recoder.recode_vcf)
+        finally:
+            BatchGenotypeRecoder.BLOCK_SIZE = block_size
+
+    def test_recode_resume(self):
+        for vcf_name, out_name in [("snpeff.vcf", "out.tsv"), ("annovar.vcf.gz", "out.tsv"), ("mutect.vcf", "out.tsv.gz")]:
+            vcf_file = self.get_data_file(vcf_name)
+            expected_out = self.get_tmp_file("expected_" + out_name)
+            resumed_out = self.get_tmp_file(out_name)
+            checkpoint_file = self.get_tmp_file("recode.ckpt")
+            self.run_script("RecodeVCF.py", "--vcf", vcf_file, "--output", expected_out)
+
+            self.recode_interrupted(vcf_file, resumed_out, checkpoint_file)
+            self.assertTrue(os.path.exists(checkpoint_file))
+            partial_size = os.path.getsize(resumed_out)
+
+            self.run_script("RecodeVCF.py", "--vcf", vcf_file, "--output", resumed_out,
+                            "--checkpoint", checkpoint_file, "--resume")
+            self.assertLess(partial_size, os.path.getsize(resumed_out))
+            self.assertFalse(os.path.exists(checkpoint_file))
+            self.assertEqual(self.read_text(expected_out), self.read_text(resumed_out))
+
+    def test_summarize_resume(self):
+        for summary_type, vcf_name in [("Multisample", "snpeff.vcf"), ("Multisample", "annovar.vcf.gz"), ("Mutect", "mutect.vcf")]:
+            vcf_file = self.get_data_file(vcf_name)
+            checkpoint_file = self.get_tmp_file("summary.ckpt")
+            expected = self.run_script("SummarizeVCF.py", summary_type, "--vcf", vcf_file)
+
+            checkpoint = VCFCheckpoint(checkpoint_file, vcf_file, interval=self.INTERVAL)
+            summarizer = VCFSummarizer(vcf_file, summary_type, -1, checkpoint=checkpoint)
+            summarizer.vcf_parser = self.interrupt_after(summarizer.vcf_parser, self.INTERRUPT_AFTER + 10)
+            self.assertRaises(KeyboardInterrupt, summarizer.summarize)
+            self.assertTrue(os.path.exists(checkpoint_file))
+
+            resumed = self.run_script("SummarizeVCF.py", summary_type, "--vcf", vcf_file,
+                                      "--checkpoint", checkpoint_file, "--resume")
+            self.assertFalse(os.path.exists(checkpoint_file))
+            self.assertEqual(expected, resumed)
+
+    def test_resume_without_checkpoint(self):
+        # Resuming without a saved checkpoint starts from the first record
+        vcf_file = self.get_data_file("snpeff.vcf")
+        expected = self.run_script("SummarizeVCF.py", "Multisample", "--vcf", vcf_file)
+        resumed = self.run_script("SummarizeVCF.py", "Multisample", "--vcf", vcf_file,
+                                  "--checkpoint", self.get_tmp_file("missing.ckpt"), "--resume")
+        self.assertEqual(expected, resumed)
@@ -0,0 +1,113 @@
+from collections import OrderedDict
+
+from ScriptTestCase import ScriptTestCase
+from VCF import VCFHelper
+
+class VCFRegionsTest(ScriptTestCase):
+    # Tests reading gzip/BGZF compressed VCFs and querying regions with tabix (.tbi) and CSI (.csi) indices
+    # Region queries are checked against records selected by scanning every line of the plain text VCF
+
+    REGIONS = [["chr2:5000-9000"],
+               ["chrX", "chr1:20000-30000", "chr1:25000-40000", "chr10:1-1"],
+               ["chr1:1-2000", "chr2:7981", "chr10:14000-15000", "chr10:12000-12100"]]
+
+    # Regions of sv.vcf overlapping only the END of structural variants, and regions past their END
+    SV_REGIONS = [["chr1:140000-140050"],
+                  ["chr1:5120-5140", "chr1:30500", "chr2:800-850"],
+                  ["chr1:150001-150050", "chr2:901-1000"]]
+
+    def write_region_vcf(self, vcf_name, region_strings):
+        # Write the header and records overlapping a list of regions of a plain text VCF to a temporary VCF
+        # Contigs are written in the order they're first listed and records are kept in file order within each contig
+        contig_regions = OrderedDict()
+        for chrom, start, end in [VCFHelper.parse_region(x) for x in region_strings]:
+            contig_regions.setdefault(chrom, []).append((start, end))
+
+        header, contig_lines = [], OrderedDict([(x, []) for x in contig_regions])
+        with open(self.get_data_file(vcf_name), "r") as vcf_fh:
+            for line in vcf_fh:
+                if line.startswith("#"):
+                    header.append(line)
+                    continue
+                fields = line.split("\t")
+                pos, ref = int(fields[1]), fields[3]
+                # Records with an INFO/END field end at END
+                info_end = [x for x in fields[7].split(";") if x.startswith("END=")]
+                record_end = int(info_end[0][4:]) if len(info_end) != 0 else pos + len(ref) - 1
+                for start, end in contig_regions.get(fields[0], []):
+                    if pos <= end and record_end >= start:
+                        contig_lines[fields[0]].append(line)
+                        break
+
+        region_vcf = self.get_tmp_file("regions.vcf")
+        with open(region_vcf, "w") as out_fh:
+            out_fh.write("".join(header))
+            for lines in contig_lines.values():
+                out_fh.write("".join(lines))
+        return region_vcf
+
+    @staticmethod
+    def get_region_args(region_strings):
+        args = []
+        for region in region_strings:
+            args += ["--region", region]
+        return args
+
+    def assertRecodeRegions(self, vcf_name, region_strings, *args):
+        # Assert recoding regions of an indexed VCF gives the same output as recoding the records found by a linear scan
+        expected_out = self.get_tmp_file("expected.tsv")
+        region_out = self.get_tmp_file("regions.tsv")
+        self.run_script("RecodeVCF.py", "--vcf", self.write_region_vcf(vcf_name, region_strings), "--output", expected_out)
+        self.run_script("RecodeVCF.py", "--vcf", self.get_data_file(vcf_name + ".gz"), "--output", region_out,
+                        *(self.get_region_args(region_strings) + list(args)))
+        self.assertGreater(len(self.read_file(expected_out).splitlines()), 1)
+        self.assertFilesEqual(expected_out, region_out)
+
+    def test_recode_compressed(self):
+        # BGZF and plain gzip compressed VCFs are recoded like the plain text VCF
+        for vcf_name in ["snpeff.vcf", "annovar.vcf", "mutect.vcf"]:
+            expected_out = self.get_tmp_file("expected.tsv")
+            gz_out = self.get_tmp_file("gz.tsv")
+            self.run_script("RecodeVCF.py", "--vcf", self.get_data_file(vcf_name), "--output", expected_out)
+            self.run_script("RecodeVCF.py", "--vcf", self.get_data_file(vcf_name + ".gz"), "--output", gz_out)
+            self.assertFilesEqual(expected_out, gz_out)
+
+    def test_recode_compressed_threads(self):
+        # BGZF compressed VCFs are sharded at block boundaries and plain gzip VCFs are recoded as a single shard
+        for vcf_name in ["snpeff.vcf", "mutect.vcf"]:
+            expected_out = self.get_tmp_file("expected.tsv")
+            gz_out = self.get_tmp_file("gz.tsv")
+            self.run_script("RecodeVCF.py", "--vcf", self.get_data_file(vcf_name), "--output", expected_out)
+            self.run_script("RecodeVCF.py", "--vcf", self.get_data_file(vcf_name + ".gz"), "--output", gz_out, "--threads", 3)
+            self.assertFilesEqual(expected_out, gz_out)
+
+    def test_recode_tabix_regions(self):
+        for region_strings in self.REGIONS:
+            self.assertRecodeRegions("snpeff.vcf", region_strings)
+
+    def test_recode_csi_regions(self):
+        for region_strings in self.REGIONS:
+            self.assertRecodeRegions("annovar.vcf", region_strings)
+
+    def test_recode_sv_regions(self):
+        # Structural variants overlap regions between their POS and INFO/END, including regions in later BGZF blocks
+        for region_strings in self.SV_REGIONS:
+            self.assertRecodeRegions("sv.vcf", region_strings)
+
+    def test_recode_regions_threads(self):
+        self.assertRecodeRegions("snpeff.vcf", self.REGIONS[1], "--threads", 3)
+        self.assertRecodeRegions("annovar.vcf", self.REGIONS[2], "--threads", 3, "--fast-reader")
+
+    def test_summarize_regions(self):
+        for vcf_name in ["snpeff.vcf", "annovar.vcf"]:
+            for region_strings in self.REGIONS:
+                expected = self.run_script("SummarizeVCF.py", "Multisample",
+                                           "--vcf", self.write_region_vcf(vcf_name, region_strings))
+                summary = self.run_script("SummarizeVCF.py", "Multisample", "--vcf", self.get_data_file(vcf_name + ".gz"),
+                                          *self.get_region_args(region_strings))
+                self.assertEqual(expected, summary)
+
+    def test_unindexed_regions(self):
+        # Region queries require an index
+        self.run_script("RecodeVCF.py", "--vcf", self.get_data_file("mutect.vcf.gz"), "--output", self.get_tmp_file("out.tsv"),
+                        "--region", "chr1", expect_error=True)
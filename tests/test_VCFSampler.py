@@ -0,0 +1,72 @@
+from ScriptTestCase import ScriptTestCase
+from VCF import VCFSampler
+from SummarizeVCF import VCFSummarizer, SamplingReport
+
+class VCFSamplerTest(ScriptTestCase):
+    # Tests that summaries of randomly sampled chunks match the full summary when every chunk is sampled and that
+    # confidence intervals are only reported when enough chunks were sampled
+
+    @staticmethod
+    def split_sampling(summary):
+        # Split a summary printed by SummarizeVCF.py into the summary and its SAMPLING section
+        summary, sampling = summary.split("#SAMPLING\n")
+        return summary.rstrip("\n"), sampling.rstrip("\n").split("\n")
+
+    def get_bounds(self, sampling):
+        # Return the lower and upper bounds of every ratio of every sample row of a SAMPLING section
+        bounds = []
+        for row in sampling[5:]:
+            values = row.split("\t")[1:]
+            bounds += [values[i+1:i+3] for i in range(0, len(values), 3)]
+        self.assertEqual(len(bounds), 4 * len(SamplingReport.RATIOS))
+        return bounds
+
+    def test_full_fraction(self):
+        # Sampling every chunk reproduces the full summary
+        for summary_type, vcf_name in [("Multisample", "snpeff.vcf"), ("Multisample", "snpeff.vcf.gz"),
+                                       ("Multisample", "annovar.vcf.gz"), ("Mutect", "mutect.vcf")]:
+            vcf_file = self.get_data_file(vcf_name)
+            expected = self.run_script("SummarizeVCF.py", summary_type, "--vcf", vcf_file)
+            summary, sampling = self.split_sampling(self.run_script("SummarizeVCF.py", summary_type, "--vcf", vcf_file,
+                                                                    "--sample-fraction", "1.0", "--seed", 1))
+            self.assertEqual(expected.rstrip("\n"), summary)
+            self.assertEqual(sampling[2], "##Sampled_Records=240")
+            self.assertEqual(sampling[3], "##Scale_Factor=1.000000")
+
+            # Ratios are exact, so both bounds equal the estimate
+            for row in sampling[5:]:
+                values = row.split("\t")[1:]
+                for i in range(0, len(values), 3):
+                    self.assertEqual(values[i:i+3], [values[i]] * 3)
+
+    def test_few_chunks(self):
+        # Intervals aren't reported when fewer than MIN_CHUNKS chunks were sampled
+        summary = self.run_script("SummarizeVCF.py", "Multisample", "--vcf", self.get_data_file("snpeff.vcf"),
+                                  "--sample-fraction", "0.67", "--seed", 1)
+        _, sampling = self.split_sampling(summary)
+        self.assertEqual(sampling[:2], ["##Total_Chunks=3", "##Sampled_Chunks=2"])
+        self.assertEqual(set(sum(self.get_bounds(sampling), [])), set(["NA"]))
+
+    def test_intervals(self):
+        # Intervals of a sample of at least MIN_CHUNKS chunks bracket the estimated ratios
+        vcf_file = self.get_data_file("snpeff.vcf")
+        chunk_size = VCFSampler.CHUNK_SIZE
+        VCFSampler.CHUNK_SIZE = 4*1024
+        try:
+            for fraction, num_sampled in [(0.5, 17), (0.1, 3)]:
+                sampler = VCFSampler(vcf_file, fraction=fraction, seed=1)
+                summarizer = VCFSummarizer(vcf_file, "Multisample", -1, sampler=sampler)
+                summarizer.summarize()
+                report = summarizer.get_summary().sampling
+                self.assertEqual((report.num_chunks, report.chunks_sampled), (33, num_sampled))
+
+                for i in range(len(report.sample_names)):
+                    for j in range(len(SamplingReport.RATIOS)):
+                        ratio, lower, upper = report.get_ratio(i, j)
+                        if num_sampled < SamplingReport.MIN_CHUNKS:
+                            self.assertEqual((lower, upper), (None, None))
+                        else:
+                            self.assertLessEqual(lower, ratio)
+                            self.assertLess(ratio, upper)
+        finally:
+            VCFSampler.CHUNK_SIZE = chunk_size
@@ -0,0 +1,31 @@
+from ScriptTestCase import ScriptTestCase
+
+class VCFStdinTest(ScriptTestCase):
+    # Tests that VCFs piped to standard input with --vcf - give the same output as the same VCFs read from a file
+
+    # Plain text, BGZF and plain gzip compressed VCFs
+    VCF_FILES = [("Multisample", "snpeff.vcf"), ("Multisample", "snpeff.vcf.gz"), ("Multisample", "annovar.vcf"),
+                 ("Multisample", "annovar.vcf.gz"), ("Mutect", "mutect.vcf"), ("Mutect", "mutect.vcf.gz")]
+
+    def test_recode_stdin(self):
+        for _, vcf_name in self.VCF_FILES:
+            vcf_file = self.get_data_file(vcf_name)
+            expected = self.run_script("RecodeVCF.py", "--vcf", vcf_file, "--output", "-")
+            self.assertGreater(len(expected), 0)
+            self.assertEqual(self.run_script("RecodeVCF.py", "--vcf", "-", "--output", "-", stdin_file=vcf_file),
+                             expected, "Recoding %s from stdin differs!" % vcf_name)
+
+            # Output to a file and multiple threads, which fall back to a single process on stdin
+            out_file = self.get_tmp_file("recoded.tsv")
+            self.run_script("RecodeVCF.py", "--vcf", "-", "--output", out_file, "--threads", 2, stdin_file=vcf_file)
+            self.assertEqual(self.read_file(out_file), expected)
+
+    def test_summarize_stdin(self):
+        for summary_type, vcf_name in self.VCF_FILES:
+            vcf_file = self.get_data_file(vcf_name)
+            expected = self.run_script("SummarizeVCF.py", summary_type, "--vcf", vcf_file)
+            self.assertGreater(len(expected), 0)
+            self.assertEqual(self.run_script("SummarizeVCF.py", summary_type, "--vcf", "-", stdin_file=vcf_file),
+                             expected, "Summarizing %s from stdin differs!" % vcf_name)
+            self.assertEqual(self.run_script("SummarizeVCF.py", summary_type, "--vcf", "-", "--threads", 2,
+                                             stdin_file=vcf_file), expected)
@@ -0,0 +1,104 @@
+import unittest
+import numpy as np
+
+from SummarizeVCF import VCFSummary, merge_two_vcf_summaries
+from SummarizeVCF.VCFSummaryFunctions import VCFSummeryMergeError
+
+class VCFSummaryTest(unittest.TestCase):
+    # Tests of the count and histogram matrices of VCFSummary and of merging summaries
+
+    # Small histograms so printed reports can be compared in full
+    HISTOGRAM_ARGS = {"max_depth": 3, "max_qual": 3, "max_indel_len": 2, "num_afs_bins": 4}
+
+    def get_summaries(self):
+        # Return two summaries with different samples and count fields, listed in a different order
+        summary_1 = VCFSummary(["S1", "S2"], required_count_names=["Called GT", "SNPs"], **self.HISTOGRAM_ARGS)
+        summary_1.add_count("S1", "Called GT")
+        summary_1.add_count("S1", "Called GT")
+        summary_1.add_count("S2", "SNPs")
+        summary_1.add_count("S1", "dbSNP")
+        summary_1.add_depth("S1", 1)
+        summary_1.add_depth("S1", 5)
+        summary_1.add_qual("S2", 2)
+        summary_1.add_del("S1", 1)
+        summary_1.add_ins("S2", 4)
+        summary_1.add_aaf("S1", 0.3)
+
+        summary_2 = VCFSummary(["S3", "S1"], required_count_names=["SNPs", "Ts"], **self.HISTOGRAM_ARGS)
+        summary_2.add_count("S3", "SNPs")
+        summary_2.add_count("S1", "Ts")
+        summary_2.add_count("S1", "SNPs")
+        summary_2.add_depth("S3", 0)
+        summary_2.add_depth("S1", 1)
+        summary_2.add_aaf("S3", 0.9)
+        return summary_1, summary_2
+
+    def test_matrices(self):
+        # Values added to a summary are stored in the rows of its matrices, which each sample's view reads
+        summary_1, _ = self.get_summaries()
+        self.assertEqual(summary_1.count_names, ["Called GT", "SNPs", "dbSNP"])
+        np.testing.assert_array_equal(summary_1.get_counts(), [[2, 0, 1], [0, 1, 0]])
+        np.testing.assert_array_equal(summary_1.depths, [[0, 1, 0, 1], [0, 0, 0, 0]])
+        np.testing.assert_array_equal(summary_1.inserts, [[0, 0, 0], [0, 0, 1]])
+        np.testing.assert_array_equal(summary_1.afs, [[0, 1, 0, 0], [0, 0, 0, 0]])
+        self.assertEqual(summary_1.summary["S1"].get_count("Called GT"), 2)
+        self.assertEqual(summary_1.summary["S1"].get_depth_summary(), (["0", "1", "2", ">3"], [0, 1, 0, 1]))
+        self.assertEqual(summary_1.summary["S2"].get_qual_summary(), (["0", "1", "2", ">3"], [0, 0, 1, 0]))
+
+    def test_merge(self):
+        # Samples and count fields of the second summary that aren't in the first are added in the order they appear
+        summary_1, summary_2 = self.get_summaries()
+        merged = merge_two_vcf_summaries(summary_1, summary_2)
+        self.assertEqual(merged.sample_names, ["S1", "S2", "S3"])
+        self.assertEqual(merged.count_names, ["Called GT", "SNPs", "dbSNP", "Ts"])
+        np.testing.assert_array_equal(merged.get_counts(), [[2, 1, 1, 1], [0, 1, 0, 0], [0, 1, 0, 0]])
+        np.testing.assert_array_equal(merged.depths, [[0, 2, 0, 1], [0, 0, 0, 0], [1, 0, 0, 0]])
+        np.testing.assert_array_equal(merged.afs, [[0, 1, 0, 0], [0, 0, 0, 0], [0, 0, 0, 1]])
+        self.assertEqual(merged.summary["S3"].get_count("SNPs"), 1)
+
+        self.assertEqual(str(merged),
+                         "#COUNTS\n"
+                         "Sample\tCalled_GT\tSNPs\tdbSNP\tTs\n"
+                         "S1\t2\t1\t1\t1\n"
+                         "S2\t0\t1\t0\t0\n"
+                         "S3\t0\t1\t0\t0\n"
+                         "#DEPTH\n"
+                         "Sample\t0\t1\t2\t>3\n"
+                         "S1\t0\t2\t0\t1\n"
+                         "S2\t0\t0\t0\t0\n"
+                         "S3\t1\t0\t0\t0\n"
+                         "#QUAL\n"
+                         "Sample\t0\t1\t2\t>3\n"
+                         "S1\t0\t0\t0\t0\n"
+                         "S2\t0\t0\t1\t0\n"
+                         "S3\t0\t0\t0\t0\n"
+                         "#AAFS\n"
+                         "Sample\t0.0\t0.25\t0.5\t0.75\n"
+                         "S1\t0\t1\t0\t0\n"
+                         "S2\t0\t0\t0\t0\n"
+                         "S3\t0\t0\t0\t1\n"
+                         "#INSERT_LEN\n"
+                         "Sample\t0\t1\t>2\n"
+                         "S1\t0\t0\t0\n"
+                         "S2\t0\t0\t1\n"
+                         "S3\t0\t0\t0\n"
+                         "#DELETE_LEN\n"
+                         "Sample\t0\t1\t>2\n"
+                         "S1\t0\t1\t0\n"
+                         "S2\t0\t0\t0\n"
+                         "S3\t0\t0\t0\n")
+
+    def test_merge_same_layout(self):
+        # Summaries with the same samples and count fields in the same order are added as whole matrices
+        summary_1, _ = self.get_summaries()
+        summary_2, _ = self.get_summaries()
+        merged = merge_two_vcf_summaries(summary_1, summary_2)
+        self.assertEqual(merged.count_names, ["Called GT", "SNPs", "dbSNP"])
+        np.testing.assert_array_equal(merged.get_counts(), [[4, 0, 2], [0, 2, 0]])
+        np.testing.assert_array_equal(merged.deletes, [[0, 2, 0], [0, 0, 0]])
+
+    def test_merge_different_histograms(self):
+        # Summaries with different histogram bins can't be merged
+        summary_1, _ = self.get_summaries()
+        summary_2 = VCFSummary(["S1"], max_depth=10)
+        self.assertRaises(VCFSummeryMergeError, merge_two_vcf_summaries, summary_1, summary_2)